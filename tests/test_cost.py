@@ -0,0 +1,12 @@
+from wf.cost import design_length_range
+from wf.params import RFdiffusionParams
+
+
+def test_contig_length_keeps_receptor():
+    params = RFdiffusionParams(contig_string="A1-150/0 70-100", contig_length="80-90")
+    assert design_length_range(params, 0) == [230, 240]
+
+
+def test_scaffold_target_is_added():
+    params = RFdiffusionParams(contig_string="50-60")
+    assert design_length_range(params, 100) == [150, 160]
@@ -0,0 +1,29 @@
+from wf.crop import crop_contig
+
+
+def write_pdb(path, coords):
+    with open(path, "w") as f:
+        for n, (x, y, z) in sorted(coords.items()):
+            f.write(
+                f"ATOM  {n:5d}  CA  GLY A{n:4d}    {x:8.3f}{y:8.3f}{z:8.3f}"
+                "  1.00  0.00           C\n"
+            )
+
+
+def test_crop_keeps_contiguous_stretches_around_hotspots(tmp_path):
+    # A straight chain A1-100 with hotspot A50 at x = 190, and three stretches
+    # folded back next to it.
+    coords = {n: (3.8 * n, 0.0, 0.0) for n in range(1, 101)}
+    coords.update({n: (190 + 2 * (n - 61.5), 6.0, 0.0) for n in range(60, 64)})
+    coords.update({n: (190 + 1.5 * (n - 92.5), -7.0, 0.0) for n in range(90, 96)})
+    coords.update({80: (190.0, 0.0, 8.0), 81: (190.0, 0.0, 9.5)})
+    pdb = tmp_path / "target.pdb"
+    write_pdb(pdb, coords)
+
+    contig, before, after = crop_contig("A1-100/0 30-40", pdb, [("A", 50)], 10.0)
+
+    # 48-52 and 60-63 are closer than MERGE_GAP and joined (with 53-59), 90-95
+    # stays its own segment behind a chain break, and the two residue stretch
+    # 80-81 is too short to keep.
+    assert contig == "A48-63/0 A90-95/0 30-40"
+    assert (before, after) == (100, 22)
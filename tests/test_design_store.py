@@ -0,0 +1,57 @@
+import pickle
+import random
+
+import numpy as np
+
+from wf.design_store import DesignStore, pack_designs, read_backbone
+from wf.worker import write_stub_design
+
+
+def read_trb(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def assert_same_trb(exported, original):
+    assert sorted(exported) == sorted(original)
+    for field, value in original.items():
+        if isinstance(value, (list, np.ndarray)) and field != "plddt":
+            assert np.array_equal(np.asarray(exported[field]), np.asarray(value))
+        else:
+            assert exported[field] == value
+
+
+def test_store_round_trip(tmp_path):
+    designs = tmp_path / "designs"
+    for i, length in enumerate([12, 30, 7]):
+        write_stub_design(
+            str(designs / f"run_{i}"),
+            length,
+            3,
+            random.Random(i),
+            config={"contigmap.contigs": f"[{length}-{length}]"},
+            write_trajectory=False,
+        )
+    # One design with a motif mapping; the others have empty ones.
+    trb = read_trb(designs / "run_1.trb")
+    trb["con_ref_pdb_idx"] = [("A", 10), ("A", 11)]
+    trb["con_hal_pdb_idx"] = [("A", 4), ("A", 5)]
+    trb["con_ref_idx0"] = np.array([9, 10])
+    with open(designs / "run_1.trb", "wb") as f:
+        pickle.dump(trb, f)
+
+    assert pack_designs(designs, "run", tmp_path / "store") == 3
+    store = DesignStore(tmp_path / "store")
+    assert store.names == ["run_0", "run_1", "run_2"]
+    assert store.backbone("run_1").shape == (30, 4, 3)
+
+    for name in store.names:
+        store.export(name, tmp_path / "exported")
+        original = read_backbone(designs / f"{name}.pdb")
+        exported = read_backbone(tmp_path / "exported" / f"{name}.pdb")
+        for field, values in original.items():
+            assert np.array_equal(exported[field], values)
+        assert_same_trb(
+            read_trb(tmp_path / "exported" / f"{name}.trb"),
+            read_trb(designs / f"{name}.trb"),
+        )
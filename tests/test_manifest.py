@@ -0,0 +1,25 @@
+import random
+
+from wf.manifest import read_manifest, write_manifest
+from wf.worker import write_stub_design
+
+
+def stub_designs(design_dir, run_name, indices, length):
+    for i in indices:
+        write_stub_design(
+            str(design_dir / f"{run_name}_{i}"), length, 5, random.Random(i)
+        )
+
+
+def test_resumed_manifest_keeps_earlier_designs(tmp_path):
+    earlier, resumed = tmp_path / "earlier", tmp_path / "resumed"
+    stub_designs(earlier, "run", [0, 1], 40)
+    write_manifest(earlier, "run", tmp_path / "previous.csv")
+
+    # Design 1 was incomplete before the resume and generated again.
+    stub_designs(resumed, "run", [1, 2], 60)
+    write_manifest(resumed, "run", tmp_path / "run.csv", tmp_path / "previous.csv")
+
+    rows = read_manifest(tmp_path / "run.csv")
+    assert [row["index"] for row in rows] == ["0", "1", "2"]
+    assert [row["length"] for row in rows] == ["40", "60", "60"]
@@ -0,0 +1,76 @@
+import functools
+import pickle
+import sys
+import threading
+
+from wf.multi_gpu import DevicePool, design_jobs
+from wf.worker import RFdiffusionWorker
+
+DEVICES = ["0", "1", "2"]
+
+stub_worker = functools.partial(
+    RFdiffusionWorker, launcher=[sys.executable], stub=True, stub_step_seconds=0.01
+)
+
+
+def run_design(worker, output_dir, start, count):
+    worker.run(
+        [
+            "contigmap.contigs=[20-20]",
+            f"inference.output_prefix={output_dir}/run",
+            f"inference.num_designs={count}",
+            f"inference.design_startnum={start}",
+            "diffuser.T=3",
+        ]
+    )
+
+
+def test_pool_drains_queue_once_per_design(tmp_path):
+    lock = threading.Lock()
+    started = []
+
+    def run_job(worker, metrics, start, count):
+        with lock:
+            started.append(start)
+        run_design(worker, tmp_path, start, count)
+        return True
+
+    with DevicePool(DEVICES, tmp_path / "metrics", stub_worker) as pool:
+        assert pool.run(design_jobs([(0, 12)]), run_job)
+
+    assert sorted(started) == list(range(12))
+    assert sum(pool.designs.values()) == 12
+    for i in range(12):
+        with open(tmp_path / f"run_{i}.trb", "rb") as f:
+            assert pickle.load(f)["device"] in DEVICES
+
+
+def test_dead_worker_requeues_its_design(tmp_path):
+    lock = threading.Lock()
+    attempts = []
+
+    def run_job(worker, metrics, start, count):
+        with lock:
+            attempts.append((worker.device, start))
+            first = [i for _, i in attempts].count(start) == 1
+        if start == 3 and first:
+            # The worker dies with the design, as on a CUDA error.
+            worker.process.kill()
+            worker.process.wait()
+            return False
+        run_design(worker, tmp_path, start, count)
+        return True
+
+    with DevicePool(DEVICES, tmp_path / "metrics", stub_worker) as pool:
+        assert pool.run(design_jobs([(0, 8)]), run_job)
+
+    dead = next(device for device, i in attempts if i == 3)
+    retried = [device for device, i in attempts if i == 3][1]
+    assert retried != dead
+    # The dead worker took nothing after its failed design.
+    assert attempts.index((dead, 3)) == max(
+        k for k, (device, _) in enumerate(attempts) if device == dead
+    )
+    assert sorted({i for _, i in attempts}) == list(range(8))
+    assert len(attempts) == 9
+    assert all((tmp_path / f"run_{i}.pdb").exists() for i in range(8))
@@ -0,0 +1,28 @@
+from wf.params import RFdiffusionParams
+from wf.preflight import parse_contig, validate_params
+
+RECEPTOR = {"A": list(range(1, 151))}
+
+
+def test_binder_contig_length_leaves_out_receptor():
+    params = RFdiffusionParams(
+        contig_string="A1-150/0 70-100",
+        contig_length="70-100",
+        hotspot_residues_binder="A59,A83,A91",
+    )
+    assert validate_params(params, RECEPTOR) == []
+
+
+def test_unreachable_contig_length_is_reported():
+    params = RFdiffusionParams(contig_string="A1-150/0 70-100", contig_length="10-20")
+    errors = validate_params(params, RECEPTOR)
+    assert len(errors) == 1
+    assert "spans 70-100 residues besides fixed receptor chains" in errors[0]
+
+
+def test_receptor_span():
+    span = parse_contig("A1-150/0 70-100", RECEPTOR)
+    assert (span.low, span.high, span.receptor) == (220, 250, 150)
+    # A motif inside the designed chain counts towards contigmap.length.
+    span = parse_contig("10-40/A20-30/10-40", RECEPTOR)
+    assert span.receptor == 0
@@ -0,0 +1,31 @@
+import random
+
+from wf.quality import QualityThresholds, check_chunk, outcome_summary
+from wf.worker import write_stub_design
+
+
+def test_designs_without_backbone_fail_alone(tmp_path):
+    for i in range(3):
+        write_stub_design(
+            str(tmp_path / f"run_{i}"), 30, 2, random.Random(i), write_trajectory=False
+        )
+    # A target chain B after the designed chain is not part of its length.
+    with open(tmp_path / "run_2.pdb", "a") as f:
+        for k in range(5):
+            f.write(
+                f"ATOM  {900 + k:5d}  CA  GLY B{k + 1:4d}    "
+                f"{100.0 + 3.8 * k:8.3f}{0.0:8.3f}{0.0:8.3f}  1.00  0.00\n"
+            )
+    (tmp_path / "run_1.pdb").write_text("REMARK no atoms\nEND\n")
+
+    rows = check_chunk(
+        [tmp_path / f"run_{i}.pdb" for i in range(3)], QualityThresholds()
+    )
+
+    assert [row["design"] for row in rows] == ["run_0", "run_1", "run_2"]
+    assert rows[1]["passed"] is False and rows[1]["failures"] == "no_backbone"
+    assert rows[1]["length"] == 0
+    assert [rows[0]["length"], rows[2]["length"]] == [30, 30]
+    assert rows[0]["rg_ratio"] != "" and rows[2]["rg_ratio"] != ""
+    summary = outcome_summary(rows)
+    assert summary["finished"] == "3" and "mean_rg_ratio" in summary
@@ -0,0 +1,14 @@
+from wf.resume import design_index, pending_ranges
+
+
+def test_pending_ranges_skip_completed_designs():
+    completed = {10, 11, 14, 17, 30}
+    assert pending_ranges(completed, 10, 10) == [(12, 2), (15, 2), (18, 2)]
+    assert pending_ranges(set(), 5, 3) == [(5, 3)]
+    assert pending_ranges(set(range(5, 8)), 5, 3) == []
+
+
+def test_design_index_matches_only_its_run():
+    assert design_index("run_12.trb", "run", ".trb") == 12
+    assert design_index("run_2_12.trb", "run", ".trb") == -1
+    assert design_index("run_12.pdb", "run", ".trb") == -1
@@ -0,0 +1,43 @@
+import os
+
+from wf.scaffolds import MERGE_GAP, LocalSource, ScaffoldLibrary, build_library
+
+
+class CountingSource(LocalSource):
+    def __init__(self, path):
+        super().__init__(path)
+        self.reads = []
+
+    def read(self, offset, length):
+        self.reads.append((offset, length))
+        return super().read(offset, length)
+
+
+def test_nearby_scaffolds_are_read_together(tmp_path):
+    sizes = {"a": 100, "b": 300, "c": 2 * MERGE_GAP, "d": 50, "e": 700}
+    contents = {}
+    for name, size in sizes.items():
+        contents[name] = (os.urandom(size), os.urandom(size // 2 + 1))
+        (tmp_path / f"{name}_ss.pt").write_bytes(contents[name][0])
+        (tmp_path / f"{name}_adj.pt").write_bytes(contents[name][1])
+    (tmp_path / "orphan_ss.pt").write_bytes(b"no adj")
+    assert build_library(tmp_path, tmp_path / "lib.scaflib") == 5
+
+    source = CountingSource(tmp_path / "lib.scaflib")
+    library = ScaffoldLibrary(source)
+    assert library.names == ["a", "b", "c", "d", "e"]
+    source.reads.clear()
+
+    # a-b and d-e are adjacent; c keeps the two groups apart.
+    scaffolds = library.read_many(["e", "a", "b", "d", "a"])
+    assert scaffolds == {name: contents[name] for name in "abde"}
+    assert len(source.reads) == 2
+    assert sum(length for _, length in source.reads) == sum(
+        len(ss) + len(adj) for ss, adj in scaffolds.values()
+    )
+
+    source.reads.clear()
+    library.extract(["c"], tmp_path / "extracted")
+    assert (tmp_path / "extracted" / "c_ss.pt").read_bytes() == contents["c"][0]
+    assert (tmp_path / "extracted" / "c_adj.pt").read_bytes() == contents["c"][1]
+    assert len(source.reads) == 1
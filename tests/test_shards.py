@@ -0,0 +1,20 @@
+import pytest
+
+from wf.shards import split_designs
+
+
+@pytest.mark.parametrize(
+    "num_designs, num_shards", [(10, 3), (12, 4), (5, 8), (1000, 7), (1, 1)]
+)
+def test_shards_cover_every_design_once(num_designs, num_shards):
+    ranges = split_designs(num_designs, num_shards)
+
+    assert len(ranges) == min(num_shards, num_designs)
+    indices = [i for start, count in ranges for i in range(start, start + count)]
+    assert indices == list(range(num_designs))
+    counts = [count for _, count in ranges]
+    assert max(counts) - min(counts) <= 1 and min(counts) >= 1
+
+
+def test_at_least_one_shard():
+    assert split_designs(4, 0) == [(0, 4)]
@@ -0,0 +1,64 @@
+import json
+import sys
+
+from wf.params import RFdiffusionParams
+from wf.task import generate_designs
+from wf.worker import RFdiffusionWorker
+
+
+def test_failed_design_does_not_stop_its_range(tmp_path):
+    # Design 3 fails on every attempt, design 5 only on its first.
+    worker = RFdiffusionWorker(
+        str(tmp_path / "worker.sock"),
+        launcher=[sys.executable],
+        stub=True,
+        stub_fail_designs={3: None, 5: 1},
+    )
+    params = RFdiffusionParams(contig_string="[20-20]", final_step=2)
+    with worker:
+        completed = generate_designs(
+            params,
+            "run",
+            tmp_path,
+            "latch:///unused",
+            0,
+            8,
+            worker=worker,
+            design_retries=2,
+        )
+
+    assert not completed
+    with open(tmp_path / "run_status.json") as f:
+        status = json.load(f)
+    assert status["requested"] == 8
+    assert status["completed"] == [0, 1, 2, 4, 5, 6, 7]
+    assert list(status["failed"]) == ["3"]
+    assert status["failed"]["3"]["attempts"] == 3
+    assert "Design 3 failed (stub)" in status["failed"]["3"]["error"]
+    assert status["recovered"] == {"5": 2}
+    assert not (tmp_path / "run_3.pdb").exists()
+    assert (tmp_path / "run_7.pdb").exists()
+
+
+def test_stopped_range_only_requests_started_designs(tmp_path):
+    params = RFdiffusionParams(contig_string="[20-20]", final_step=2)
+    worker = RFdiffusionWorker(
+        str(tmp_path / "worker.sock"), launcher=[sys.executable], stub=True
+    )
+    with worker:
+        generate_designs(
+            params,
+            "run",
+            tmp_path,
+            "latch:///unused",
+            0,
+            20,
+            worker=worker,
+            stop=lambda: (tmp_path / "run_5.trb").exists(),
+        )
+
+    with open(tmp_path / "run_status.json") as f:
+        status = json.load(f)
+    # Designs go to the worker STOP_CHECK_DESIGNS (4) at a time.
+    assert status["completed"] == list(range(8))
+    assert status["requested"] == 8 and status["failed"] == {}
@@ -0,0 +1,51 @@
+import pytest
+
+from wf.sweep import expand_sweep
+
+
+def test_sets_are_crossed_with_the_grid():
+    configurations = expand_sweep(
+        {
+            "grid": {"noise_scale": [0.5, 1], "potentials_guide_scale": [1, 5]},
+            "sets": [
+                {"hotspot_residues_binder": ["A59", "A83"], "partial_T": 20},
+                {"hotspot_residues_binder": "A30", "partial_T": None},
+            ],
+        }
+    )
+
+    assert len(configurations) == 8
+    # The alias sets both noise scales, as floats.
+    assert configurations[0] == {
+        "hotspot_residues_binder": "A59,A83",
+        "partial_T": 20,
+        "noise_scale_ca": 0.5,
+        "noise_scale_frame": 0.5,
+        "potentials_guide_scale": 1.0,
+    }
+    assert [c["partial_T"] for c in configurations] == [20] * 4 + [None] * 4
+    assert {
+        (c["noise_scale_ca"], c["potentials_guide_scale"]) for c in configurations
+    } == {(0.5, 1.0), (0.5, 5.0), (1.0, 1.0), (1.0, 5.0)}
+
+
+def test_duplicate_configurations_run_once():
+    configurations = expand_sweep(
+        {"grid": {"noise_scale_ca": [1, 1.0]}, "sets": [{"partial_T": 10}]}
+    )
+    assert configurations == [{"partial_T": 10, "noise_scale_ca": 1.0}]
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        {},
+        {"grid": {"noise_scale": []}},
+        {"grid": {"temperature": [1]}},
+        {"sets": [{"noise_scale_ca": None}]},
+        {"sets": [{"partial_T": 2.5}]},
+    ],
+)
+def test_invalid_sweeps_are_rejected(spec):
+    with pytest.raises(ValueError):
+        expand_sweep(spec)
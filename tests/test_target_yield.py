@@ -0,0 +1,39 @@
+import json
+import random
+
+from wf.quality import QualityThresholds
+from wf.target_yield import generate_until_target
+from wf.worker import write_stub_design
+
+
+def test_round_stops_once_target_is_met(tmp_path):
+    started = []
+
+    def generate(start, count, stop):
+        for i in range(start, start + count):
+            if stop():
+                return
+            started.append(i)
+            write_stub_design(
+                str(tmp_path / f"run_{i}"),
+                30,
+                2,
+                random.Random(i),
+                write_trajectory=False,
+            )
+            if i % 2 == 1:
+                (tmp_path / f"run_{i}.pdb").write_text("END\n")
+
+    # Even designs pass and odd ones have no backbone. Round 1 (designs 0-3)
+    # yields 2; round 2 is sized for a 50% pass rate (designs 4-7), but the
+    # target is met by design 6, so design 7 is never started.
+    thresholds = QualityThresholds(
+        max_chain_breaks=10**6, max_clashes=10**6, max_rg_ratio=1e6, max_loop_fraction=1
+    )
+    report = generate_until_target("run", tmp_path, 4, 100, thresholds, generate)
+
+    assert started == list(range(7))
+    assert report["passed"] == 4 and report["target_met"]
+    assert report["rounds"] == 2
+    with open(tmp_path / "run_yield.json") as f:
+        assert json.load(f)["finished"] == 7
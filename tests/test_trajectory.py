@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from wf.params import TrajectoryMode
+from wf.trajectory import load_compact, write_compact
+
+
+def trajectory(span, rng):
+    # Written coordinates, as read back from a PDB: 1/1000 Å resolution.
+    coords = rng.uniform(-span / 2, span / 2, size=(5, 40, 3)) + [10.0, -20.0, 30.0]
+    return np.round(coords, 3).astype(np.float32)
+
+
+@pytest.mark.parametrize("span", [40.0, 200.0])
+def test_quantized_round_trip_is_within_half_a_step(tmp_path, span):
+    coords = trajectory(span, np.random.default_rng(0))
+    prefixes = [f"ATOM  {i:5d}  CA  GLY A{i:4d}    " for i in range(1, 41)]
+    suffixes = ["  1.00  0.00"] * 40
+    path = tmp_path / "design_Xt-1_traj.npz"
+
+    write_compact(
+        path, prefixes, suffixes, coords, [0, 2, 4, 6, 8], TrajectoryMode.QUANTIZED
+    )
+    loaded_prefixes, loaded_suffixes, loaded = load_compact(path)
+
+    assert loaded_prefixes == prefixes and loaded_suffixes == suffixes
+    measured = float((coords.max(axis=(0, 1)) - coords.min(axis=(0, 1))).max())
+    bound = max(measured / 131070, 0.0005) + 1e-4
+    assert np.abs(loaded - coords).max() <= bound
+    if measured <= 65.535:
+        # Within a 1/1000 Å step, every coordinate prints back unchanged.
+        assert np.array_equal(np.round(loaded, 3), np.round(coords, 3))
@@ -0,0 +1,83 @@
+import os
+import random
+
+from wf.uploader import DesignUploader, LocalStore, streaming_uploads
+from wf.worker import write_stub_design
+
+
+class CountingStore(LocalStore):
+    """Fails the first `failures` uploads, then records every upload."""
+
+    def __init__(self, root, failures=0):
+        super().__init__(root)
+        self.failures = failures
+        self.uploads = []
+
+    def upload(self, local, remote):
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("connection reset")
+        super().upload(local, remote)
+        self.uploads.append(remote)
+
+
+def flush(uploader):
+    uploader.scan(final=True)
+    for future in uploader.pending.values():
+        future.result()
+    uploader.pending.clear()
+
+
+def test_upload_is_retried_after_transient_failure(tmp_path):
+    local = tmp_path / "outputs"
+    write_stub_design(str(local / "run" / "run_0"), 20, 2, random.Random(0))
+    store = CountingStore(tmp_path / "store", failures=1)
+
+    with DesignUploader(local, "latch:///out", store, poll_interval=60) as uploader:
+        flush(uploader)
+
+    assert uploader.complete and store.failures == 0
+    assert (tmp_path / "store" / "out" / "run" / "run_0.pdb").exists()
+    assert len(store.uploads) == len(list(local.rglob("*.*")))
+
+
+def test_unchanged_content_is_not_uploaded_again(tmp_path):
+    local = tmp_path / "outputs"
+    write_stub_design(
+        str(local / "run_0"), 20, 2, random.Random(0), write_trajectory=False
+    )
+    pdb = local / "run_0.pdb"
+    store = CountingStore(tmp_path / "store")
+
+    with DesignUploader(local, "latch:///out", store, poll_interval=60) as uploader:
+        flush(uploader)
+        assert store.uploads.count("latch:///out/run_0.pdb") == 1
+
+        # Rewritten with the same content: a new mtime, but the same sha256.
+        stat = pdb.stat()
+        os.utime(pdb, (stat.st_atime, stat.st_mtime + 10))
+        flush(uploader)
+        assert store.uploads.count("latch:///out/run_0.pdb") == 1
+        assert uploader.skipped == 1
+
+        pdb.write_text(pdb.read_text() + "END\n")
+        flush(uploader)
+        assert store.uploads.count("latch:///out/run_0.pdb") == 2
+
+    assert (tmp_path / "store" / "out" / "run_0.pdb").read_text() == pdb.read_text()
+
+
+def test_streaming_uploads_delete_only_trajectories(tmp_path):
+    local = tmp_path / "outputs"
+    write_stub_design(str(local / "run" / "run_0"), 20, 2, random.Random(0))
+    trajectories = sorted((local / "run" / "traj").iterdir())
+    assert len(trajectories) == 2
+
+    with streaming_uploads(True, "latch:///out", str(local)) as uploader:
+        uploader.store = LocalStore(tmp_path / "store")
+
+    assert (local / "run" / "run_0.pdb").exists()
+    assert (local / "run" / "run_0.trb").exists()
+    for trajectory in trajectories:
+        assert not trajectory.exists()
+        assert (tmp_path / "store" / "out" / "run" / "traj" / trajectory.name).exists()
@@ -0,0 +1,38 @@
+import sys
+
+from wf.worker import RFdiffusionWorker
+
+
+def job(prefix, i):
+    return [
+        f"inference.output_prefix={prefix}",
+        "inference.num_designs=1",
+        f"inference.design_startnum={i}",
+        "diffuser.T=2",
+        "contigmap.contigs=[20-20]",
+    ]
+
+
+def test_worker_runs_jobs_and_revives(tmp_path):
+    prefix = tmp_path / "designs" / "run"
+    worker = RFdiffusionWorker(
+        str(tmp_path / "worker.sock"), launcher=[sys.executable], stub=True
+    )
+    with worker:
+        pid = worker.process.pid
+        worker.run(job(prefix, 0))
+        worker.run(job(prefix, 1))
+        # Both jobs went to the one worker process.
+        assert worker.process.pid == pid
+
+        worker.process.kill()
+        worker.process.wait()
+        assert not worker.alive
+        assert worker.revive()
+        assert worker.alive and worker.process.pid != pid
+        worker.run(job(prefix, 2))
+
+    assert worker.process is None
+    for i in range(3):
+        assert (tmp_path / "designs" / f"run_{i}.pdb").exists()
+        assert (tmp_path / "designs" / f"run_{i}.trb").exists()
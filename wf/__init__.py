@@ -1,6 +1,7 @@
 from enum import Enum
 from typing import List, Optional
 
+from latch.resources.conditional import create_conditional_section
 from latch.resources.launch_plan import LaunchPlan
 from latch.resources.workflow import workflow
 from latch.types.directory import LatchDir, LatchOutputDir
@@ -18,7 +19,27 @@ from latch.types.metadata import (
     Text,
 )
 
-from wf.task import rfdif_task
+from wf.batch import rfdif_batch_workflow
+from wf.cluster import cluster_task, unclustered_designs
+from wf.cost import dry_run_task, size_task
+from wf.crop import crop_target_task, uncropped_contig
+from wf.memo import (
+    bypassed_memo,
+    cached_designs_task,
+    memo_record_task,
+    memo_task,
+    unrecorded_designs,
+)
+from wf.preflight import preflight_task
+from wf.quality import quality_filter_task, unfiltered_designs
+from wf.secstruc import given_inputs, secstruc_task
+from wf.shards import rfdif_sharded_workflow
+from wf.task import (
+    rfdif_large_gpu_task,
+    rfdif_multi_gpu_task,
+    rfdif_small_gpu_task,
+    rfdif_task,
+)
 
 
 class PotentialDecayType(Enum):
@@ -36,6 +57,13 @@ class SymmetryType(Enum):
     TETRAHEDRAL = "tetrahedral"
 
 
+class TrajectoryMode(Enum):
+    FULL = "full"
+    FLOAT16 = "float16"
+    QUANTIZED = "quantized"
+    OFF = "off"
+
+
 flow = [
     Section(
         "General Parameters",
@@ -46,6 +74,33 @@ flow = [
             "output_directory",
         ),
     ),
+    Section(
+        "Run Mode",
+        Fork(
+            "run_mode",
+            "Select how designs are launched",
+            SINGLE=ForkBranch(
+                "Single Parameter Set",
+                Text(
+                    "Generates `Number of Designs` designs from the parameters configured below."
+                ),
+            ),
+            SPEC_SHEET=ForkBranch(
+                "Spec Sheet",
+                Text(
+                    "Runs every row of a CSV/TSV spec sheet in one execution. Columns mirror the workflow parameters (e.g. `name`, `contig_string`, `input_pdb`, `hotspot_residues_binder`, `num_designs`); empty cells fall back to the values configured below. Rows that use the same model checkpoint run back to back in one GPU task, and each row is written to its own subdirectory."
+                ),
+                Params("spec_sheet"),
+            ),
+            SWEEP=ForkBranch(
+                "Parameter Sweep",
+                Text(
+                    "Runs every configuration of a JSON sweep file: a grid of values per parameter, a list of parameter sets, or sets crossed with a grid, over `hotspot_residues_binder`, `partial_T`, `noise_scale_ca`/`noise_scale_frame` and `potentials_guide_scale`. Other parameters come from the values configured below. Configurations that use the same model checkpoint run back to back in one GPU task, each is written to its own `config_<i>` subdirectory, and `batch_summary.tsv` compares their settings, runtime and design quality."
+                ),
+                Params("sweep"),
+            ),
+        ),
+    ),
     Section(
         "Generation",
         Text(
@@ -117,6 +172,8 @@ flow = [
                         "scaffoldguided_target_pdb",
                         "scaffoldguided_mask_loops",
                         "scaffold_dir",
+                        "scaffold_library",
+                        "scaffold_pdbs",
                     ),
                 ),
             ),
@@ -161,6 +218,44 @@ flow = [
             "Model Checkpoint",
             Params("ckpt_override_path"),
         ),
+        Spoiler(
+            "Target Cropping",
+            Params("crop_target", "crop_radius"),
+        ),
+        Spoiler(
+            "Quality Filter",
+            Params(
+                "quality_filter",
+                "yield_target",
+                "filter_max_chain_breaks",
+                "filter_max_clashes",
+                "filter_max_rg_ratio",
+                "filter_max_loop_fraction",
+            ),
+        ),
+        Spoiler(
+            "Clustering",
+            Params("cluster_representatives"),
+        ),
+        Spoiler(
+            "Trajectories",
+            Params("trajectory_mode", "trajectory_stride"),
+        ),
+        Spoiler(
+            "Execution",
+            Params(
+                "num_shards",
+                "multi_gpu",
+                "resume",
+                "persistent_worker",
+                "stream_uploads",
+                "pack_designs",
+                "design_retries",
+                "deterministic",
+                "dry_run",
+                "bypass_result_cache",
+            ),
+        ),
     ),
 ]
 
@@ -342,6 +437,131 @@ metadata = LatchMetadata(
             description="Global option for potentials.substrate",
             batch_table_column=False,
         ),
+        "num_shards": LatchParameter(
+            display_name="Number of Shards",
+            description="Split the designs across this many parallel GPU tasks. Each shard generates a disjoint range of design indices (and seeds), and all shards write into the same output directory.",
+            batch_table_column=False,
+        ),
+        "resume": LatchParameter(
+            display_name="Resume",
+            description="Skip designs that already have a complete .pdb/.trb pair in the output directory and generate only the missing design indices. Use this to continue a run that was preempted or failed partway. Turns on Stream Uploads, so designs reach the output directory even if this attempt is also cut short.",
+            batch_table_column=False,
+        ),
+        "persistent_worker": LatchParameter(
+            display_name="Persistent Worker",
+            description="Load the RFdiffusion model once in a long-lived worker process and send it every generation job, instead of starting a fresh run_inference.py process (conda activation, config composition, CUDA init and checkpoint load) for each one.",
+            batch_table_column=False,
+        ),
+        "spec_sheet": LatchParameter(
+            display_name="Spec Sheet",
+            description="CSV or TSV file with one design spec per row. Use a name column for the output subdirectory; list-valued cells (guiding_potentials) are separated with semicolons.",
+            batch_table_column=False,
+        ),
+        "stream_uploads": LatchParameter(
+            display_name="Stream Uploads",
+            description="Upload each design (pdb, trb and trajectories) in the background as soon as it is finished, instead of in one sync at the end of the task. Uploaded trajectories are removed from local disk.",
+            batch_table_column=False,
+        ),
+        "trajectory_mode": LatchParameter(
+            display_name="Trajectory Storage",
+            description="How the per-step denoising trajectories in traj/ are stored. full: multi-model PDBs as written by RFdiffusion. float16 / quantized: compressed .npz with a shared atom header and float16 or 16-bit quantized coordinates; convert back to PDB with python -m wf.trajectory. off: no trajectories.",
+            batch_table_column=False,
+        ),
+        "trajectory_stride": LatchParameter(
+            display_name="Trajectory Stride",
+            description="Keep every k-th step of each trajectory (the final step is always kept).",
+            batch_table_column=False,
+        ),
+        "pack_designs": LatchParameter(
+            display_name="Pack Designs",
+            description="After generation, also pack every design into one memory-mappable store (<run_name>_designs/) holding the backbone coordinates, chain and residue indices, and trb motif mappings. Load it with wf.design_store.DesignStore, or export individual designs back to .pdb/.trb.",
+            batch_table_column=False,
+        ),
+        "crop_target": LatchParameter(
+            display_name="Crop Target",
+            description="Before running, keep only the target residues within Crop Radius of the binder hotspots (hotspot_residues_binder) and rewrite the contig to match. Nearby stretches are merged so the cropped target stays in contiguous segments, separated by chain breaks. Results are cached in the output directory by input PDB hash and crop parameters.",
+            batch_table_column=False,
+        ),
+        "crop_radius": LatchParameter(
+            display_name="Crop Radius",
+            description="Distance in Å from any hotspot atom within which target residues are kept when Crop Target is enabled.",
+            batch_table_column=False,
+        ),
+        "dry_run": LatchParameter(
+            display_name="Dry Run",
+            description="Only print the cost estimate (GPU memory, wall time, GPU tier) and the generated RFdiffusion command, without starting a GPU task.",
+            batch_table_column=False,
+        ),
+        "scaffold_library": LatchParameter(
+            display_name="Scaffold Library",
+            description="Packed scaffold library built with wf.scaffolds from a scaffold directory. Only the scaffolds sampled for the run are fetched. Use instead of Scaffold Directory.",
+            batch_table_column=False,
+        ),
+        "scaffold_pdbs": LatchParameter(
+            display_name="Scaffold PDBs",
+            description="Directory of scaffold PDBs. Secondary structure and block adjacency are computed for each one on a multi-core CPU task, and the results are used as the Scaffold Directory. Results are cached in the output directory by PDB hash. If Target Path is given without Target SS/Target ADJ, those are computed too.",
+            batch_table_column=False,
+        ),
+        "quality_filter": LatchParameter(
+            display_name="Quality Filter",
+            description="After the run, check every design's backbone on a multi-core CPU task for chain breaks, clashes, a radius of gyration too large for its length, and too little secondary structure. Writes <run_name>_quality.csv marking each design pass or fail, with the reasons.",
+            batch_table_column=False,
+        ),
+        "filter_max_chain_breaks": LatchParameter(
+            display_name="Max Chain Breaks",
+            description="Designs fail with more than this many breaks (consecutive CA atoms over 4.2 Å apart) in the designed chain.",
+            batch_table_column=False,
+        ),
+        "filter_max_clashes": LatchParameter(
+            display_name="Max Clashes",
+            description="Designs fail with more than this many clashes (CA atoms under 3 Å apart that are not neighbours in sequence).",
+            batch_table_column=False,
+        ),
+        "filter_max_rg_ratio": LatchParameter(
+            display_name="Max Rg Ratio",
+            description="Designs fail when the designed chain's radius of gyration is more than this multiple of the 2.2·N^0.38 Å expected for a compact protein of N residues.",
+            batch_table_column=False,
+        ),
+        "filter_max_loop_fraction": LatchParameter(
+            display_name="Max Loop Fraction",
+            description="Designs fail when more than this fraction of the designed chain is neither helix nor strand.",
+            batch_table_column=False,
+        ),
+        "cluster_representatives": LatchParameter(
+            display_name="Cluster Representatives",
+            description="If above 0, cluster the finished designs by CA RMSD into this many clusters and copy one representative per cluster to <run_name>/representatives. Each design's cluster is written to <run_name>_clusters.csv. With Quality Filter enabled, only passing designs are clustered.",
+            batch_table_column=False,
+        ),
+        "yield_target": LatchParameter(
+            display_name="Target Passing Designs",
+            description="If above 0, generate in rounds until this many designs pass the quality checks (using the thresholds below, checked every few designs), and treat Number of Designs as a hard cap. Each round is sized from the pass rate seen so far. Writes <run_name>_quality.csv and <run_name>_yield.json with the observed pass rate. Single-GPU runs only; sharded and spec sheet runs ignore it.",
+            batch_table_column=False,
+        ),
+        "sweep": LatchParameter(
+            display_name="Sweep File",
+            description='JSON file with a grid of values per parameter and/or a list of parameter sets, over hotspot_residues_binder, partial_T, noise_scale_ca, noise_scale_frame (or noise_scale for both) and potentials_guide_scale. Example: {"grid": {"partial_T": [10, 20], "noise_scale": [0.5, 1.0]}, "num_designs": 10}.',
+            batch_table_column=False,
+        ),
+        "multi_gpu": LatchParameter(
+            display_name="Multi-GPU",
+            description="Run a single-task run on a node with 4 V100s. One persistent RFdiffusion worker is started per GPU, and the workers pull designs from a shared queue until every design is done. Designs that do not fit a V100 run on a single GPU instead. Ignored for sharded and spec sheet runs.",
+            batch_table_column=False,
+        ),
+        "bypass_result_cache": LatchParameter(
+            display_name="Bypass Result Cache",
+            description="Generate designs even if an identical earlier run is in the result cache. Runs with randomly seeded designs (Seed From Design Index off, not sharded) never use the cache, so this only matters for the others.",
+            batch_table_column=False,
+        ),
+        "design_retries": LatchParameter(
+            display_name="Design Retries",
+            description="How many more times to try a design that failed, e.g. with CUDA out of memory. Designs that still fail are listed in <run_name>_status.json and the rest of the run continues.",
+            batch_table_column=False,
+        ),
+        "deterministic": LatchParameter(
+            display_name="Seed From Design Index",
+            description="Seed each design from its index (RFdiffusion's inference.deterministic), so relaunching the same parameters gives the same designs. Off, a single-task run is randomly seeded and skips the result cache entirely: it is neither stored nor served from it. Sharded runs always seed this way. The example LaunchPlans turn it on.",
+            batch_table_column=False,
+        ),
     },
     flow=flow,
 )
@@ -384,6 +604,32 @@ def rfdiffusion_workflow(
     scaffoldguided: bool = False,
     scaffoldguided_mask_loops: bool = False,
     scaffoldguided_target_pdb: bool = False,
+    num_shards: int = 1,
+    resume: bool = False,
+    persistent_worker: bool = True,
+    run_mode: str = "SINGLE",
+    spec_sheet: Optional[LatchFile] = None,
+    stream_uploads: bool = False,
+    trajectory_mode: TrajectoryMode = TrajectoryMode.FULL,
+    trajectory_stride: int = 1,
+    pack_designs: bool = False,
+    crop_target: bool = False,
+    crop_radius: float = 15.0,
+    dry_run: bool = False,
+    scaffold_library: Optional[LatchFile] = None,
+    scaffold_pdbs: Optional[LatchDir] = None,
+    quality_filter: bool = False,
+    filter_max_chain_breaks: int = 0,
+    filter_max_clashes: int = 0,
+    filter_max_rg_ratio: float = 1.5,
+    filter_max_loop_fraction: float = 0.6,
+    cluster_representatives: int = 0,
+    yield_target: int = 0,
+    sweep: Optional[LatchFile] = None,
+    multi_gpu: bool = False,
+    bypass_result_cache: bool = False,
+    design_retries: int = 2,
+    deterministic: bool = False,
 ) -> LatchOutputDir:
     """
     RFdiffusion: Advanced Protein Structure Generation and Design
@@ -471,11 +717,36 @@ def rfdiffusion_workflow(
     - `Auxiliary Potentials`: RFdiffusion allows the use of additional guiding forces during the diffusion process, enabling more control over the final structure (e.g., enforcing well-packed proteins).
     - `Flexible Peptide Design`: The tool can design binders to flexible peptides where the 3D coordinates are not specified, but the secondary structure can be defined.
     - `Active Site Model`: A specialized model for scaffolding very small motifs, such as enzyme active sites, with improved precision.
+    - `Sharding`: Set `Number of Shards` to split a large run across parallel GPU tasks. Each shard generates its own range of design indices and seeds, and the results are merged into a single output directory laid out exactly like a single-task run.
+    - `Resume`: Enable `Resume` to continue a run that was preempted or failed partway. Designs that already have a non-empty `.pdb`/`.trb` pair in the output directory are skipped (only their sizes are looked up; an upload appears there only once the whole file is in), and only the missing design indices are generated. Resume turns on `Stream Uploads`, since a task that is preempted never reaches its final upload. Enable it (or `Stream Uploads`) on the first attempt too, so that attempt leaves its finished designs behind.
+    - `Persistent Worker`: By default the model is loaded once in a long-lived worker process inside the RFdiffusion environment, and every generation job in the task (for example each resumed range) is sent to it, instead of paying environment activation, config composition, CUDA initialization and checkpoint loading per invocation.
+    - `Spec Sheet Mode`: Select the `Spec Sheet` run mode and provide a CSV/TSV with one design spec per row to run many variants (different contigs, input PDBs or hotspots) in one execution. Rows are grouped by the model checkpoint they need, each group runs back to back in a single GPU task, every row is written to its own subdirectory, and `batch_summary.tsv` records per-row settings, timing and design quality.
+    - `Stream Uploads`: Enable `Stream Uploads` to push each finished design to the output directory in the background while generation continues. Uploads run on a bounded pool with retries, unchanged files are skipped by content hash, and trajectories are removed from local disk once uploaded.
+    - `Trajectory Storage`: Trajectories can be kept as written, thinned to every k-th step with `Trajectory Stride`, turned off, or stored as compressed `.npz` files with float16 or 16-bit quantized coordinates and a single shared atom header. Quantized coordinates match the PDB's 0.001 Å precision for trajectories spanning up to 65.5 Å; wider ones can be off by up to span / 131070 Å (0.0015 Å for 200 Å). Convert a compact trajectory back to a multi-model PDB for PyMOL with `python -m wf.trajectory traj/<design>_pX0_traj.npz`.
+    - `Pack Designs`: Enable `Pack Designs` to pack all backbones of a run into a single memory-mappable store (`<run_name>_designs/`). It holds a coordinate array with per-design offsets, chain and residue index arrays, and the trb motif mapping fields. `wf.design_store.DesignStore` loads one design or the whole set without parsing text, and `python -m wf.design_store export <store> <dir>` writes designs back out as `.pdb`/`.trb` files.
+    - `Run Manifest`: Every run writes `<run_name>_manifest.csv` with one row per design. Each row has the sampled contig and length, the motif mapping from the `.trb` (reference and design residues), the wall time, and NumPy descriptors computed in one batched pass: radius of gyration, end-to-end distance, and helix/strand fraction (P-SEA style CA distance criteria).
+    - `Pre-flight Validation`: Before a GPU is allocated, a small CPU task checks `contig_string`, `contig_length`, `contig_provide_seq`, the `contig_inpaint_str*` parameters and the hotspot parameters against the residues actually present in `input_pdb` (or `target_path` for scaffold-guided hotspots), and fails within seconds with the exact segments that do not match. Spec sheet rows are checked the same way while the sheet is parsed.
+    - `Target Cropping`: Enable `Crop Target` to crop large targets around `hotspot_residues_binder` before diffusion. Target residues with any atom within `Crop Radius` of a hotspot atom are found with a spatial grid, and nearby stretches are merged into contiguous segments. The contig is rewritten to match, and the reduction in target size is reported. Crops are cached in the output directory by input PDB hash and crop parameters.
+    - `GPU Sizing`: A cost model predicts GPU memory and wall time from the contig length range, symmetry, `final_step`/`partial_T`, target size and `Number of Designs`. Single runs go to the cheapest GPU tier that fits (small GPU, V100 or large GPU). The model's coefficients are rough estimates rather than measurements, so a run near a tier's memory limit may land one tier off. Enable `Dry Run` to print the estimate and the generated command without allocating a GPU.
+    - `Benchmarks`: `python -m wf.benchmark` runs every LaunchPlan through the stages of a design task (input staging, pre-flight validation, command construction, generation, trajectory compaction, packing, the manifest and upload) with `run_inference.py` replaced by a CPU stub that writes realistically sized outputs at a configurable rate. It prints per-stage timings and throughput, can save them as JSON, and exits non-zero on regressions against a saved `--baseline`. `--swap` installs the stub over the real script inside the workflow image.
+    - `Timing Metrics`: Every run writes `<run_name>_metrics.jsonl` next to the designs (`metrics/shard_<i>.jsonl` for sharded runs), read from the RFdiffusion log. It records model load time, the latency of every timestep, per-design wall time and the time spent writing each design's outputs, and the task log ends with a summary table (count, total, mean, p50, p95, max).
+    - `Resource Monitoring`: A background thread samples GPU memory and utilization (`nvidia-smi`), host memory and CPU (`/proc`) and disk usage every few seconds into `<run_name>_resources.csv` (host-only when no GPU is present). Samples are matched to design boundaries from the timing metrics, and `<run_name>_resource_peaks.csv` lists each design's peak GPU and host memory, GPU utilization and idle fraction, and disk growth, for right-sizing the GPU tier.
+    - `Input Cache`: GPU tasks stage `ckpt_override_path`, `input_pdb`, `target_path`, `target_ss`, `target_adj` and `scaffold_dir` through a content-addressed cache at `RFDIFFUSION_CACHE_DIR` (default `/root/.cache/rfdiffusion`; mount a persistent or shared volume there to reuse inputs across executions). Entries are keyed by remote path and version (node, modification time and size, so a file replaced at the same path is fetched again), local copies are re-verified by SHA-256 before use, and evicted least-recently-used once the cache exceeds `RFDIFFUSION_CACHE_MAX_GB` (default 50). Hits, misses and evictions are logged.
+    - `On-demand Checkpoints`: The image no longer bakes in all nine checkpoints. Each GPU task works out which checkpoint its parameters select (the same rules as RFdiffusion) and fetches only that one on first use into `RFDIFFUSION_CACHE_DIR/checkpoints`, linking it into `RFdiffusion/models`. Downloads come from the upstream server by default. Set `RFDIFFUSION_CHECKPOINT_SOURCE` to a `latch://` or local directory to fetch from a mirror instead. Build with `--build-arg BAKE_CHECKPOINTS=1` for the old fully baked image.
+    - `Scaffold Libraries`: `python -m wf.scaffolds build <scaffold_dir> <library>` packs a scaffold directory's `_ss.pt`/`_adj.pt` pairs into one file with an index of byte ranges. Pass it as `Scaffold Library` instead of `Scaffold Directory`: each GPU task draws one scaffold per design and reads only those ranges (ranged reads on Latch Data), instead of downloading thousands of scaffolds to use a few. Each design's scaffold is still drawn uniformly from the whole library.
+    - `Secondary Structure Precompute`: Give `Scaffold PDBs` a directory of scaffold PDBs to build the scaffold directory in the workflow, rather than preparing `_ss.pt`/`_adj.pt` files one PDB at a time beforehand. A multi-core CPU task assigns secondary structure from backbone hydrogen-bond energies (as in DSSP) and block adjacency from virtual Cβ contacts between helices and strands, using vectorized NumPy in one process per core. If `target_path` is also given without `target_ss`/`target_adj`, those are computed the same way; without `Scaffold PDBs`, the target files are used as given. Results are cached by PDB hash under `.secstruc_cache` in the output directory, so only new folds are computed, and are written to `<run_name>/secstruc`. `python -m wf.secstruc <pdb_dir> <scaffold_dir>` does the same locally.
+    - `Quality Filter`: Enable `Quality Filter` to check every design on a multi-core CPU task once the run finishes. The checks catch obviously broken backbones before they reach sequence design and structure prediction: chain breaks in the designed chain, CA clashes found with a neighbour grid, a radius of gyration too large for the chain length, and too little helix or strand. Designs are checked in vectorized NumPy chunks, one process per core. Each design is marked pass or fail, with its reasons, designed chain length and measured values, in `<run_name>/<run_name>_quality.csv` (designs without a readable backbone fail as `no_backbone` or `unreadable`); the thresholds are configurable. `python -m wf.quality <design_dir> <run_name> <quality.csv>` runs the same checks locally.
+    - `Clustering`: Set `Cluster Representatives` to the size of the subset you want to carry into sequence design and folding. Once the run finishes, a CPU task picks that many structurally diverse backbones by farthest-point (k-center) selection on CA RMSD of the designed chain. RMSDs use batched Kabsch superposition in NumPy, chunked so only one row of the pairwise matrix is held at a time, which keeps 10k-design runs in memory. Representatives are copied to `<run_name>/representatives`, and every design's cluster and RMSD to its representative are written to `<run_name>/<run_name>_clusters.csv`. Designs of different lengths are never clustered together. With `Quality Filter` enabled, only passing designs are clustered. `python -m wf.cluster <design_dir> <run_name> <count> <clusters.csv>` runs the same selection locally.
+    - `Target Yield`: Set `Target Passing Designs` to ask for a number of usable designs instead of a number of attempts. `num_designs` then becomes a hard cap. The GPU task generates in rounds with the same worker, while a background thread scores each finished design with the `Quality Filter` checks as the GPU keeps going. Each new round is sized from the pass rate seen so far to just reach the target (assuming at least a 10% pass rate). Rounds are sent to the worker a few designs at a time and the target is checked between those jobs, so generation stops within a few designs of the target being met, or once the cap is reached. The pass rate, rounds and whether the target was met are printed and written to `<run_name>/<run_name>_yield.json`, with per-design results in `<run_name>_quality.csv`. Single-GPU runs only; sharded and spec sheet runs ignore it.
+    - `Parameter Sweeps`: Select the `Parameter Sweep` run mode and provide a JSON sweep file to tune `hotspot_residues_binder`, `partial_T`, `noise_scale_ca`/`noise_scale_frame` and `potentials_guide_scale` in one execution instead of one launch per combination. The file holds a `grid` of values per parameter (every combination is run), a list of parameter `sets`, or both (each set crossed with the grid). Configurations are expanded into spec sheet rows named `config_<i>`, so those that need the same checkpoint and inputs share a GPU task and a loaded model. `batch_summary.tsv` is the comparison table: one line per configuration with its settings, runtime, and outcome metrics from the `Quality Filter` checks at default thresholds (designs finished and passed, pass rate, mean radius of gyration ratio and helix, strand and loop fractions). `python -m wf.sweep <sweep.json>` lists the configurations a file expands to.
+    - `Multi-GPU`: Enable `Multi-GPU` to run a single-task run on a node with 4 V100s instead of one GPU. The task detects the visible devices and starts one persistent RFdiffusion worker per device, each pinned with `CUDA_VISIBLE_DEVICES`. The workers pull design indices from a shared queue, so a GPU that finishes early simply takes the next design and throughput scales with the number of GPUs. Every index keeps its own output name, so all workers write into the same output directory, and each GPU's timings go to `metrics/gpu_<device>.jsonl`. If a worker dies, its design goes back on the queue for the others. `python -m wf.multi_gpu <dir> --devices 0,1,2,3` exercises the scheduling on CPU with stub workers.
+    - `Result Cache`: A finished run whose designs are seeded from their index (sharded runs, or single-task runs with `Seed From Design Index`, which the example LaunchPlans enable) is recorded in a result cache, keyed by a SHA-256 of every design parameter, the Latch Data versions of `input_pdb`, the target files, `scaffold_dir`, `scaffold_library` and the checkpoint (read without downloading them), and the design indices. The run name is not part of the key, except as the seed of a scaffold library draw. Relaunching with the same key copies the stored designs into the run directory, renamed for the new run name (or keeps them if they are already there), instead of allocating a GPU. Entries whose files were removed or changed are ignored, and runs with missing designs or designs recovered by a retry (which reseeds them) are never recorded. Single-task runs with `Seed From Design Index` off are randomly seeded, so they always generate and are never recorded. Enable `Bypass Result Cache` to generate anyway. The cache is `.result_cache` in the output directory; set `RFDIFFUSION_RESULT_CACHE` to a `latch://` directory to share one across output directories. Spec sheet, sweep and dry runs are not cached.
+    - `Failure Isolation`: A design that fails, for example with CUDA out of memory on a long sampled length, no longer takes the rest of the run with it. Generation continues from the next design index, a worker that died with the design is restarted, and each failed index is retried on its own up to `Design Retries` times (a design seeded from its index is retried with a fresh seed, since the same seed would fail the same way). Every run writes `<run_name>_status.json` listing which designs completed, which were only recovered by a retry, and which failed, with their attempts and last error; sharded runs merge their per-shard `status/shard_<i>.json` into it, and spec sheet rows each get their own.
 
     ## Practical Considerations
 
     - `Target Site Selection`: For binder design, choose sites with multiple hydrophobic residues and avoid highly charged or glycosylated areas.
-    - `Target Truncation`: For large targets, truncate the protein to reduce computational complexity while preserving the binding site and essential structure.
+    - `Target Truncation`: For large targets, truncate the protein to reduce computational complexity while preserving the binding site and essential structure, or enable `Crop Target` to do this automatically around `hotspot_residues_binder`.
     - `Hotspot Selection`: Choose 3-6 hotspot residues to guide binder design, running pilot studies to optimize selection.
     - `Scale`: While large campaigns may generate thousands of designs, smaller runs of ~1,000 backbones may suffice for many targets.
     - `Sequence Design`: RFdiffusion generates backbones only. Use tools like ProteinMPNN for sequence design.
@@ -510,10 +781,8 @@ def rfdiffusion_workflow(
 
 
     """
-    return rfdif_task(
-        run_name=run_name,
-        output_directory=output_directory,
-        num_designs=num_designs,
+    # Checked on a CPU task first, so mistakes fail before a GPU is allocated.
+    checked = preflight_task(
         contig_string=contig_string,
         contig_length=contig_length,
         contig_provide_seq=contig_provide_seq,
@@ -523,8 +792,68 @@ def rfdiffusion_workflow(
         hotspot_residues_ppi=hotspot_residues_ppi,
         scaffold_dir=scaffold_dir,
         target_path=target_path,
-        target_ss=target_ss,
-        target_adj=target_adj,
+        partial_T=partial_T,
+        final_step=final_step,
+        contig_inpaint_str_strand=contig_inpaint_str_strand,
+        contig_inpaint_str_helix=contig_inpaint_str_helix,
+        contig_inpaint_str=contig_inpaint_str,
+        scaffoldguided=scaffoldguided,
+        scaffold_library=scaffold_library,
+        scaffold_pdbs=scaffold_pdbs,
+    )
+    prepared = (
+        create_conditional_section("secstruc")
+        .if_(checked.prepare_scaffolds.is_true())
+        .then(
+            secstruc_task(
+                run_name=run_name,
+                output_directory=output_directory,
+                scaffold_pdbs=scaffold_pdbs,
+                scaffold_dir=scaffold_dir,
+                target_path=target_path,
+                target_ss=target_ss,
+                target_adj=target_adj,
+            )
+        )
+        .else_()
+        .then(
+            given_inputs(
+                scaffold_dir=scaffold_dir, target_ss=target_ss, target_adj=target_adj
+            )
+        )
+    )
+    # Optional stages are conditional sections, so a disabled one passes its
+    # inputs through a sub-workflow instead of starting a task.
+    cropped_contig_string = (
+        create_conditional_section("crop_target")
+        .if_(crop_target.is_true())
+        .then(
+            crop_target_task(
+                contig_string=checked.contig_string,
+                output_directory=output_directory,
+                input_pdb=input_pdb,
+                hotspot_residues_binder=hotspot_residues_binder,
+                crop_target=crop_target,
+                crop_radius=crop_radius,
+            )
+        )
+        .else_()
+        .then(uncropped_contig(contig_string=checked.contig_string))
+    )
+    sized = size_task(
+        run_name=run_name,
+        num_designs=num_designs,
+        contig_string=cropped_contig_string,
+        contig_length=contig_length,
+        contig_provide_seq=contig_provide_seq,
+        input_pdb=input_pdb,
+        hotspot_residues_binder=hotspot_residues_binder,
+        hotspot_residues_motif=hotspot_residues_motif,
+        hotspot_residues_ppi=hotspot_residues_ppi,
+        scaffold_dir=prepared.scaffold_dir,
+        target_path=target_path,
+        target_ss=prepared.target_ss,
+        target_adj=prepared.target_adj,
         symmetry_gen=symmetry_gen,
         symmetry_motif=symmetry_motif,
         partial_T=partial_T,
@@ -544,6 +873,176 @@ def rfdiffusion_workflow(
         scaffoldguided_mask_loops=scaffoldguided_mask_loops,
         scaffoldguided_target_pdb=scaffoldguided_target_pdb,
         potentials_substrate=potentials_substrate,
+        trajectory_mode=trajectory_mode,
+        trajectory_stride=trajectory_stride,
+        num_shards=num_shards,
+        dry_run=dry_run,
+        scaffold_library=scaffold_library,
+        multi_gpu=multi_gpu,
+        resume=resume,
+        persistent_worker=persistent_worker,
+        stream_uploads=stream_uploads,
+        pack_designs=pack_designs,
+        yield_target=yield_target,
+        filter_max_chain_breaks=filter_max_chain_breaks,
+        filter_max_clashes=filter_max_clashes,
+        filter_max_rg_ratio=filter_max_rg_ratio,
+        filter_max_loop_fraction=filter_max_loop_fraction,
+        design_retries=design_retries,
+        deterministic=deterministic,
+    )
+    memo = (
+        create_conditional_section("result_cache")
+        .if_(
+            (run_mode == "SINGLE")
+            & dry_run.is_false()
+            & bypass_result_cache.is_false()
+            & (deterministic.is_true() | (num_shards > 1))
+        )
+        .then(
+            memo_task(
+                run_name=run_name,
+                output_directory=output_directory,
+                num_designs=num_designs,
+                params=sized.params,
+                options=sized.options,
+                run_mode=run_mode,
+                num_shards=num_shards,
+                dry_run=dry_run,
+                bypass_result_cache=bypass_result_cache,
+            )
+        )
+        .else_()
+        .then(bypassed_memo())
+    )
+    designs = (
+        create_conditional_section("run_mode")
+        .if_(sized.tier == "DRY_RUN")
+        .then(dry_run_task(output_directory=output_directory))
+        .elif_(memo.status == "HIT")
+        .then(cached_designs_task(output_directory=output_directory))
+        .elif_(run_mode == "SPEC_SHEET")
+        .then(
+            rfdif_batch_workflow(
+                spec_sheet=spec_sheet,
+                sweep=None,
+                run_name=run_name,
+                output_directory=output_directory,
+                num_designs=num_designs,
+                params=sized.params,
+                options=sized.options,
+            )
+        )
+        .elif_(run_mode == "SWEEP")
+        .then(
+            rfdif_batch_workflow(
+                spec_sheet=None,
+                sweep=sweep,
+                run_name=run_name,
+                output_directory=output_directory,
+                num_designs=num_designs,
+                params=sized.params,
+                options=sized.options,
+            )
+        )
+        .elif_(num_shards > 1)
+        .then(
+            rfdif_sharded_workflow(
+                num_shards=num_shards,
+                run_name=run_name,
+                output_directory=output_directory,
+                num_designs=num_designs,
+                params=sized.params,
+                options=sized.options,
+            )
+        )
+        .elif_(sized.tier == "SMALL_GPU")
+        .then(
+            rfdif_small_gpu_task(
+                run_name=run_name,
+                output_directory=output_directory,
+                num_designs=num_designs,
+                params=sized.params,
+                options=sized.options,
+            )
+        )
+        .elif_(sized.tier == "LARGE_GPU")
+        .then(
+            rfdif_large_gpu_task(
+                run_name=run_name,
+                output_directory=output_directory,
+                num_designs=num_designs,
+                params=sized.params,
+                options=sized.options,
+            )
+        )
+        .elif_(sized.tier == "MULTI_GPU")
+        .then(
+            rfdif_multi_gpu_task(
+                run_name=run_name,
+                output_directory=output_directory,
+                num_designs=num_designs,
+                params=sized.params,
+                options=sized.options,
+            )
+        )
+        .else_()
+        .then(
+            rfdif_task(
+                run_name=run_name,
+                output_directory=output_directory,
+                num_designs=num_designs,
+                params=sized.params,
+                options=sized.options,
+            )
+        )
+    )
+    recorded = (
+        create_conditional_section("record_result")
+        .if_(memo.status == "MISS")
+        .then(
+            memo_record_task(
+                designs=designs,
+                run_name=run_name,
+                num_designs=num_designs,
+                status=memo.status,
+                key=memo.key,
+                yield_target=yield_target,
+            )
+        )
+        .else_()
+        .then(unrecorded_designs(designs=designs))
+    )
+    filtered = (
+        create_conditional_section("quality_filter")
+        .if_(quality_filter.is_true())
+        .then(
+            quality_filter_task(
+                designs=recorded,
+                run_name=run_name,
+                quality_filter=quality_filter,
+                filter_max_chain_breaks=filter_max_chain_breaks,
+                filter_max_clashes=filter_max_clashes,
+                filter_max_rg_ratio=filter_max_rg_ratio,
+                filter_max_loop_fraction=filter_max_loop_fraction,
+            )
+        )
+        .else_()
+        .then(unfiltered_designs(designs=recorded))
+    )
+    return (
+        create_conditional_section("cluster")
+        .if_(cluster_representatives > 0)
+        .then(
+            cluster_task(
+                designs=filtered,
+                run_name=run_name,
+                cluster_representatives=cluster_representatives,
+                quality_filter=quality_filter,
+            )
+        )
+        .else_()
+        .then(unclustered_designs(designs=filtered))
     )
 
 
@@ -554,6 +1053,7 @@ LaunchPlan(
         "run_name": "design_cyclic_oligos",
         "contig_string": "480-480",
         "num_designs": 10,
+        "deterministic": True,
         "potentials_olig_inter_all": True,
         "potentials_olig_intra_all": True,
         "symmetry_gen": SymmetryType.CYCLIC_6,
@@ -576,6 +1076,7 @@ LaunchPlan(
         "run_name": "design_unconditional",
         "contig_string": "100-200",
         "num_designs": 10,
+        "deterministic": True,
         "generation": "UNCONDITIONAL",
     },
 )
@@ -590,6 +1091,7 @@ LaunchPlan(
             "s3://latch-public/proteinengineering/rfdiffusion/5TPN.pdb"
         ),
         "num_designs": 10,
+        "deterministic": True,
         "design": "MOTIF_SCAFFOLDING",
     },
 )
@@ -604,6 +1106,7 @@ LaunchPlan(
             "s3://latch-public/proteinengineering/rfdiffusion/1YCR.pdb"
         ),
         "num_designs": 2,
+        "deterministic": True,
         "contig_length": "70-120",
         "design": "MOTIF_SCAFFOLDING",
     },
@@ -619,6 +1122,7 @@ LaunchPlan(
             "s3://latch-public/proteinengineering/rfdiffusion/5an7.pdb"
         ),
         "num_designs": 2,
+        "deterministic": True,
         "potentials_guide_scale": 1.0,
         "guiding_potentials": [
             "type:substrate_contacts",
@@ -643,6 +1147,7 @@ LaunchPlan(
             "s3://latch-public/proteinengineering/rfdiffusion/2KL8.pdb"
         ),
         "num_designs": 2,
+        "deterministic": True,
         "partial_T": 10,
         "design": "DESIGN_DIVERSIFICATION",
     },
@@ -659,6 +1164,7 @@ LaunchPlan(
             "s3://latch-public/proteinengineering/rfdiffusion/peptide_complex_ideal_helix.pdb"
         ),
         "num_designs": 2,
+        "deterministic": True,
         "partial_T": 10,
         "contig_provide_seq": "172-177,200-205",
         "design": "DESIGN_DIVERSIFICATION",
@@ -677,6 +1183,7 @@ LaunchPlan(
             "s3://latch-public/proteinengineering/rfdiffusion/insulin_target.pdb"
         ),
         "num_designs": 2,
+        "deterministic": True,
         "noise_scale_ca": 0.0,
         "noise_scale_frame": 0.0,
         "design": "FOLD_CONDITIONING_PPI",
@@ -693,6 +1200,7 @@ LaunchPlan(
             "s3://latch-public/proteinengineering/rfdiffusion/tau_peptide.pdb"
         ),
         "num_designs": 2,
+        "deterministic": True,
         "contig_inpaint_str": "B165-178",
         "scaffoldguided": True,
         "contig_inpaint_str_helix": "B165-178",
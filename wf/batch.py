@@ -0,0 +1,424 @@
+import csv
+import dataclasses
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Union,
+    get_args,
+    get_origin,
+    get_type_hints,
+)
+
+from latch.ldata.path import LPath
+from latch.ldata.type import LatchPathError
+from latch.resources.map_tasks import map_task
+from latch.resources.tasks import small_task, v100_x1_task
+from latch.resources.workflow import workflow
+from latch.types.directory import LatchDir, LatchOutputDir
+from latch.types.file import LatchFile
+
+from wf.cache import InputCache, stage_inputs
+from wf.checkpoints import checkpoint_name, ensure_checkpoint
+from wf.design_store import design_pairs, pack_design_store
+from wf.manifest import write_manifest
+from wf.metrics import InferenceMetrics
+from wf.monitor import ResourceMonitor
+from wf.params import RFdiffusionParams, RunOptions
+from wf.preflight import raise_for_errors, structure_indices, validate_params
+from wf.quality import (
+    OUTCOME_COLUMNS,
+    QualityThresholds,
+    check_designs,
+    outcome_summary,
+)
+from wf.resume import fetch_previous, remote_run_dir
+from wf.scaffolds import stage_scaffold_library
+from wf.sweep import (
+    config_name,
+    expand_sweep,
+    load_sweep,
+    settings,
+    sweep_num_designs,
+)
+from wf.task import generate_designs
+from wf.trajectory import post_processes
+from wf.uploader import streaming_uploads, task_output
+from wf.worker import RFdiffusionWorker
+
+TRUE_VALUES = {"true", "yes", "1"}
+FALSE_VALUES = {"false", "no", "0"}
+TIMING_COLUMNS = [
+    "row",
+    "checkpoint",
+    "num_designs",
+    "seconds",
+    "seconds_per_design",
+    "status",
+]
+
+
+@dataclass
+class RFdiffusionBatchRow:
+    name: str
+    num_designs: int
+    params: RFdiffusionParams
+    # The sheet cells or swept values that set this row apart, as shown in
+    # the run's batch_summary.tsv.
+    settings: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class RFdiffusionBatch:
+    run_name: str
+    output_directory: LatchOutputDir
+    group_index: int
+    checkpoint: str
+    rows: List[RFdiffusionBatchRow]
+    options: RunOptions
+
+
+def parse_value(column: str, value: str, annotation: Any) -> Any:
+    if get_origin(annotation) is Union:
+        annotation = [a for a in get_args(annotation) if a is not type(None)][0]
+
+    if annotation is bool:
+        if value.lower() in TRUE_VALUES:
+            return True
+        if value.lower() in FALSE_VALUES:
+            return False
+        raise ValueError(f"Column '{column}': expected true/false, got '{value}'")
+    if annotation in (int, float):
+        try:
+            return annotation(value)
+        except ValueError:
+            raise ValueError(
+                f"Column '{column}': expected {annotation.__name__}, got '{value}'"
+            )
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        try:
+            return annotation(value)
+        except ValueError:
+            choices = ", ".join(str(e.value) for e in annotation)
+            raise ValueError(
+                f"Column '{column}': expected one of {choices}, got '{value}'"
+            )
+    if annotation is LatchFile:
+        return LatchFile(value)
+    if annotation is LatchDir:
+        return LatchDir(value)
+    if get_origin(annotation) is list:
+        # Guiding potential terms contain commas themselves, so list cells are
+        # separated with semicolons.
+        return [item.strip() for item in value.split(";") if item.strip() != ""]
+    return value
+
+
+def parse_spec_sheet(
+    path: Path, defaults: RFdiffusionParams, num_designs: int
+) -> List[RFdiffusionBatchRow]:
+    """One batch row per sheet row; empty or missing cells fall back to `defaults`."""
+    hints = get_type_hints(RFdiffusionParams)
+    delimiter = "\t" if path.suffix.lower() in (".tsv", ".tab") else ","
+
+    rows = []
+    names = set()
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f, delimiter=delimiter)
+        unknown = set(reader.fieldnames or []) - set(hints) - {"name", "num_designs"}
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown spec sheet columns: {sorted(unknown)}")
+
+        for i, record in enumerate(reader):
+            values = {
+                column: value.strip()
+                for column, value in record.items()
+                if value is not None and value.strip() != ""
+            }
+
+            name = values.pop("name", f"row_{i}")
+            if not name.replace("_", "").replace("-", "").isalnum():
+                raise ValueError(
+                    f"Row {i}: name '{name}' must contain only letters, digits,"
+                    " underscores, and dashes"
+                )
+            if name in names:
+                raise ValueError(f"Row {i}: duplicate name '{name}'")
+            names.add(name)
+
+            row_designs = int(values.pop("num_designs", num_designs))
+            cells = dict(values)
+            overrides = {
+                column: parse_value(column, value, hints[column])
+                for column, value in values.items()
+            }
+            rows.append(
+                RFdiffusionBatchRow(
+                    name=name,
+                    num_designs=row_designs,
+                    params=dataclasses.replace(defaults, **overrides),
+                    settings=cells,
+                )
+            )
+    return rows
+
+
+def sweep_rows(
+    path: Path, defaults: RFdiffusionParams, num_designs: int
+) -> List[RFdiffusionBatchRow]:
+    """One batch row per configuration of a sweep file (see wf.sweep)."""
+    spec = load_sweep(path)
+    row_designs = sweep_num_designs(spec, num_designs)
+    return [
+        RFdiffusionBatchRow(
+            name=config_name(i),
+            num_designs=row_designs,
+            params=dataclasses.replace(defaults, **configuration),
+            settings=settings(configuration),
+        )
+        for i, configuration in enumerate(expand_sweep(spec))
+    ]
+
+
+def group_by_checkpoint(
+    rows: List[RFdiffusionBatchRow],
+) -> Dict[str, List[RFdiffusionBatchRow]]:
+    groups: Dict[str, List[RFdiffusionBatchRow]] = {}
+    for row in rows:
+        groups.setdefault(checkpoint_name(row.params), []).append(row)
+    return groups
+
+
+def summary_columns(timings: List[Dict[str, str]]) -> List[str]:
+    """Timing columns, with every row's settings after `row` and outcomes last."""
+    fixed = set(TIMING_COLUMNS) | set(OUTCOME_COLUMNS)
+    settings_columns: List[str] = []
+    for timing in timings:
+        settings_columns += [
+            column
+            for column in timing
+            if column not in fixed and column not in settings_columns
+        ]
+    return [TIMING_COLUMNS[0], *settings_columns, *TIMING_COLUMNS[1:], *OUTCOME_COLUMNS]
+
+
+@small_task
+def plan_batch_task(
+    spec_sheet: Optional[LatchFile],
+    sweep: Optional[LatchFile],
+    run_name: str,
+    output_directory: LatchOutputDir,
+    num_designs: int,
+    params: RFdiffusionParams,
+    options: RunOptions,
+) -> List[RFdiffusionBatch]:
+    """Rows, with `params` for every cell they leave empty, grouped by checkpoint."""
+    if spec_sheet is None and sweep is None:
+        raise ValueError(
+            "A spec sheet is required in spec sheet mode, and a sweep file in"
+            " sweep mode"
+        )
+
+    if sweep is not None:
+        rows = sweep_rows(Path(sweep.local_path), params, num_designs)
+        print(f"Sweep of {len(rows)} configurations")
+    else:
+        rows = parse_spec_sheet(Path(spec_sheet.local_path), params, num_designs)
+
+    errors = []
+    for row in rows:
+        problems = validate_params(row.params, *structure_indices(row.params))
+        errors += [f"row {row.name}: {problem}" for problem in problems]
+    raise_for_errors(
+        errors, " for the sweep" if sweep is not None else " for the spec sheet"
+    )
+
+    batches = []
+    for i, (checkpoint, group) in enumerate(group_by_checkpoint(rows).items()):
+        print(f"Group {i} ({checkpoint}): {', '.join(row.name for row in group)}")
+        batches.append(
+            RFdiffusionBatch(
+                run_name=run_name,
+                output_directory=output_directory,
+                group_index=i,
+                checkpoint=checkpoint,
+                rows=group,
+                options=options,
+            )
+        )
+    return batches
+
+
+@v100_x1_task
+def rfdif_batch_task(batch: RFdiffusionBatch) -> LatchOutputDir:
+    local_run_dir = Path(f"/root/outputs/{batch.run_name}")
+    remote_root = batch.output_directory.remote_path
+    remote_dir = remote_run_dir(remote_root, batch.run_name)
+
+    with streaming_uploads(
+        batch.options.stream_uploads,
+        remote_root,
+        hold_trajectories=any(post_processes(row.params) for row in batch.rows),
+    ) as uploader:
+        # Every row in a batch resolves to the same checkpoint, so the worker
+        # loads it once and the rows run back to back.
+        timings = []
+        cache = InputCache()
+        ensure_checkpoint(batch.rows[0].params)
+        with ResourceMonitor(
+            local_run_dir / "resources" / f"group_{batch.group_index}.csv"
+        ) as monitor, (
+            RFdiffusionWorker() if batch.options.persistent_worker else nullcontext()
+        ) as worker:
+            for row in batch.rows:
+                print("-" * 60)
+                print(f"Running spec sheet row {row.name}")
+                local_output_dir = local_run_dir / row.name
+                local_output_dir.mkdir(parents=True, exist_ok=True)
+                metrics = InferenceMetrics(
+                    local_output_dir / f"{row.name}_metrics.jsonl"
+                )
+
+                params = stage_inputs(row.params, cache)
+                params = stage_scaffold_library(
+                    params,
+                    row.num_designs,
+                    Path(f"/root/scaffolds/{batch.run_name}/{row.name}"),
+                    seed=f"{batch.run_name}_{row.name}",
+                )
+                start = time.time()
+                succeeded = generate_designs(
+                    params,
+                    row.name,
+                    local_output_dir,
+                    f"{remote_dir}/{row.name}",
+                    0,
+                    row.num_designs,
+                    resume=batch.options.resume,
+                    deterministic=batch.options.deterministic,
+                    worker=worker,
+                    metrics=metrics,
+                    design_retries=batch.options.design_retries,
+                )
+                seconds = time.time() - start
+                metrics.print_summary()
+                monitor.write_peaks(
+                    metrics.events,
+                    local_output_dir / f"{row.name}_resource_peaks.csv",
+                )
+                pdbs = [
+                    local_output_dir / f"{name}.pdb"
+                    for _, name in design_pairs(local_output_dir, row.name)
+                ]
+                timings.append(
+                    {
+                        "row": row.name,
+                        **row.settings,
+                        "checkpoint": batch.checkpoint,
+                        "num_designs": row.num_designs,
+                        "seconds": f"{seconds:.1f}",
+                        "seconds_per_design": f"{seconds / max(row.num_designs, 1):.1f}",
+                        "status": "ok" if succeeded else "failed",
+                        **outcome_summary(check_designs(pdbs, QualityThresholds())),
+                    }
+                )
+                if batch.options.pack_designs:
+                    pack_design_store(local_output_dir, row.name, f"{row.name}_designs")
+                manifest = f"{row.name}_manifest.csv"
+                previous = None
+                if batch.options.resume:
+                    previous = fetch_previous(
+                        f"{remote_dir}/{row.name}/{manifest}",
+                        Path(f"/root/previous/{batch.run_name}/{row.name}") / manifest,
+                    )
+                write_manifest(
+                    local_output_dir, row.name, local_output_dir / manifest, previous
+                )
+
+        timing_dir = local_run_dir / "batch_timings"
+        timing_dir.mkdir(parents=True, exist_ok=True)
+        with open(timing_dir / f"group_{batch.group_index}.tsv", "w", newline="") as f:
+            writer = csv.DictWriter(
+                f, summary_columns(timings), delimiter="\t", restval=""
+            )
+            writer.writeheader()
+            writer.writerows(timings)
+
+    print(f"Returning results for group {batch.group_index}")
+    return task_output(remote_root, uploader)
+
+
+@small_task
+def summarize_batch_task(
+    run_name: str,
+    output_directory: LatchOutputDir,
+    batch_outputs: List[LatchOutputDir],
+) -> LatchOutputDir:
+    remote_dir = remote_run_dir(output_directory.remote_path, run_name)
+    local_run_dir = Path(f"/root/outputs/{run_name}")
+    local_run_dir.mkdir(parents=True, exist_ok=True)
+
+    timings = []
+    try:
+        timing_files = sorted(
+            LPath(f"{remote_dir}/batch_timings").iterdir(), key=lambda p: p.path
+        )
+    except LatchPathError:
+        timing_files = []
+    for timing_file in timing_files:
+        local = timing_file.download(
+            local_run_dir / "batch_timings" / timing_file.name()
+        )
+        with open(local, newline="") as f:
+            timings.extend(csv.DictReader(f, delimiter="\t"))
+
+    columns = summary_columns(timings)
+    print(f"Spec sheet summary ({len(batch_outputs)} checkpoint groups)")
+    print("\t".join(columns))
+    for timing in timings:
+        print("\t".join(timing.get(column) or "" for column in columns))
+
+    with open(local_run_dir / "batch_summary.tsv", "w", newline="") as f:
+        writer = csv.DictWriter(f, columns, delimiter="\t", restval="")
+        writer.writeheader()
+        writer.writerows(timings)
+
+    return LatchOutputDir(str("/root/outputs"), output_directory.remote_path)
+
+
+@workflow
+def rfdif_batch_workflow(
+    spec_sheet: Optional[LatchFile],
+    sweep: Optional[LatchFile],
+    run_name: str,
+    output_directory: LatchOutputDir,
+    num_designs: int,
+    params: RFdiffusionParams,
+    options: RunOptions,
+) -> LatchOutputDir:
+    """Spec Sheet RFdiffusion
+
+    Runs every row of a spec sheet, or every configuration of a sweep, one
+    GPU task per checkpoint group.
+    """
+    batches = plan_batch_task(
+        spec_sheet=spec_sheet,
+        sweep=sweep,
+        run_name=run_name,
+        output_directory=output_directory,
+        num_designs=num_designs,
+        params=params,
+        options=options,
+    )
+    batch_outputs = map_task(rfdif_batch_task)(batch=batches)
+    return summarize_batch_task(
+        run_name=run_name,
+        output_directory=output_directory,
+        batch_outputs=batch_outputs,
+    )
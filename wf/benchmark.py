@@ -0,0 +1,415 @@
+"""Benchmark the workflow wrapper against a CPU stand-in for RFdiffusion.
+
+Every LaunchPlan in `wf/__init__.py` goes through the stages of a design
+task: input staging, pre-flight validation, command construction,
+generation, trajectory compaction, packing, the manifest and the output
+upload. `run_inference.py` is replaced by a stub that writes placeholder
+`.pdb`/`.trb`/trajectory files of realistic size at a configurable rate, so
+the timings measure the wrapper's own overhead rather than the model.
+
+    python -m wf.benchmark --step-seconds 0.01 --output benchmark.json
+    python -m wf.benchmark --baseline benchmark.json
+
+Inside the workflow image, `--swap` installs the stub over the real
+`run_inference.py` (and restores it afterwards) so the `conda run` launch
+is part of the measurement.
+"""
+
+import argparse
+import ast
+import dataclasses
+import json
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from latch.types.directory import LatchDir
+from latch.types.file import LatchFile
+
+from wf.design_store import pack_design_store
+from wf.manifest import write_manifest
+from wf.metrics import InferenceMetrics
+from wf.monitor import ResourceMonitor
+from wf.params import (
+    RUN_INFERENCE_COMMAND,
+    RUN_INFERENCE_SCRIPT,
+    PotentialDecayType,
+    RFdiffusionParams,
+    SymmetryType,
+    TrajectoryMode,
+    build_overrides,
+)
+from wf.preflight import structure_indices, validate_params
+from wf.task import generate_designs
+from wf.uploader import DesignUploader, LocalStore
+from wf.worker import RFdiffusionWorker
+
+WF_DIR = Path(__file__).resolve().parent
+EXAMPLES_DIR = WF_DIR.parent / "examples"
+ENUMS = {
+    "SymmetryType": SymmetryType,
+    "PotentialDecayType": PotentialDecayType,
+    "TrajectoryMode": TrajectoryMode,
+}
+
+STAGES = [
+    "stage_inputs",
+    "validate",
+    "command",
+    "worker_start",
+    "generate",
+    "pack",
+    "manifest",
+    "upload",
+]
+# Stages faster than this are too noisy to flag as regressions.
+MIN_REGRESSION_SECONDS = 0.05
+
+STUB_SCRIPT = """\
+import sys
+
+sys.path.insert(0, {wf_dir!r})
+from worker import StubBackend, configure_logging
+
+configure_logging()
+StubBackend({load_seconds!r}, {step_seconds!r}).run(sys.argv[1:])
+"""
+
+
+@dataclasses.dataclass
+class BenchmarkCase:
+    name: str
+    run_name: str
+    num_designs: int
+    params: RFdiffusionParams
+
+
+def literal(node: ast.expr) -> Any:
+    """Evaluate a LaunchPlan default, with remote example files mapped to examples/."""
+    if isinstance(node, ast.Call) and getattr(node.func, "id", None) == "LatchFile":
+        remote = ast.literal_eval(node.args[0])
+        return LatchFile(str(EXAMPLES_DIR / remote.rsplit("/", 1)[-1]))
+    if isinstance(node, ast.Attribute) and getattr(node.value, "id", None) in ENUMS:
+        return ENUMS[node.value.id][node.attr]
+    if isinstance(node, ast.List):
+        return [literal(element) for element in node.elts]
+    return ast.literal_eval(node)
+
+
+def launch_plan_cases(init_path: Path = WF_DIR / "__init__.py") -> List[BenchmarkCase]:
+    fields = {field.name for field in dataclasses.fields(RFdiffusionParams)}
+    cases = []
+    for node in ast.walk(ast.parse(init_path.read_text())):
+        if (
+            not isinstance(node, ast.Call)
+            or getattr(node.func, "id", None) != "LaunchPlan"
+        ):
+            continue
+        name = ast.literal_eval(node.args[1])
+        defaults = {
+            ast.literal_eval(key): literal(value)
+            for key, value in zip(node.args[2].keys, node.args[2].values)
+        }
+        cases.append(
+            BenchmarkCase(
+                name=name,
+                run_name=defaults["run_name"],
+                num_designs=defaults.get("num_designs", 10),
+                params=RFdiffusionParams(
+                    **{k: v for k, v in defaults.items() if k in fields}
+                ),
+            )
+        )
+    return cases
+
+
+@contextmanager
+def stub_inference(
+    script: Path, load_seconds: float, step_seconds: float
+) -> Iterator[Path]:
+    """Put the stub at `script`, moving any real `run_inference.py` aside."""
+    original = script.with_name(script.name + ".orig")
+    if script.exists():
+        script.rename(original)
+    try:
+        script.parent.mkdir(parents=True, exist_ok=True)
+        script.write_text(
+            STUB_SCRIPT.format(
+                wf_dir=str(WF_DIR),
+                load_seconds=load_seconds,
+                step_seconds=step_seconds,
+            )
+        )
+        yield script
+    finally:
+        script.unlink(missing_ok=True)
+        if original.exists():
+            original.rename(script)
+
+
+@contextmanager
+def stage(timings: Dict[str, float], name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def stage_inputs(params: RFdiffusionParams, input_dir: Path) -> RFdiffusionParams:
+    """Copy every input into the task's scratch space, as the task download does."""
+    input_dir.mkdir(parents=True, exist_ok=True)
+    staged = {}
+    for field in dataclasses.fields(params):
+        value = getattr(params, field.name)
+        if isinstance(value, LatchFile):
+            local = input_dir / Path(value.local_path).name
+            shutil.copyfile(value.local_path, local)
+            staged[field.name] = LatchFile(str(local))
+        elif isinstance(value, LatchDir):
+            local = input_dir / Path(value.local_path).name
+            shutil.copytree(value.local_path, local, dirs_exist_ok=True)
+            staged[field.name] = LatchDir(str(local))
+    return dataclasses.replace(params, **staged)
+
+
+def directory_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def run_case(
+    case: BenchmarkCase,
+    work_dir: Path,
+    inference_command: List[str],
+    num_designs: Optional[int] = None,
+    persistent_worker: bool = False,
+    load_seconds: float = 0.0,
+    step_seconds: float = 0.0,
+    pack_designs: bool = False,
+    trajectory_mode: Optional[TrajectoryMode] = None,
+) -> Dict[str, Any]:
+    num_designs = case.num_designs if num_designs is None else num_designs
+    outputs = work_dir / "outputs"
+    local_output_dir = outputs / case.run_name
+    local_output_dir.mkdir(parents=True, exist_ok=True)
+    params = case.params
+    if trajectory_mode is not None:
+        params = dataclasses.replace(params, trajectory_mode=trajectory_mode)
+
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    with stage(timings, "stage_inputs"):
+        params = stage_inputs(params, work_dir / "inputs")
+
+    with stage(timings, "validate"):
+        errors = validate_params(params, *structure_indices(params))
+    for error in errors:
+        print(f"{case.run_name}: pre-flight: {error}")
+
+    with stage(timings, "command"):
+        build_overrides(params, f"{local_output_dir}/{case.run_name}", num_designs)
+
+    metrics = InferenceMetrics(local_output_dir / f"{case.run_name}_metrics.jsonl")
+    worker = None
+    if persistent_worker:
+        worker = RFdiffusionWorker(
+            socket_path=str(work_dir / "worker.sock"),
+            launcher=[sys.executable],
+            stub=True,
+            stub_load_seconds=load_seconds,
+            stub_step_seconds=step_seconds,
+        )
+        with stage(timings, "worker_start"):
+            worker.start()
+
+    monitor = ResourceMonitor(
+        local_output_dir / f"{case.run_name}_resources.csv", interval=0.5
+    )
+    try:
+        with stage(timings, "generate"), monitor:
+            succeeded = generate_designs(
+                params,
+                case.run_name,
+                local_output_dir,
+                str(work_dir / "remote"),
+                0,
+                num_designs,
+                worker=worker,
+                inference_command=inference_command,
+                metrics=metrics,
+            )
+    finally:
+        if worker is not None:
+            worker.close()
+    metrics.print_summary()
+    monitor.write_peaks(
+        metrics.events, local_output_dir / f"{case.run_name}_resource_peaks.csv"
+    )
+    if not succeeded:
+        raise RuntimeError(f"{case.run_name}: generation failed")
+
+    with stage(timings, "pack"):
+        if pack_designs:
+            pack_design_store(
+                local_output_dir, case.run_name, f"{case.run_name}_designs"
+            )
+
+    with stage(timings, "manifest"):
+        write_manifest(
+            local_output_dir,
+            case.run_name,
+            local_output_dir / f"{case.run_name}_manifest.csv",
+        )
+
+    output_bytes = directory_size(outputs)
+    with stage(timings, "upload"):
+        store = LocalStore(work_dir / "remote")
+        with DesignUploader(outputs, "latch:///benchmark", store=store):
+            pass
+
+    total = time.perf_counter() - start
+    return {
+        "case": case.name,
+        "run_name": case.run_name,
+        "designs": num_designs,
+        "stages": timings,
+        "total": total,
+        "designs_per_second": num_designs / total,
+        "output_mb": output_bytes / 1e6,
+    }
+
+
+def format_table(results: List[Dict[str, Any]]) -> str:
+    header = ["run_name", "designs", *STAGES, "total", "designs/s", "MB"]
+    rows = [
+        [
+            r["run_name"],
+            str(r["designs"]),
+            *(f"{r['stages'].get(name, 0.0):.3f}" for name in STAGES),
+            f"{r['total']:.3f}",
+            f"{r['designs_per_second']:.2f}",
+            f"{r['output_mb']:.1f}",
+        ]
+        for r in results
+    ]
+    widths = [max(len(row[i]) for row in [header, *rows]) for i in range(len(header))]
+    lines = [
+        "  ".join(cell.rjust(w) for cell, w in zip(row, widths))
+        for row in [header, *rows]
+    ]
+    lines.insert(1, "  ".join("-" * w for w in widths))
+    return "\n".join(lines)
+
+
+def regressions(
+    results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float
+) -> List[str]:
+    previous = {r["run_name"]: r for r in baseline}
+    found = []
+    for result in results:
+        before = previous.get(result["run_name"])
+        if before is None or before["designs"] != result["designs"]:
+            continue
+        for name in [*STAGES, "total"]:
+            old = before["stages"].get(name, 0.0) if name in STAGES else before[name]
+            new = result["stages"].get(name, 0.0) if name in STAGES else result[name]
+            if new - old > MIN_REGRESSION_SECONDS and new > old * (1 + tolerance):
+                found.append(
+                    f"{result['run_name']}: {name} took {new:.3f}s"
+                    f" (baseline {old:.3f}s, +{new - old:.3f}s)"
+                )
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--cases",
+        nargs="*",
+        help="Only run LaunchPlans whose run_name contains one of these",
+    )
+    parser.add_argument(
+        "--num-designs", type=int, help="Override each plan's design count"
+    )
+    parser.add_argument("--load-seconds", type=float, default=0.0)
+    parser.add_argument("--step-seconds", type=float, default=0.005)
+    parser.add_argument("--persistent-worker", action="store_true")
+    parser.add_argument("--pack-designs", action="store_true")
+    parser.add_argument(
+        "--trajectory-mode", choices=[mode.value for mode in TrajectoryMode]
+    )
+    parser.add_argument(
+        "--swap",
+        action="store_true",
+        help=f"Install the stub over {RUN_INFERENCE_SCRIPT} and launch it through conda",
+    )
+    parser.add_argument("--work-dir", type=Path)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument(
+        "--baseline", type=Path, help="Fail on regressions against this"
+    )
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # Read before running, since --output may overwrite the same file.
+    baseline = None
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text())
+
+    cases = launch_plan_cases()
+    if args.cases:
+        cases = [c for c in cases if any(key in c.run_name for key in args.cases)]
+
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        root = args.work_dir or Path(scratch)
+        script = Path(RUN_INFERENCE_SCRIPT) if args.swap else root / "run_inference.py"
+        with stub_inference(script, args.load_seconds, args.step_seconds):
+            command = (
+                RUN_INFERENCE_COMMAND if args.swap else [sys.executable, str(script)]
+            )
+            for case in cases:
+                print("-" * 60)
+                print(f"Benchmarking {case.name}")
+                results.append(
+                    run_case(
+                        case,
+                        root / case.run_name,
+                        command,
+                        num_designs=args.num_designs,
+                        persistent_worker=args.persistent_worker,
+                        load_seconds=args.load_seconds,
+                        step_seconds=args.step_seconds,
+                        pack_designs=args.pack_designs,
+                        trajectory_mode=(
+                            TrajectoryMode(args.trajectory_mode)
+                            if args.trajectory_mode
+                            else None
+                        ),
+                    )
+                )
+
+    print("-" * 60)
+    print(format_table(results))
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"Wrote {args.output}")
+
+    if baseline is not None:
+        found = regressions(results, baseline, args.tolerance)
+        print("-" * 60)
+        if len(found) > 0:
+            print("Regressions against the baseline:")
+            for line in found:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
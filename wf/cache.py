@@ -0,0 +1,196 @@
+import dataclasses
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Union
+
+from latch.ldata.path import LPath
+from latch.types.directory import LatchDir
+from latch.types.file import LatchFile
+
+from wf.params import RFdiffusionParams
+from wf.uploader import file_digest
+from wf.versions import remote_version
+
+# Point this at a persistent or shared volume to reuse inputs across tasks.
+CACHE_DIR = Path(os.environ.get("RFDIFFUSION_CACHE_DIR", "/root/.cache/rfdiffusion"))
+CACHE_MAX_BYTES = int(float(os.environ.get("RFDIFFUSION_CACHE_MAX_GB", "50")) * 1e9)
+
+CACHED_INPUTS = [
+    "ckpt_override_path",
+    "input_pdb",
+    "target_path",
+    "target_ss",
+    "target_adj",
+    "scaffold_dir",
+]
+
+
+def tree_digest(path: Path) -> str:
+    if path.is_file():
+        return file_digest(path)
+    digest = hashlib.sha256()
+    for child in sorted(p for p in path.rglob("*") if p.is_file()):
+        digest.update(child.relative_to(path).as_posix().encode() + b"\0")
+        digest.update(file_digest(child).encode())
+    return digest.hexdigest()
+
+
+def tree_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+class InputCache:
+    """Content-addressed store for staged inputs, bounded by LRU eviction.
+
+    `objects/<sha256>/<name>` holds each file or directory by the digest of
+    its content. The index maps a remote path and its version (wf.versions)
+    to the digest of what was downloaded from it, so a replaced remote file
+    is a miss, and records when each object was last used. A hit is
+    re-hashed before use, so a corrupted local object is fetched again
+    instead of being used. The index is guarded by a file lock so several
+    tasks can share one volume.
+    """
+
+    def __init__(self, root: Path = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects = root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.index_path = root / "index.json"
+        self.hits = 0
+        self.misses = 0
+        self.bytes_downloaded = 0
+        self.bytes_reused = 0
+        self.evictions = 0
+
+    @contextmanager
+    def index(self) -> Iterator[Dict[str, Any]]:
+        with open(self.root / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index = {"remotes": {}, "objects": {}}
+            if self.index_path.exists():
+                index = json.loads(self.index_path.read_text())
+            yield index
+            scratch = self.index_path.with_suffix(".tmp")
+            scratch.write_text(json.dumps(index))
+            scratch.replace(self.index_path)
+
+    def object_path(self, digest: str) -> Optional[Path]:
+        children = list((self.objects / digest).glob("*"))
+        return children[0] if len(children) == 1 else None
+
+    def lookup(self, key: str) -> Optional[Path]:
+        with self.index() as index:
+            digest = index["remotes"].get(key)
+        if digest is None:
+            return None
+        path = self.object_path(digest)
+        if path is None or tree_digest(path) != digest:
+            print(f"Cached object {digest[:12]} is missing or corrupt, fetching again")
+            shutil.rmtree(self.objects / digest, ignore_errors=True)
+            return None
+
+        with self.index() as index:
+            index["objects"].setdefault(digest, {"size": tree_size(path)})
+            index["objects"][digest]["last_used"] = time.time()
+        return path
+
+    def insert(self, key: str, downloaded: Path) -> Path:
+        digest = tree_digest(downloaded)
+        target = self.objects / digest
+        if not target.exists():
+            staging = Path(tempfile.mkdtemp(dir=self.objects, prefix=".staging-"))
+            shutil.move(str(downloaded), staging / downloaded.name)
+            try:
+                staging.rename(target)
+            except OSError:
+                # Another task stored the same content first.
+                shutil.rmtree(staging)
+
+        path = self.object_path(digest)
+        with self.index() as index:
+            index["remotes"][key] = digest
+            index["objects"][digest] = {
+                "size": tree_size(path),
+                "last_used": time.time(),
+            }
+            self.evict(index, keep=digest)
+        return path
+
+    def evict(self, index: Dict[str, Any], keep: str) -> None:
+        objects = index["objects"]
+        total = sum(entry["size"] for entry in objects.values())
+        for digest in sorted(objects, key=lambda d: objects[d]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            total -= objects.pop(digest)["size"]
+            shutil.rmtree(self.objects / digest, ignore_errors=True)
+            index["remotes"] = {
+                k: v for k, v in index["remotes"].items() if v != digest
+            }
+            self.evictions += 1
+
+    def stage(self, remote_path: str) -> Optional[Path]:
+        """Local copy of `remote_path`, from the cache or freshly downloaded.
+
+        Returns None when the remote path cannot be resolved.
+        """
+        remote = LPath(remote_path)
+        current = remote_version(remote_path)
+        if current is None:
+            return None
+        size = current.size
+
+        # Replacing a file changes its version even when the size does not.
+        key = f"{remote_path}:{current.version}"
+        cached = self.lookup(key)
+        if cached is not None:
+            self.hits += 1
+            self.bytes_reused += size
+            print(f"Input cache hit: {remote_path} ({size / 1e6:.1f} MB)")
+            return cached
+
+        self.misses += 1
+        self.bytes_downloaded += size
+        print(f"Input cache miss: {remote_path} ({size / 1e6:.1f} MB), downloading")
+        scratch = Path(tempfile.mkdtemp(dir=self.objects, prefix=".download-"))
+        try:
+            downloaded = remote.download(scratch / remote.name())
+            return self.insert(key, downloaded)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def print_stats(self) -> None:
+        print(
+            f"Input cache: {self.hits} hits ({self.bytes_reused / 1e6:.1f} MB reused),"
+            f" {self.misses} misses ({self.bytes_downloaded / 1e6:.1f} MB downloaded),"
+            f" {self.evictions} evicted"
+        )
+
+
+def stage_inputs(
+    params: RFdiffusionParams, cache: Optional[InputCache] = None
+) -> RFdiffusionParams:
+    """Params with every remote file and directory input staged through the cache."""
+    cache = InputCache() if cache is None else cache
+    staged: Dict[str, Union[LatchFile, LatchDir]] = {}
+    for name in CACHED_INPUTS:
+        value = getattr(params, name)
+        if value is None or value.remote_path is None:
+            continue
+        local = cache.stage(value.remote_path)
+        if local is not None:
+            staged[name] = type(value)(str(local))
+    cache.print_stats()
+    return dataclasses.replace(params, **staged)
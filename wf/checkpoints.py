@@ -0,0 +1,153 @@
+import fcntl
+import os
+import shutil
+import subprocess
+import tempfile
+import urllib.request
+from pathlib import Path
+from typing import Optional
+
+from latch.ldata.path import LPath
+
+from wf.cache import CACHE_DIR
+from wf.params import RFdiffusionParams
+from wf.worker import RFDIFFUSION_DIR
+
+# Where run_inference.py looks for checkpoints by default.
+MODELS_DIR = RFDIFFUSION_DIR / "models"
+CHECKPOINT_CACHE_DIR = CACHE_DIR / "checkpoints"
+CHECKPOINT_URLS = {
+    "Base_ckpt.pt": "http://files.ipd.uw.edu/pub/RFdiffusion/6f5902ac237024bdd0c176cb93063dc4/Base_ckpt.pt",
+    "Complex_base_ckpt.pt": "http://files.ipd.uw.edu/pub/RFdiffusion/e29311f6f1bf1af907f9ef9f44b8328b/Complex_base_ckpt.pt",
+    "Complex_Fold_base_ckpt.pt": "http://files.ipd.uw.edu/pub/RFdiffusion/60f09a193fb5e5ccdc4980417708dbab/Complex_Fold_base_ckpt.pt",
+    "InpaintSeq_ckpt.pt": "http://files.ipd.uw.edu/pub/RFdiffusion/74f51cfb8b440f50d70878e05361d8f0/InpaintSeq_ckpt.pt",
+    "InpaintSeq_Fold_ckpt.pt": "http://files.ipd.uw.edu/pub/RFdiffusion/76d00716416567174cdb7ca96e208296/InpaintSeq_Fold_ckpt.pt",
+    "ActiveSite_ckpt.pt": "http://files.ipd.uw.edu/pub/RFdiffusion/5532d2e1f3a4738decd58b19d633b3c3/ActiveSite_ckpt.pt",
+    "Base_epoch8_ckpt.pt": "http://files.ipd.uw.edu/pub/RFdiffusion/12fc204edeae5b57713c5ad7dcb97d39/Base_epoch8_ckpt.pt",
+    "Complex_beta_ckpt.pt": "http://files.ipd.uw.edu/pub/RFdiffusion/f572d396fae9206628714fb2ce00f72e/Complex_beta_ckpt.pt",
+}
+
+
+def checkpoint_name(params: RFdiffusionParams) -> str:
+    """The checkpoint `run_inference.py` will load for `params`.
+
+    Mirrors the selection in RFdiffusion's `Sampler.initialize`, applied to
+    the overrides `build_overrides` emits.
+    """
+    if params.ckpt_override_path is not None:
+        # A file picked from the local machine has no remote path yet.
+        return (
+            params.ckpt_override_path.remote_path
+            or params.ckpt_override_path.local_path
+        )
+
+    scaffoldguided = (
+        params.scaffoldguided
+        or params.scaffold_dir is not None
+        or params.scaffold_library is not None
+    )
+    hotspots = (
+        params.hotspot_residues_binder
+        or params.hotspot_residues_motif
+        or params.hotspot_residues_ppi
+    )
+
+    if params.contig_provide_seq or params.contig_inpaint_str:
+        if scaffoldguided:
+            return "InpaintSeq_Fold_ckpt.pt"
+        return "InpaintSeq_ckpt.pt"
+    if hotspots and not scaffoldguided:
+        return "Complex_base_ckpt.pt"
+    if scaffoldguided:
+        return "Complex_Fold_base_ckpt.pt"
+    return "Base_ckpt.pt"
+
+
+class HttpBackend:
+    """The upstream download server, with aria2c when the image has it."""
+
+    def fetch(self, name: str, destination: Path) -> None:
+        url = CHECKPOINT_URLS[name]
+        if shutil.which("aria2c") is not None:
+            subprocess.run(
+                ["aria2c", "-q", "-x", "16", "-d", str(destination.parent)]
+                + ["-o", destination.name, url],
+                check=True,
+            )
+        else:
+            urllib.request.urlretrieve(url, destination)
+
+
+class LocalBackend:
+    """A directory of checkpoints, e.g. a mounted volume or a test fixture."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def fetch(self, name: str, destination: Path) -> None:
+        shutil.copyfile(self.directory / name, destination)
+
+
+class LatchBackend:
+    """Checkpoints mirrored to a Latch Data directory."""
+
+    def __init__(self, remote_dir: str):
+        self.remote_dir = remote_dir.rstrip("/")
+
+    def fetch(self, name: str, destination: Path) -> None:
+        LPath(f"{self.remote_dir}/{name}").download(destination)
+
+
+def default_backend():
+    """`RFDIFFUSION_CHECKPOINT_SOURCE` picks a latch:// directory or a local
+    directory to fetch from; unset, checkpoints come from upstream."""
+    source = os.environ.get("RFDIFFUSION_CHECKPOINT_SOURCE")
+    if source is None:
+        return HttpBackend()
+    if source.startswith("latch://"):
+        return LatchBackend(source)
+    return LocalBackend(Path(source))
+
+
+def ensure_checkpoint(
+    params: RFdiffusionParams,
+    backend=None,
+    models_dir: Path = MODELS_DIR,
+    cache_dir: Path = CHECKPOINT_CACHE_DIR,
+) -> Optional[Path]:
+    """Make the checkpoint `params` needs available to `run_inference.py`.
+
+    Images built with the checkpoints already have it in `models_dir`.
+    Otherwise it is fetched once into `cache_dir` (shared with the input
+    cache, so a persistent volume keeps it across tasks) and linked into
+    `models_dir`. Overrides are staged by the input cache instead.
+    """
+    if params.ckpt_override_path is not None:
+        return None
+
+    name = checkpoint_name(params)
+    installed = models_dir / name
+    if installed.exists():
+        return installed
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    cached = cache_dir / name
+    with open(cache_dir / f".{name}.lock", "w") as lock:
+        # Concurrent tasks on a shared volume wait for one download.
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if cached.exists():
+            print(f"Using cached checkpoint {cached}")
+        else:
+            backend = default_backend() if backend is None else backend
+            print(f"Fetching checkpoint {name} with {type(backend).__name__}")
+            with tempfile.TemporaryDirectory(dir=cache_dir) as scratch:
+                partial = Path(scratch) / name
+                backend.fetch(name, partial)
+                partial.rename(cached)
+            print(f"Fetched {name} ({cached.stat().st_size / 1e6:.0f} MB)")
+
+    models_dir.mkdir(parents=True, exist_ok=True)
+    if installed.is_symlink():
+        installed.unlink()
+    installed.symlink_to(cached)
+    return installed
@@ -0,0 +1,257 @@
+"""Diverse subsets of a run's backbones by CA RMSD.
+
+Representatives are chosen by farthest-point (k-center) selection: each
+new representative is the design furthest from all those chosen so far,
+and every design joins the cluster of its nearest representative. This
+only needs the RMSD of each design to each representative, one row of the
+pairwise matrix per pick, computed in chunks with batched Kabsch
+superposition. A 10k-design run therefore never holds a 10k x 10k matrix.
+
+RMSDs are over the designed chain (the first chain). Backbones of
+different lengths cannot be superimposed and count as infinitely far
+apart, so each length gets a representative before any length gets a
+second one.
+
+    python -m wf.cluster <design dir> <run name> <count> <clusters.csv>
+"""
+
+import argparse
+import csv
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from latch.ldata.path import LPath
+from latch.ldata.type import LatchPathError
+from latch.resources.tasks import custom_task
+from latch.resources.workflow import workflow
+from latch.types.directory import LatchOutputDir
+
+from wf.design_store import design_pairs
+from wf.quality import download_designs, read_design_ca, remote_designs
+from wf.resume import remote_run_dir
+
+CLUSTER_COLUMNS = [
+    "design",
+    "length",
+    "cluster",
+    "representative",
+    "rmsd_to_representative",
+]
+# Designs superimposed per batch; bounds the (chunk, length, 3) temporaries.
+CHUNK_SIZE = 4096
+
+
+def kabsch_rmsd(reference: np.ndarray, coords: np.ndarray) -> np.ndarray:
+    """RMSD of each centered `(length, 3)` in `coords` to a centered `reference`.
+
+    Uses the singular values of the covariance instead of applying the
+    optimal rotation: RMSD² = (|X|² + |Y|² - 2(s1 + s2 ± s3)) / length.
+    """
+    covariance = np.einsum("bli,lj->bij", coords, reference)
+    u, s, vt = np.linalg.svd(covariance)
+    sign = np.sign(np.linalg.det(u) * np.linalg.det(vt))
+    s[:, -1] *= sign
+    squared = (coords**2).sum(axis=(1, 2)) + (reference**2).sum() - 2 * s.sum(axis=1)
+    return np.sqrt(np.maximum(squared, 0) / reference.shape[0])
+
+
+class Backbones:
+    """Centered designed-chain CA coordinates, grouped by length."""
+
+    def __init__(self, backbones: List[np.ndarray]):
+        self.lengths = np.array([len(ca) for ca in backbones])
+        self.groups: Dict[int, np.ndarray] = {}
+        self.members: Dict[int, np.ndarray] = {}
+        for length in np.unique(self.lengths):
+            members = np.flatnonzero(self.lengths == length)
+            coords = np.stack([backbones[i] for i in members]).astype(np.float64)
+            self.groups[int(length)] = coords - coords.mean(axis=1, keepdims=True)
+            self.members[int(length)] = members
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def rmsd_to(self, i: int) -> np.ndarray:
+        """RMSD of every design to design `i`, infinite across lengths."""
+        length = int(self.lengths[i])
+        coords = self.groups[length]
+        reference = coords[np.searchsorted(self.members[length], i)]
+        rmsd = np.full(len(self), np.inf)
+        rmsd[self.members[length]] = np.concatenate(
+            [
+                kabsch_rmsd(reference, coords[start : start + CHUNK_SIZE])
+                for start in range(0, len(coords), CHUNK_SIZE)
+            ]
+        )
+        return rmsd
+
+
+def select_representatives(
+    backbones: Backbones, count: int
+) -> Tuple[List[int], np.ndarray, np.ndarray]:
+    """Representatives, each design's cluster, and its RMSD to the representative.
+
+    Designs whose length has no representative (more lengths than `count`)
+    get cluster -1.
+    """
+    nearest = np.full(len(backbones), np.inf)
+    cluster = np.full(len(backbones), -1)
+    representatives: List[int] = []
+    pick = 0
+    while len(representatives) < min(count, len(backbones)):
+        rmsd = backbones.rmsd_to(pick)
+        closer = rmsd < nearest
+        nearest[closer] = rmsd[closer]
+        cluster[closer] = len(representatives)
+        representatives.append(pick)
+        # Unreached lengths (infinite distance) are picked first.
+        pick = int(np.argmax(np.where(cluster < 0, np.inf, nearest)))
+        if nearest[pick] == 0:
+            break
+    return representatives, cluster, nearest
+
+
+def cluster_rows(
+    names: List[str], backbones: Backbones, count: int
+) -> Tuple[List[Dict[str, Any]], List[int]]:
+    representatives, cluster, nearest = select_representatives(backbones, count)
+    rows = [
+        {
+            "design": name,
+            "length": int(backbones.lengths[i]),
+            "cluster": int(cluster[i]),
+            "representative": i in representatives,
+            "rmsd_to_representative": (
+                f"{nearest[i]:.3f}" if np.isfinite(nearest[i]) else ""
+            ),
+        }
+        for i, name in enumerate(names)
+    ]
+    rows.sort(key=lambda row: (row["cluster"] < 0, row["cluster"], row["design"]))
+    return rows, representatives
+
+
+def write_clusters(rows: List[Dict[str, Any]], path: Path) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, CLUSTER_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    sizes = np.bincount([row["cluster"] for row in rows if row["cluster"] >= 0])
+    radii = [float(r["rmsd_to_representative"] or 0) for r in rows]
+    print(
+        f"{len(rows)} designs in {len(sizes)} clusters (sizes {sizes.min()}-"
+        f"{sizes.max()}, largest RMSD to a representative {max(radii):.2f} Å),"
+        f" see {path}"
+    )
+    unclustered = sum(row["cluster"] < 0 for row in rows)
+    if unclustered > 0:
+        print(f"{unclustered} designs have a length with no representative")
+
+
+def passing_designs(remote_dir: str, run_name: str) -> Optional[Set[str]]:
+    """Designs that passed wf.quality, or None if the run was not filtered."""
+    quality = LPath(f"{remote_dir}/{run_name}_quality.csv")
+    try:
+        quality.size()
+    except LatchPathError:
+        return None
+    with tempfile.TemporaryDirectory() as scratch:
+        with open(quality.download(Path(scratch) / "quality.csv"), newline="") as f:
+            return {
+                row["design"] for row in csv.DictReader(f) if row["passed"] == "True"
+            }
+
+
+@workflow
+def unclustered_designs(designs: LatchOutputDir) -> LatchOutputDir:
+    """Unclustered Designs
+
+    Passes the designs through when no representatives are asked for,
+    without starting a task.
+    """
+    return designs
+
+
+def cluster_cpus(cluster_representatives: int) -> int:
+    return 8 if cluster_representatives > 0 else 2
+
+
+def cluster_memory(cluster_representatives: int) -> int:
+    return 32 if cluster_representatives > 0 else 4
+
+
+@custom_task(cpu=cluster_cpus, memory=cluster_memory)
+def cluster_task(
+    designs: LatchOutputDir,
+    run_name: str,
+    cluster_representatives: int = 0,
+    quality_filter: bool = False,
+) -> LatchOutputDir:
+    if cluster_representatives <= 0:
+        return designs
+
+    remote_dir = remote_run_dir(designs.remote_path, run_name)
+    found = remote_designs(remote_dir, run_name)
+    passed = passing_designs(remote_dir, run_name) if quality_filter else None
+    if passed is not None:
+        print(f"Clustering the {len(passed)} designs that passed the quality filter")
+        found = [design for design in found if Path(design[1].name()).stem in passed]
+    if len(found) == 0:
+        print("No designs to cluster")
+        return designs
+
+    with tempfile.TemporaryDirectory() as scratch:
+        paths = download_designs(found, Path(scratch))
+        read = [read_design_ca(path) for path in paths]
+        kept = [k for k, (ca, _) in enumerate(read) if len(ca) > 0]
+        if len(kept) < len(paths):
+            print(f"Not clustering {len(paths) - len(kept)} designs without a backbone")
+        if len(kept) == 0:
+            return designs
+        found = [found[k] for k in kept]
+        paths = [paths[k] for k in kept]
+        backbones = Backbones(
+            [ca[chain == chain[0]] for ca, chain in (read[k] for k in kept)]
+        )
+        rows, representatives = cluster_rows(
+            [path.stem for path in paths], backbones, cluster_representatives
+        )
+
+    local_dir = Path(f"/root/outputs/{run_name}_clusters")
+    local_dir.mkdir(parents=True, exist_ok=True)
+    clusters = local_dir / f"{run_name}_clusters.csv"
+    write_clusters(rows, clusters)
+    LPath(f"{remote_dir}/{clusters.name}").upload_from(clusters)
+
+    print(
+        f"Copying {len(representatives)} representatives to {remote_dir}/representatives"
+    )
+    for i in representatives:
+        pdb = found[i][1]
+        for suffix in (".pdb", ".trb"):
+            name = Path(pdb.name()).with_suffix(suffix).name
+            source = LPath(f"{pdb.path.rsplit('/', 1)[0]}/{name}")
+            source.copy_to(LPath(f"{remote_dir}/representatives/{name}"))
+    return designs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("design_dir", type=Path)
+    parser.add_argument("run_name")
+    parser.add_argument("count", type=int)
+    parser.add_argument("output", type=Path)
+    args = parser.parse_args()
+
+    names, chains = [], []
+    for _, name in design_pairs(args.design_dir, args.run_name):
+        ca, chain = read_design_ca(args.design_dir / f"{name}.pdb")
+        if len(ca) > 0:
+            names.append(name)
+            chains.append(ca[chain == chain[0]])
+    backbones = Backbones(chains)
+    rows, _ = cluster_rows(names, backbones, args.count)
+    write_clusters(rows, args.output)
@@ -0,0 +1,289 @@
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from latch.resources.tasks import small_task
+from latch.types.directory import LatchDir, LatchOutputDir
+from latch.types.file import LatchFile
+
+from wf.params import (
+    PotentialDecayType,
+    RFdiffusionParams,
+    RunOptions,
+    SymmetryType,
+    TrajectoryMode,
+    build_command,
+)
+from wf.preflight import index_pdb, parse_contig
+
+SYMMETRY_ORDER = {
+    SymmetryType.CYCLIC_4: 4,
+    SymmetryType.CYCLIC_6: 6,
+    SymmetryType.DIHEDRAL_2: 4,
+    SymmetryType.DIHEDRAL_4: 8,
+    SymmetryType.TETRAHEDRAL: 12,
+}
+
+# Rough estimates, not fitted to measurements: memory is dominated by the
+# L x L pair features, time per step by the same pair updates on top of a
+# fixed cost. Near a tier boundary, the choice is only as good as these.
+BASE_MEMORY_GB = 2.5
+MEMORY_GB_PER_PAIR = 6e-5
+BASE_STEP_SECONDS = 0.3
+STEP_SECONDS_PER_PAIR = 1.5e-5
+# Symmetrizing every step adds a little on top of the full-oligomer pass.
+SYMMETRY_OVERHEAD = 0.05
+MODEL_LOAD_SECONDS = 60.0
+
+
+@dataclass
+class GpuTier:
+    name: str
+    memory_gb: float
+    # Step time relative to a V100.
+    speed: float
+
+
+# Ordered cheapest first. Memory leaves headroom for the CUDA context.
+GPU_TIERS = [
+    GpuTier("SMALL_GPU", 14.5, 2.0),
+    GpuTier("V100", 14.5, 1.0),
+    GpuTier("LARGE_GPU", 22.0, 0.8),
+]
+# Jobs that would finish within this on the small tier do not need a V100.
+SMALL_GPU_MAX_SECONDS = 3600.0
+# V100s in a multi-GPU task, each running its own share of the designs.
+MULTI_GPU_DEVICES = 4
+
+
+@dataclass
+class CostEstimate:
+    max_length: int
+    steps: int
+    gpu_memory_gb: float
+    seconds_per_design: float
+    total_seconds: float
+    tier: str
+
+
+def design_length_range(params: RFdiffusionParams, target_residues: int) -> List[int]:
+    _, low, high, receptor = parse_contig(
+        params.contig_string, None, check_chains=False
+    )
+    if params.contig_length:
+        match = re.fullmatch(r"(\d+)(?:-(\d+))?", params.contig_length.strip())
+        if match is not None:
+            # contigmap.length bounds everything but the fixed receptor chains.
+            low = receptor + int(match.group(1))
+            high = receptor + int(match.group(2) or match.group(1))
+    # Scaffold-guided binder runs diffuse the scaffold next to the full target.
+    return [low + target_residues, high + target_residues]
+
+
+def estimate_cost(
+    params: RFdiffusionParams,
+    num_designs: int,
+    target_residues: int = 0,
+    num_tasks: int = 1,
+    tiers: List[GpuTier] = GPU_TIERS,
+) -> CostEstimate:
+    """Predicted GPU memory and V100 wall time for a run.
+
+    The contig length already includes every subunit of a symmetric
+    oligomer, so symmetry only adds the per-step symmetrization overhead.
+    """
+    max_length = design_length_range(params, target_residues)[1]
+    steps = params.partial_T if params.partial_T is not None else params.final_step
+
+    memory = BASE_MEMORY_GB + MEMORY_GB_PER_PAIR * max_length**2
+    step_seconds = BASE_STEP_SECONDS + STEP_SECONDS_PER_PAIR * max_length**2
+    symmetry = params.symmetry_gen or params.symmetry_motif
+    if symmetry is not None:
+        step_seconds *= 1 + SYMMETRY_OVERHEAD * SYMMETRY_ORDER[symmetry]
+    per_design = steps * step_seconds
+
+    designs_per_task = -(-num_designs // max(num_tasks, 1))
+    tier = tiers[-1]
+    for candidate in tiers:
+        if memory > candidate.memory_gb:
+            continue
+        seconds = designs_per_task * per_design * candidate.speed
+        if candidate.name == "SMALL_GPU" and seconds > SMALL_GPU_MAX_SECONDS:
+            continue
+        tier = candidate
+        break
+
+    return CostEstimate(
+        max_length=max_length,
+        steps=steps,
+        gpu_memory_gb=memory,
+        seconds_per_design=per_design * tier.speed,
+        total_seconds=MODEL_LOAD_SECONDS + designs_per_task * per_design * tier.speed,
+        tier=tier.name,
+    )
+
+
+def format_seconds(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s"
+
+
+class SizedRun(NamedTuple):
+    tier: str
+    params: RFdiffusionParams
+    options: RunOptions
+
+
+@small_task
+def size_task(
+    run_name: str,
+    num_designs: int,
+    contig_string: str,
+    contig_length: Optional[str] = None,
+    contig_provide_seq: Optional[str] = None,
+    input_pdb: Optional[LatchFile] = None,
+    hotspot_residues_binder: Optional[str] = None,
+    hotspot_residues_motif: Optional[str] = None,
+    hotspot_residues_ppi: Optional[str] = None,
+    scaffold_dir: Optional[LatchDir] = None,
+    target_path: Optional[LatchFile] = None,
+    target_ss: Optional[LatchFile] = None,
+    target_adj: Optional[LatchFile] = None,
+    symmetry_gen: Optional[SymmetryType] = None,
+    symmetry_motif: Optional[SymmetryType] = None,
+    partial_T: Optional[int] = None,
+    final_step: int = 50,
+    noise_scale_ca: float = 1.0,
+    noise_scale_frame: float = 1.0,
+    guiding_potentials: Optional[List[str]] = None,
+    ckpt_override_path: Optional[LatchFile] = None,
+    potentials_olig_intra_all: bool = False,
+    potentials_olig_inter_all: bool = False,
+    potentials_guide_scale: float = 1.0,
+    potentials_substrate: Optional[str] = None,
+    potentials_guide_decay: PotentialDecayType = PotentialDecayType.CONSTANT,
+    contig_inpaint_str_strand: Optional[str] = None,
+    contig_inpaint_str_helix: Optional[str] = None,
+    contig_inpaint_str: Optional[str] = None,
+    scaffoldguided: bool = False,
+    scaffoldguided_mask_loops: bool = False,
+    scaffoldguided_target_pdb: bool = False,
+    trajectory_mode: TrajectoryMode = TrajectoryMode.FULL,
+    trajectory_stride: int = 1,
+    num_shards: int = 1,
+    dry_run: bool = False,
+    scaffold_library: Optional[LatchFile] = None,
+    multi_gpu: bool = False,
+    resume: bool = False,
+    persistent_worker: bool = True,
+    stream_uploads: bool = False,
+    pack_designs: bool = False,
+    yield_target: int = 0,
+    filter_max_chain_breaks: int = 0,
+    filter_max_clashes: int = 0,
+    filter_max_rg_ratio: float = 1.5,
+    filter_max_loop_fraction: float = 0.6,
+    design_retries: int = 2,
+    deterministic: bool = False,
+) -> SizedRun:
+    params = RFdiffusionParams(
+        contig_string=contig_string,
+        contig_length=contig_length,
+        contig_provide_seq=contig_provide_seq,
+        input_pdb=input_pdb,
+        hotspot_residues_binder=hotspot_residues_binder,
+        hotspot_residues_motif=hotspot_residues_motif,
+        hotspot_residues_ppi=hotspot_residues_ppi,
+        scaffold_dir=scaffold_dir,
+        target_path=target_path,
+        target_ss=target_ss,
+        target_adj=target_adj,
+        symmetry_gen=symmetry_gen,
+        symmetry_motif=symmetry_motif,
+        partial_T=partial_T,
+        final_step=final_step,
+        noise_scale_ca=noise_scale_ca,
+        noise_scale_frame=noise_scale_frame,
+        guiding_potentials=guiding_potentials,
+        ckpt_override_path=ckpt_override_path,
+        potentials_olig_intra_all=potentials_olig_intra_all,
+        potentials_olig_inter_all=potentials_olig_inter_all,
+        potentials_guide_scale=potentials_guide_scale,
+        potentials_substrate=potentials_substrate,
+        potentials_guide_decay=potentials_guide_decay,
+        contig_inpaint_str_strand=contig_inpaint_str_strand,
+        contig_inpaint_str_helix=contig_inpaint_str_helix,
+        contig_inpaint_str=contig_inpaint_str,
+        scaffoldguided=scaffoldguided,
+        scaffoldguided_mask_loops=scaffoldguided_mask_loops,
+        scaffoldguided_target_pdb=scaffoldguided_target_pdb,
+        trajectory_mode=trajectory_mode,
+        trajectory_stride=trajectory_stride,
+        scaffold_library=scaffold_library,
+    )
+    options = RunOptions(
+        resume=resume,
+        persistent_worker=persistent_worker,
+        # A preempted task uploads nothing at the end, so a run that may be
+        # resumed has to upload each design as it finishes.
+        stream_uploads=stream_uploads or resume,
+        pack_designs=pack_designs,
+        yield_target=yield_target,
+        filter_max_chain_breaks=filter_max_chain_breaks,
+        filter_max_clashes=filter_max_clashes,
+        filter_max_rg_ratio=filter_max_rg_ratio,
+        filter_max_loop_fraction=filter_max_loop_fraction,
+        design_retries=design_retries,
+        deterministic=deterministic,
+    )
+
+    target_residues = 0
+    if target_path is not None and (
+        scaffoldguided or scaffold_dir is not None or scaffold_library is not None
+    ):
+        pdb = index_pdb(Path(target_path.local_path))
+        target_residues = sum(len(residues) for residues in pdb.values())
+
+    estimate = estimate_cost(params, num_designs, target_residues, num_shards)
+    tier = estimate.tier
+    # Multi-GPU applies to single-task runs on V100s; shards each get one GPU.
+    if multi_gpu and num_shards <= 1:
+        v100 = [t for t in GPU_TIERS if t.name == "V100"]
+        if estimate.gpu_memory_gb <= v100[0].memory_gb:
+            # Each GPU runs its share of the designs, so time one share.
+            estimate = estimate_cost(
+                params, num_designs, target_residues, MULTI_GPU_DEVICES, v100
+            )
+            tier = "MULTI_GPU"
+        else:
+            print("Designs do not fit a V100, running on a single GPU instead")
+    print("-" * 60)
+    print("Cost estimate")
+    print(f"Longest design: {estimate.max_length} residues, {estimate.steps} steps")
+    print(f"GPU memory: {estimate.gpu_memory_gb:.1f} GB")
+    print(f"Per design: {format_seconds(estimate.seconds_per_design)}")
+    print(
+        f"Wall time: {format_seconds(estimate.total_seconds)}"
+        + (f" per shard ({num_shards} shards)" if num_shards > 1 else "")
+        + (f" ({MULTI_GPU_DEVICES} GPUs)" if tier == "MULTI_GPU" else "")
+    )
+    print(f"GPU tier: {tier}")
+    if estimate.gpu_memory_gb > GPU_TIERS[-1].memory_gb:
+        print("Warning: the estimate exceeds the memory of the largest GPU tier")
+
+    print("-" * 60)
+    print("Command")
+    command = build_command(params, f"/root/outputs/{run_name}/{run_name}", num_designs)
+    print(" ".join(command))
+
+    if dry_run:
+        print("Dry run: no GPU task will be started")
+        return SizedRun(tier="DRY_RUN", params=params, options=options)
+    return SizedRun(tier=tier, params=params, options=options)
+
+
+@small_task
+def dry_run_task(output_directory: LatchOutputDir) -> LatchOutputDir:
+    return LatchOutputDir(output_directory.remote_path)
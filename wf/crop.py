@@ -0,0 +1,220 @@
+import hashlib
+import json
+import tempfile
+from itertools import product
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from latch.ldata.path import LPath
+from latch.ldata.type import LatchPathError
+from latch.resources.tasks import small_task
+from latch.resources.workflow import workflow
+from latch.types.directory import LatchOutputDir
+from latch.types.file import LatchFile
+
+from wf.preflight import RESIDUE, SEGMENT
+
+# Kept stretches of a chain separated by fewer dropped residues than this are
+# joined, so loops near the site are not cut into fragments.
+MERGE_GAP = 8
+# Isolated stretches shorter than this are dropped unless they hold a hotspot.
+MIN_SEGMENT = 4
+CROP_VERSION = 1
+
+Residue = Tuple[str, int]
+
+
+def read_atoms(path: Path) -> Tuple[np.ndarray, List[Residue]]:
+    coords = []
+    residues = []
+    with open(path) as f:
+        for line in f:
+            if line.startswith("ATOM") and line[76:78].strip() != "H":
+                coords.append(
+                    (float(line[30:38]), float(line[38:46]), float(line[46:54]))
+                )
+                residues.append((line[21], int(line[22:26])))
+    return np.array(coords, dtype=np.float64).reshape(-1, 3), residues
+
+
+class NeighborGrid:
+    """Uniform grid over atom coordinates with cells as wide as the query radius.
+
+    Every atom within `radius` of a point lies in the point's cell or one of
+    the 26 around it, so a query only measures distances to those atoms.
+    """
+
+    def __init__(self, coords: np.ndarray, radius: float):
+        self.coords = coords
+        self.radius = radius
+        self.cells: Dict[Tuple[int, ...], List[int]] = {}
+        for i, cell in enumerate(map(tuple, np.floor(coords / radius).astype(int))):
+            self.cells.setdefault(cell, []).append(i)
+
+    def within(self, point: np.ndarray) -> np.ndarray:
+        cx, cy, cz = np.floor(point / self.radius).astype(int)
+        candidates = [
+            i
+            for dx, dy, dz in product((-1, 0, 1), repeat=3)
+            for i in self.cells.get((cx + dx, cy + dy, cz + dz), [])
+        ]
+        if len(candidates) == 0:
+            return np.array([], dtype=int)
+        candidates = np.array(candidates)
+        distances = np.linalg.norm(self.coords[candidates] - point, axis=1)
+        return candidates[distances <= self.radius]
+
+
+def parse_hotspots(hotspots: str) -> List[Residue]:
+    parsed = []
+    for hotspot in hotspots.replace(" ", "").split(","):
+        match = RESIDUE.fullmatch(hotspot)
+        if match is None:
+            raise ValueError(f"Hotspot '{hotspot}' is not a residue like A30")
+        parsed.append((match.group(1), int(match.group(2))))
+    return parsed
+
+
+def stretches(numbers: List[int]) -> List[List[int]]:
+    """Runs of kept residue numbers, with runs less than MERGE_GAP apart joined."""
+    runs: List[List[int]] = []
+    for n in numbers:
+        if len(runs) > 0 and n - runs[-1][1] <= MERGE_GAP:
+            runs[-1][1] = n
+        else:
+            runs.append([n, n])
+    return runs
+
+
+def crop_contig(
+    contig_string: str, pdb_path: Path, hotspots: List[Residue], radius: float
+) -> Tuple[str, int, int]:
+    """Keep only the target residues within `radius` Å of a hotspot atom.
+
+    Each chain segment of the contig (e.g. `A1-600`) is replaced by the
+    stretches that survive, separated by chain breaks so RFdiffusion does
+    not treat the cut ends as bonded. Returns the new contig string and the
+    number of target residues before and after.
+    """
+    coords, residues = read_atoms(pdb_path)
+    grid = NeighborGrid(coords, radius)
+
+    near: Set[Residue] = set(hotspots)
+    hotspot_atoms = [i for i, residue in enumerate(residues) if residue in near]
+    if len(hotspot_atoms) == 0:
+        raise ValueError("None of the hotspot residues are in the input structure")
+    for i in hotspot_atoms:
+        near.update(residues[j] for j in grid.within(coords[i]))
+
+    present = set(residues)
+    before, after = 0, 0
+    groups = []
+    for chain_contig in contig_string.split():
+        pieces = []
+        for segment in chain_contig.split("/"):
+            match = SEGMENT.fullmatch(segment)
+            if match is None or not match.group(1):
+                pieces.append(segment)
+                continue
+
+            chain, start = match.group(1), int(match.group(2))
+            end = int(match.group(3)) if match.group(3) is not None else start
+            span = [n for n in range(start, end + 1) if (chain, n) in present]
+            kept = [n for n in span if (chain, n) in near]
+            # Fill merged gaps with every residue the structure has there.
+            runs = [
+                [n for n in span if a <= n <= b]
+                for a, b in stretches(kept)
+                if b - a + 1 >= MIN_SEGMENT
+                or any((chain, n) in hotspots for n in range(a, b + 1))
+            ]
+            before += len(span)
+            after += sum(len(run) for run in runs)
+            cropped = "/0 ".join(f"{chain}{run[0]}-{run[-1]}" for run in runs)
+            if cropped:
+                pieces.append(cropped)
+
+        # Drop separators left dangling by segments that were cropped away.
+        while len(pieces) > 0 and pieces[0] == "0":
+            pieces.pop(0)
+        if len(pieces) > 0:
+            groups.append("/".join(pieces))
+    return " ".join(groups), before, after
+
+
+def crop_cache_key(
+    pdb_path: Path, contig_string: str, hotspots: str, radius: float
+) -> str:
+    digest = hashlib.sha256()
+    with open(pdb_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(
+        json.dumps(
+            [contig_string, hotspots, radius, MERGE_GAP, MIN_SEGMENT, CROP_VERSION]
+        ).encode()
+    )
+    return digest.hexdigest()
+
+
+def cached_crop(remote_path: str) -> Optional[Dict]:
+    cached = LPath(remote_path)
+    try:
+        cached.size()
+    except LatchPathError:
+        return None
+    with tempfile.TemporaryDirectory() as scratch:
+        with open(cached.download(Path(scratch) / "crop.json")) as f:
+            return json.load(f)
+
+
+@workflow
+def uncropped_contig(contig_string: str) -> str:
+    """Uncropped Target
+
+    Keeps the contig as it is when Crop Target is off, without starting a task.
+    """
+    return contig_string
+
+
+@small_task
+def crop_target_task(
+    contig_string: str,
+    output_directory: LatchOutputDir,
+    input_pdb: Optional[LatchFile] = None,
+    hotspot_residues_binder: Optional[str] = None,
+    crop_target: bool = False,
+    crop_radius: float = 15.0,
+) -> str:
+    if not crop_target:
+        return contig_string
+    if input_pdb is None or not hotspot_residues_binder:
+        raise ValueError("Target cropping needs input_pdb and hotspot_residues_binder")
+
+    pdb_path = Path(input_pdb.local_path)
+    key = crop_cache_key(pdb_path, contig_string, hotspot_residues_binder, crop_radius)
+    cache_path = f"{output_directory.remote_path.rstrip('/')}/.crop_cache/{key}.json"
+
+    crop = cached_crop(cache_path)
+    if crop is not None:
+        print(f"Using cached crop {key[:12]}")
+    else:
+        cropped, before, after = crop_contig(
+            contig_string,
+            pdb_path,
+            parse_hotspots(hotspot_residues_binder),
+            crop_radius,
+        )
+        crop = {"contig_string": cropped, "before": before, "after": after}
+        with tempfile.TemporaryDirectory() as scratch:
+            local = Path(scratch) / "crop.json"
+            local.write_text(json.dumps(crop))
+            LPath(cache_path).upload_from(local)
+
+    print(f"Cropped contig: {crop['contig_string']}")
+    print(
+        f"Target residues: {crop['before']} -> {crop['after']}"
+        f" ({1 - crop['after'] / max(crop['before'], 1):.0%} fewer)"
+    )
+    return crop["contig_string"]
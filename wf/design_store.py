@@ -0,0 +1,287 @@
+"""Packed, memory-mappable store for all designs of a run.
+
+A store is a directory of `.npy` arrays that `np.load(mmap_mode="r")` maps
+without parsing, so one design or the whole run can be read without
+touching thousands of PDB and pickle files:
+
+    names              (designs,)          design names, e.g. "run_0"
+    residue_offsets    (designs + 1,)      residue range of each design
+    coords             (residues, 4, 3)    N, CA, C, O (NaN if missing)
+    chain              (residues,)
+    residue_index      (residues,)
+    residue_name       (residues,)
+    bfactor            (residues,)
+    inpaint_seq, ...   (residues,)         per-residue trb masks
+    con_ref_pdb_idx_*  (mapped residues,)  trb motif mappings, each with its
+    con_hal_idx0, ...                      own `<field>_offsets`
+    sampled_mask       (designs,)          JSON-encoded
+
+Any remaining `.trb` fields (config, plddt, timings) are kept in
+`extras.pkl`, so `export` can write every design back out as a `.pdb`/`.trb`
+pair.
+
+    python -m wf.design_store pack <design dir> <run name> <store>
+    python -m wf.design_store export <store> <output dir> [name ...]
+"""
+
+import argparse
+import json
+import pickle
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+BACKBONE_ATOMS = ("N", "CA", "C", "O")
+PER_RESIDUE_FIELDS = ("inpaint_seq", "inpaint_str", "mask_1d")
+PDB_IDX_FIELDS = (
+    "con_ref_pdb_idx",
+    "con_hal_pdb_idx",
+    "complex_con_ref_pdb_idx",
+    "complex_con_hal_pdb_idx",
+)
+IDX0_FIELDS = (
+    "con_ref_idx0",
+    "con_hal_idx0",
+    "complex_con_ref_idx0",
+    "complex_con_hal_idx0",
+)
+PACKED_FIELDS = (
+    "sampled_mask",
+    *PER_RESIDUE_FIELDS,
+    *PDB_IDX_FIELDS,
+    *IDX0_FIELDS,
+)
+
+
+def read_backbone(path: Path) -> Dict[str, np.ndarray]:
+    residues: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    with open(path) as f:
+        for line in f:
+            if not line.startswith("ATOM"):
+                continue
+            key = (line[21], int(line[22:26]))
+            residue = residues.setdefault(
+                key,
+                {
+                    "name": line[17:20].strip(),
+                    "bfactor": float(line[60:66].strip() or 0.0),
+                    "atoms": {},
+                },
+            )
+            residue["atoms"][line[12:16].strip()] = [
+                float(line[30:38]),
+                float(line[38:46]),
+                float(line[46:54]),
+            ]
+
+    coords = np.full((len(residues), len(BACKBONE_ATOMS), 3), np.nan, np.float32)
+    for i, residue in enumerate(residues.values()):
+        for j, atom in enumerate(BACKBONE_ATOMS):
+            if atom in residue["atoms"]:
+                coords[i, j] = residue["atoms"][atom]
+
+    return {
+        "coords": coords,
+        "chain": np.array([chain for chain, _ in residues], dtype="U1"),
+        "residue_index": np.array([i for _, i in residues], dtype=np.int32),
+        "residue_name": np.array([r["name"] for r in residues.values()], dtype="U3"),
+        "bfactor": np.array([r["bfactor"] for r in residues.values()], np.float32),
+    }
+
+
+def design_pairs(design_dir: Path, run_name: str) -> List[Tuple[int, str]]:
+    """`(index, name)` of every design in `design_dir` with both a .pdb and a .trb."""
+    pairs = []
+    for pdb in design_dir.glob(f"{run_name}_*.pdb"):
+        index = pdb.stem[len(run_name) + 1 :]
+        if index.isdigit() and pdb.with_suffix(".trb").exists():
+            pairs.append((int(index), pdb.stem))
+    return sorted(pairs)
+
+
+def pack_designs(design_dir: Path, run_name: str, store_dir: Path) -> int:
+    names = [name for _, name in design_pairs(design_dir, run_name)]
+    if len(names) == 0:
+        return 0
+
+    columns: Dict[str, List[np.ndarray]] = {}
+    offsets: Dict[str, List[int]] = {}
+    sampled_masks = []
+    extras = []
+
+    def append(field: str, values: np.ndarray) -> None:
+        columns.setdefault(field, []).append(values)
+
+    def advance(field: str, count: int) -> None:
+        running = offsets.setdefault(f"{field}_offsets", [0])
+        running.append(running[-1] + count)
+
+    for name in names:
+        backbone = read_backbone(design_dir / f"{name}.pdb")
+        length = len(backbone["coords"])
+        for field, values in backbone.items():
+            append(field, values)
+        advance("residue", length)
+
+        with open(design_dir / f"{name}.trb", "rb") as f:
+            trb = pickle.load(f)
+        packed = [field for field in PACKED_FIELDS if field in trb]
+
+        for field in PER_RESIDUE_FIELDS:
+            values = np.asarray(trb.get(field, [True] * length), dtype=bool)
+            if values.shape != (length,):
+                raise ValueError(f"{name}: {field} does not match the backbone length")
+            append(field, values)
+            trb.pop(field, None)
+
+        for field in PDB_IDX_FIELDS:
+            mapping = trb.pop(field, [])
+            append(f"{field}_chain", np.array([c for c, _ in mapping], dtype="U1"))
+            append(f"{field}_resnum", np.array([i for _, i in mapping], np.int32))
+            advance(field, len(mapping))
+        for field in IDX0_FIELDS:
+            mapping = np.asarray(trb.pop(field, []), dtype=np.int32)
+            append(field, mapping)
+            advance(field, len(mapping))
+
+        sampled_masks.append(json.dumps(list(trb.pop("sampled_mask", []))))
+        extras.append({"packed": packed, "trb": trb})
+
+    store_dir.mkdir(parents=True, exist_ok=True)
+    np.save(store_dir / "names.npy", np.array(names, dtype=str))
+    np.save(store_dir / "sampled_mask.npy", np.array(sampled_masks, dtype=str))
+    for field, values in offsets.items():
+        np.save(store_dir / f"{field}.npy", np.array(values, dtype=np.int64))
+    for field, chunks in columns.items():
+        np.save(store_dir / f"{field}.npy", np.concatenate(chunks))
+    with open(store_dir / "extras.pkl", "wb") as f:
+        pickle.dump(extras, f)
+    return len(names)
+
+
+class DesignStore:
+    def __init__(self, store_dir: Path):
+        self.store_dir = store_dir
+        self.arrays = {
+            path.stem: np.load(path, mmap_mode="r")
+            for path in sorted(store_dir.glob("*.npy"))
+        }
+        self.names: List[str] = self.arrays["names"].tolist()
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self._extras: Optional[List[Dict[str, Any]]] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def extras(self) -> List[Dict[str, Any]]:
+        if self._extras is None:
+            with open(self.store_dir / "extras.pkl", "rb") as f:
+                self._extras = pickle.load(f)
+        return self._extras
+
+    def span(self, field: str, i: int) -> slice:
+        offsets = self.arrays[f"{field}_offsets"]
+        return slice(int(offsets[i]), int(offsets[i + 1]))
+
+    def backbone(self, name: str) -> np.ndarray:
+        """`(residues, 4, 3)` view of one design's backbone."""
+        return self.arrays["coords"][self.span("residue", self.index[name])]
+
+    def design(self, name: str) -> Dict[str, np.ndarray]:
+        i = self.index[name]
+        residues = self.span("residue", i)
+        return {
+            field: self.arrays[field][residues]
+            for field in (
+                "coords",
+                "chain",
+                "residue_index",
+                "residue_name",
+                "bfactor",
+                *PER_RESIDUE_FIELDS,
+            )
+        }
+
+    def trb(self, name: str) -> Dict[str, Any]:
+        i = self.index[name]
+        residues = self.span("residue", i)
+        trb = dict(self.extras[i]["trb"])
+        trb["sampled_mask"] = json.loads(str(self.arrays["sampled_mask"][i]))
+        for field in PER_RESIDUE_FIELDS:
+            trb[field] = np.array(self.arrays[field][residues])
+        for field in PDB_IDX_FIELDS:
+            mapped = self.span(field, i)
+            trb[field] = list(
+                zip(
+                    self.arrays[f"{field}_chain"][mapped].tolist(),
+                    self.arrays[f"{field}_resnum"][mapped].tolist(),
+                )
+            )
+        for field in IDX0_FIELDS:
+            trb[field] = np.array(self.arrays[field][self.span(field, i)])
+        # Fields the original .trb did not have were packed as defaults.
+        packed = set(self.extras[i]["packed"])
+        return {k: v for k, v in trb.items() if k in packed or k not in PACKED_FIELDS}
+
+    def export(self, name: str, output_dir: Path) -> None:
+        design = self.design(name)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        serial = 1
+        with open(output_dir / f"{name}.pdb", "w") as f:
+            for k, xyz in enumerate(design["coords"]):
+                for atom, (x, y, z) in zip(BACKBONE_ATOMS, xyz):
+                    if np.isnan(x):
+                        continue
+                    f.write(
+                        "%-6s%5s %4s %3s %s%4d    %8.3f%8.3f%8.3f%6.2f%6.2f\n"
+                        % (
+                            "ATOM",
+                            serial,
+                            f" {atom:<3s}",
+                            design["residue_name"][k],
+                            design["chain"][k],
+                            design["residue_index"][k],
+                            x,
+                            y,
+                            z,
+                            1.0,
+                            design["bfactor"][k],
+                        )
+                    )
+                    serial += 1
+
+        with open(output_dir / f"{name}.trb", "wb") as f:
+            pickle.dump(self.trb(name), f)
+
+
+def pack_design_store(local_output_dir: Path, run_name: str, store_name: str) -> None:
+    store_dir = local_output_dir / store_name
+    print("-" * 60)
+    print(f"Packing designs into {store_dir}")
+    count = pack_designs(local_output_dir, run_name, store_dir)
+    print(f"Packed {count} designs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack = commands.add_parser("pack")
+    pack.add_argument("design_dir", type=Path)
+    pack.add_argument("run_name")
+    pack.add_argument("store", type=Path)
+    export = commands.add_parser("export")
+    export.add_argument("store", type=Path)
+    export.add_argument("output_dir", type=Path)
+    export.add_argument("names", nargs="*")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        print(f"Packed {pack_designs(args.design_dir, args.run_name, args.store)}")
+    else:
+        store = DesignStore(args.store)
+        for name in args.names or store.names:
+            store.export(name, args.output_dir)
+        print(f"Exported {len(args.names or store.names)} designs to {args.output_dir}")
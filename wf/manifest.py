@@ -0,0 +1,176 @@
+import csv
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from wf.design_store import design_pairs
+
+MANIFEST_COLUMNS = [
+    "design",
+    "index",
+    "length",
+    "sampled_contig",
+    "motif_reference",
+    "motif_design",
+    "wall_time",
+    "radius_of_gyration",
+    "end_to_end",
+    "helix_fraction",
+    "strand_fraction",
+]
+# Designs are padded to the longest backbone in a chunk; chunking keeps the
+# padded arrays small however many designs a run has.
+CHUNK_SIZE = 1024
+
+# CA(i)-CA(i+2), CA(i)-CA(i+3) and CA(i)-CA(i+4) distances (Å) with
+# tolerances for α-helices and β-strands, as used by P-SEA.
+HELIX_DISTANCES = ((5.5, 0.5), (5.3, 0.5), (6.4, 0.6))
+STRAND_DISTANCES = ((6.7, 0.6), (9.9, 0.9), (12.4, 1.1))
+
+
+def read_ca(path: Path) -> np.ndarray:
+    ca = []
+    with open(path) as f:
+        for line in f:
+            if line.startswith("ATOM") and line[12:16] == " CA ":
+                ca.append((float(line[30:38]), float(line[38:46]), float(line[46:54])))
+    return np.array(ca, dtype=np.float32).reshape(-1, 3)
+
+
+def pad(backbones: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    longest = max(len(ca) for ca in backbones)
+    coords = np.zeros((len(backbones), longest, 3), dtype=np.float32)
+    mask = np.zeros((len(backbones), longest), dtype=bool)
+    for i, ca in enumerate(backbones):
+        coords[i, : len(ca)] = ca
+        mask[i, : len(ca)] = True
+    return coords, mask
+
+
+def matches(
+    coords: np.ndarray, mask: np.ndarray, distances: Tuple[Tuple[float, float], ...]
+) -> np.ndarray:
+    """Residues whose CA(i)-CA(i+k) distances fall in `distances` for k = 2, 3, 4."""
+    hits = np.zeros(mask.shape, dtype=bool)
+    span = len(distances) + 1
+    if mask.shape[1] <= span:
+        return hits
+
+    window = mask[:, :-span].copy()
+    for k, (target, tolerance) in enumerate(distances, start=2):
+        d = np.linalg.norm(coords[:, k:] - coords[:, :-k], axis=-1)
+        d = d[:, : window.shape[1]]
+        window &= mask[:, k : k + window.shape[1]] & (np.abs(d - target) < tolerance)
+
+    # A match at i covers the segment i..i+4.
+    for offset in range(span + 1):
+        hits[:, offset : offset + window.shape[1]] |= window
+    return hits & mask
+
+
+def descriptors(backbones: List[np.ndarray]) -> Dict[str, np.ndarray]:
+    columns: Dict[str, List[np.ndarray]] = {
+        "radius_of_gyration": [],
+        "end_to_end": [],
+        "helix_fraction": [],
+        "strand_fraction": [],
+    }
+    for start in range(0, len(backbones), CHUNK_SIZE):
+        coords, mask = pad(backbones[start : start + CHUNK_SIZE])
+        lengths = np.maximum(mask.sum(axis=1), 1)
+
+        centroid = coords.sum(axis=1) / lengths[:, None]
+        squared = ((coords - centroid[:, None]) ** 2).sum(axis=-1) * mask
+        columns["radius_of_gyration"].append(np.sqrt(squared.sum(axis=1) / lengths))
+
+        last = coords[np.arange(len(coords)), lengths - 1]
+        columns["end_to_end"].append(np.linalg.norm(last - coords[:, 0], axis=-1))
+
+        helix = matches(coords, mask, HELIX_DISTANCES)
+        strand = matches(coords, mask, STRAND_DISTANCES) & ~helix
+        columns["helix_fraction"].append(helix.sum(axis=1) / lengths)
+        columns["strand_fraction"].append(strand.sum(axis=1) / lengths)
+
+    return {name: np.concatenate(values) for name, values in columns.items()}
+
+
+def format_pdb_idx(mapping: List[Tuple[str, int]]) -> str:
+    return ",".join(f"{chain}{resnum}" for chain, resnum in mapping)
+
+
+def read_design(design_dir: Path, name: str) -> Tuple[np.ndarray, Dict[str, Any]]:
+    with open(design_dir / f"{name}.trb", "rb") as f:
+        trb = pickle.load(f)
+    return read_ca(design_dir / f"{name}.pdb"), trb
+
+
+def manifest_rows(design_dir: Path, run_name: str) -> List[Dict[str, Any]]:
+    pairs = design_pairs(design_dir, run_name)
+    if len(pairs) == 0:
+        return []
+
+    with ThreadPoolExecutor(8) as pool:
+        designs = list(pool.map(lambda p: read_design(design_dir, p[1]), pairs))
+    values = descriptors([ca for ca, _ in designs])
+
+    rows = []
+    for i, ((index, name), (ca, trb)) in enumerate(zip(pairs, designs)):
+        rows.append(
+            {
+                "design": name,
+                "index": index,
+                "length": len(ca),
+                "sampled_contig": " ".join(trb.get("sampled_mask", [])),
+                "motif_reference": format_pdb_idx(trb.get("con_ref_pdb_idx", [])),
+                "motif_design": format_pdb_idx(trb.get("con_hal_pdb_idx", [])),
+                "wall_time": f"{trb['time']:.1f}" if "time" in trb else "",
+                **{column: f"{v[i]:.3f}" for column, v in values.items()},
+            }
+        )
+    return rows
+
+
+def read_manifest(path: Path) -> List[Dict[str, str]]:
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def merge_rows(parts: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Rows of every part by design index, later parts replacing earlier ones."""
+    by_index = {int(row["index"]): row for rows in parts for row in rows}
+    return [by_index[i] for i in sorted(by_index)]
+
+
+def write_rows(rows: List[Dict[str, Any]], path: Path) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, MANIFEST_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_manifest(
+    design_dir: Path, run_name: str, path: Path, previous: Optional[Path] = None
+) -> None:
+    """Describe the designs in `design_dir`.
+
+    `previous` is the manifest of an earlier attempt at the run (e.g. before
+    a resume), whose designs that were not generated again are kept.
+    """
+    rows = manifest_rows(design_dir, run_name)
+    generated = len(rows)
+    if previous is not None:
+        rows = merge_rows([read_manifest(previous), rows])
+    write_rows(rows, path)
+    print(
+        f"Wrote manifest of {len(rows)} designs ({generated} generated in this"
+        f" task) to {path}"
+    )
+
+
+def merge_manifests(paths: List[Path], path: Path) -> None:
+    rows = merge_rows([read_manifest(part) for part in paths])
+    write_rows(rows, path)
+    print(f"Merged {len(paths)} manifests ({len(rows)} designs) into {path}")
@@ -0,0 +1,390 @@
+"""Memoized design runs, keyed by parameters, input versions and seeds.
+
+A run's key is the SHA-256 of a canonical JSON document with
+
+- every parameter that shapes the designs: the `RFdiffusionParams` fields,
+  `num_designs`, `pack_designs`, `yield_target` and the quality thresholds,
+  and the run name when it seeds the draw from a scaffold library
+- the Latch Data version (wf.versions) of `input_pdb`, `target_path`,
+  `target_ss`, `target_adj`, `scaffold_dir`, `ckpt_override_path` and
+  `scaffold_library`, or the URL of the built-in checkpoint, which embeds
+  its MD5. Versions are read without downloading anything, so an input
+  re-uploaded with the same content is a miss.
+- the per-design seeds: the design indices, seeded from their index
+
+Only runs whose designs are seeded from their index (inference.deterministic:
+sharded runs, or `deterministic`) are memoized; a randomly seeded run would
+not give the same designs again. Runs in which a design was only recovered
+by a retry, which uses a fresh seed, are not recorded either.
+
+Once every design of a run is in the output directory, `<key>.json` in the
+result cache records the run directory, its run name and the size of each
+of its files. A later run with the same key copies those files into its own
+run directory, renamed for its own run name, or returns them as they are if
+it is the same directory, instead of allocating a GPU. An entry whose files
+were removed or changed is ignored.
+
+The cache is `.result_cache` in the output directory. Set
+`RFDIFFUSION_RESULT_CACHE` to a latch:// directory to share one cache
+across output directories.
+"""
+
+import csv
+import dataclasses
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional, Set, Tuple, Union
+
+import numpy as np
+from latch.ldata.path import LPath
+from latch.ldata.type import LatchPathError
+from latch.resources.tasks import small_task
+from latch.resources.workflow import workflow
+from latch.types.directory import LatchDir, LatchOutputDir
+from latch.types.file import LatchFile
+
+from wf.cache import CACHED_INPUTS, tree_digest
+from wf.checkpoints import CHECKPOINT_URLS, checkpoint_name
+from wf.params import RFdiffusionParams, RunOptions
+from wf.resume import list_design_files, remote_run_dir
+from wf.versions import remote_version
+
+# Bump when the outputs of identical inputs change, e.g. a new RFdiffusion.
+MEMO_VERSION = 2
+
+
+class MemoizedRun(NamedTuple):
+    # HIT, MISS or BYPASS
+    status: str
+    key: str
+
+
+def canonical(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (LatchFile, LatchDir)):
+        return value.remote_path
+    return value
+
+
+def input_version(value: Union[LatchFile, LatchDir]) -> Optional[str]:
+    if value.remote_path is None:
+        return tree_digest(Path(value.local_path))
+    version = remote_version(value.remote_path)
+    return None if version is None else version.version
+
+
+def input_digests(params: RFdiffusionParams) -> Optional[Dict[str, Optional[str]]]:
+    """Version of every input, or None if one of them cannot be found."""
+    digests: Dict[str, Optional[str]] = {}
+    for name in [*CACHED_INPUTS, "scaffold_library"]:
+        value = getattr(params, name)
+        digests[name] = None if value is None else input_version(value)
+        if value is not None and digests[name] is None:
+            print(f"Cannot find {name} at {value.remote_path}")
+            return None
+
+    if params.ckpt_override_path is None:
+        name = checkpoint_name(params)
+        digests["checkpoint"] = CHECKPOINT_URLS.get(name, name)
+    return digests
+
+
+def result_key(
+    params: RFdiffusionParams,
+    settings: Dict[str, Any],
+    num_designs: int,
+    seeded_by_index: bool,
+) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """The key and the canonical document it hashes, if every input was found."""
+    inputs = input_digests(params)
+    if inputs is None:
+        return None
+    document = {
+        "version": MEMO_VERSION,
+        "params": {
+            field.name: canonical(getattr(params, field.name))
+            for field in dataclasses.fields(params)
+            if field.name not in inputs
+        },
+        "settings": settings,
+        "inputs": inputs,
+        "seeds": {
+            "design_indices": [0, num_designs],
+            "seeded_by_index": seeded_by_index,
+        },
+    }
+    encoded = json.dumps(document, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest(), document
+
+
+def cache_root(output_directory: str) -> str:
+    shared = os.environ.get("RFDIFFUSION_RESULT_CACHE")
+    if shared is not None:
+        return shared.rstrip("/")
+    return f"{output_directory.rstrip('/')}/.result_cache"
+
+
+def remote_files(root: str) -> Dict[str, int]:
+    """Size of every file under `root`, by path relative to it."""
+    files: Dict[str, int] = {}
+    pending = [""]
+    with ThreadPoolExecutor(16) as pool:
+        while len(pending) > 0:
+            relative = pending.pop()
+            directory = LPath(f"{root}/{relative}" if relative else root)
+            children = list(directory.iterdir())
+            for child, is_dir, size in pool.map(
+                lambda c: (c, c.is_dir(), c.size(load_if_missing=False)), children
+            ):
+                name = child.path.rstrip("/").rsplit("/", 1)[-1]
+                path = f"{relative}/{name}" if relative else name
+                if is_dir:
+                    pending.append(path)
+                elif size is not None:
+                    files[path] = size
+    return files
+
+
+def read_json(path: str) -> Optional[Dict[str, Any]]:
+    remote = LPath(path)
+    try:
+        remote.size()
+    except LatchPathError:
+        return None
+    with tempfile.TemporaryDirectory() as scratch:
+        with open(remote.download(Path(scratch) / "file.json")) as f:
+            return json.load(f)
+
+
+def entry_intact(entry: Dict[str, Any]) -> bool:
+    try:
+        found = remote_files(entry["run_dir"])
+    except LatchPathError:
+        return False
+    changed = [path for path, size in entry["files"].items() if found.get(path) != size]
+    if len(changed) > 0:
+        print(
+            f"{len(changed)} of the cached run's files are missing or changed,"
+            f" e.g. {changed[0]}"
+        )
+    return len(changed) == 0
+
+
+def renamed(path: str, old: str, new: str) -> str:
+    """`path` with every component named after run `old` named after `new`."""
+    return "/".join(
+        new + part[len(old) :] if part == old or part.startswith(f"{old}_") else part
+        for part in path.split("/")
+    )
+
+
+def lists_designs(path: str, run_name: str) -> bool:
+    """Whether a run file lists designs by name: manifests and design stores."""
+    return (
+        path == f"{run_name}_manifest.csv"
+        or (path.startswith("manifests/") and path.endswith(".csv"))
+        or path.endswith("/names.npy")
+    )
+
+
+def rename_designs(local: Path, old: str, new: str) -> None:
+    if local.suffix == ".npy":
+        names = np.load(local)
+        np.save(local, np.array([renamed(n, old, new) for n in names], dtype=str))
+        return
+    with open(local, newline="") as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames or []
+        rows = [{**row, "design": renamed(row["design"], old, new)} for row in reader]
+    with open(local, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def restore(entry: Dict[str, Any], run_dir: str, run_name: str) -> None:
+    source = entry["run_dir"].rstrip("/")
+    if source == run_dir.rstrip("/"):
+        print(f"Designs are already in {run_dir}")
+        return
+
+    old = entry["run_name"]
+
+    def copy(path: str) -> None:
+        target = LPath(f"{run_dir}/{renamed(path, old, run_name)}")
+        if old == run_name or not lists_designs(path, old):
+            LPath(f"{source}/{path}").copy_to(target)
+            return
+        with tempfile.TemporaryDirectory() as scratch:
+            local = LPath(f"{source}/{path}").download(
+                Path(scratch) / path.rsplit("/", 1)[-1]
+            )
+            rename_designs(local, old, run_name)
+            target.upload_from(local)
+
+    print(f"Copying {len(entry['files'])} files from {source} to {run_dir}")
+    with ThreadPoolExecutor(16) as pool:
+        list(pool.map(copy, entry["files"]))
+
+
+@workflow
+def bypassed_memo() -> MemoizedRun:
+    """Result Cache Bypassed
+
+    The result of memo_task for runs that can never be cached (randomly
+    seeded, spec sheet, sweep, dry run or bypassed), without starting a task.
+    """
+    return MemoizedRun(status="BYPASS", key="")
+
+
+@small_task
+def memo_task(
+    run_name: str,
+    output_directory: LatchOutputDir,
+    num_designs: int,
+    params: RFdiffusionParams,
+    options: RunOptions,
+    run_mode: str = "SINGLE",
+    num_shards: int = 1,
+    dry_run: bool = False,
+    bypass_result_cache: bool = False,
+) -> MemoizedRun:
+    if bypass_result_cache or dry_run or run_mode != "SINGLE":
+        return MemoizedRun(status="BYPASS", key="")
+    # Shards seed each design from its index (inference.deterministic).
+    seeded_by_index = options.deterministic or num_shards > 1
+    if not seeded_by_index:
+        print(
+            "Designs are seeded randomly, so the result cache is not used;"
+            " enable Seed From Design Index to use it"
+        )
+        return MemoizedRun(status="BYPASS", key="")
+
+    # The run name and execution options (resume, persistent workers,
+    # streamed uploads, multi-GPU, retries) do not change the designs, so
+    # they are not part of the key.
+    settings = {
+        "num_designs": num_designs,
+        "pack_designs": options.pack_designs,
+        "yield_target": options.yield_target,
+        "filter_max_chain_breaks": options.filter_max_chain_breaks,
+        "filter_max_clashes": options.filter_max_clashes,
+        "filter_max_rg_ratio": options.filter_max_rg_ratio,
+        "filter_max_loop_fraction": options.filter_max_loop_fraction,
+    }
+    if params.scaffold_library is not None:
+        # The scaffolds drawn for each design are seeded from the run name.
+        settings["scaffold_seed"] = run_name
+    keyed = result_key(params, settings, num_designs, seeded_by_index)
+    if keyed is None:
+        print("Result cache bypassed: not every input could be versioned")
+        return MemoizedRun(status="BYPASS", key="")
+    key, document = keyed
+    print(f"Result cache key {key}")
+    print(json.dumps(document, indent=2, sort_keys=True))
+
+    entry = read_json(f"{cache_root(output_directory.remote_path)}/{key}.json")
+    if entry is None:
+        print("Result cache miss")
+        return MemoizedRun(status="MISS", key=key)
+    if not entry_intact(entry):
+        print("Result cache entry is stale, generating designs again")
+        return MemoizedRun(status="MISS", key=key)
+
+    print(f"Result cache hit: {entry['run_dir']} from {time.ctime(entry['created'])}")
+    restore(entry, remote_run_dir(output_directory.remote_path, run_name), run_name)
+    return MemoizedRun(status="HIT", key=key)
+
+
+@small_task
+def cached_designs_task(output_directory: LatchOutputDir) -> LatchOutputDir:
+    return LatchOutputDir(output_directory.remote_path)
+
+
+def expected_designs(
+    run_dir: str, run_name: str, num_designs: int, yield_target: int
+) -> Optional[Set[int]]:
+    """Design indices a finished run has, or None if that cannot be told."""
+    if yield_target <= 0:
+        return set(range(num_designs))
+    report = read_json(f"{run_dir}/{run_name}_yield.json")
+    if report is None:
+        return None
+    return set(range(report["attempted"]))
+
+
+def file_design(path: str, run_name: str) -> Optional[int]:
+    """Index of the design a file belongs to (`<run_name>_<i>...`), if any."""
+    name = path.rsplit("/", 1)[-1]
+    if not name.startswith(f"{run_name}_"):
+        return None
+    index = name[len(run_name) + 1 :].split("_", 1)[0].split(".", 1)[0]
+    return int(index) if index.isdigit() else None
+
+
+@workflow
+def unrecorded_designs(designs: LatchOutputDir) -> LatchOutputDir:
+    """Unrecorded Designs
+
+    Passes designs that did not come from a result cache miss through,
+    without starting a task.
+    """
+    return designs
+
+
+@small_task
+def memo_record_task(
+    designs: LatchOutputDir,
+    run_name: str,
+    num_designs: int,
+    status: str,
+    key: str,
+    yield_target: int = 0,
+) -> LatchOutputDir:
+    if status != "MISS":
+        return designs
+
+    run_dir = remote_run_dir(designs.remote_path, run_name)
+    files = list_design_files(run_dir, run_name)
+    finished = set(files[".pdb"]) & set(files[".trb"])
+    expected = expected_designs(run_dir, run_name, num_designs, yield_target)
+    if expected is None:
+        print("Not caching a target yield run without its yield report")
+        return designs
+    missing = sorted(expected - finished)
+    if len(missing) > 0:
+        print(f"Not caching an incomplete run, missing designs {missing[:10]}")
+        return designs
+    report = read_json(f"{run_dir}/{run_name}_status.json")
+    if report is not None and len(report["recovered"]) > 0:
+        # Retries reseed a design, so it would not come out the same again.
+        print("Not caching a run with designs recovered by a retry")
+        return designs
+
+    # Designs outside this run's indices are left over from earlier runs.
+    files = {
+        path: size
+        for path, size in remote_files(run_dir).items()
+        if file_design(path, run_name) in expected | {None}
+    }
+    entry = {
+        "version": MEMO_VERSION,
+        "key": key,
+        "run_dir": run_dir,
+        "run_name": run_name,
+        "created": time.time(),
+        "files": files,
+    }
+    with tempfile.TemporaryDirectory() as scratch:
+        local = Path(scratch) / f"{key}.json"
+        local.write_text(json.dumps(entry, indent=2))
+        LPath(f"{cache_root(designs.remote_path)}/{key}.json").upload_from(local)
+    print(f"Cached {len(entry['files'])} files of {run_dir} as {key}")
+    return designs
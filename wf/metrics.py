@@ -0,0 +1,147 @@
+import json
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Hydra's default job logging: "[2024-05-01 12:00:00,123][name][INFO] - message"
+LOG_LINE = re.compile(
+    r"^\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),(\d{3})\]\[[^\]]*\]\[\w+\] - (.*)$"
+)
+MAKING_DESIGN = re.compile(r"Making design \S*?_(\d+)$")
+TIMESTEP = re.compile(r"Timestep (\d+)\b")
+FINISHED_DESIGN = re.compile(r"Finished design in ")
+
+SUMMARY_EVENTS = [
+    ("model_load", "Model load"),
+    ("timestep", "Timestep"),
+    ("design", "Design"),
+    ("output_write", "Output write"),
+]
+
+
+def parse_log_line(line: str) -> Optional[Dict[str, Any]]:
+    match = LOG_LINE.match(line.rstrip("\n"))
+    if match is None:
+        return None
+    seconds = time.mktime(time.strptime(match.group(1), "%Y-%m-%d %H:%M:%S"))
+    return {"time": seconds + int(match.group(2)) / 1000, "message": match.group(3)}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class InferenceMetrics:
+    """Timing events read from RFdiffusion's log, appended to a JSON-lines file.
+
+    Within a job, the time from launch to the first `Making design` line is
+    model loading, each `Timestep` line closes a denoising step (the first
+    one also covers the design's initialization), and the time between the
+    last step and `Finished design` is spent writing the design's outputs.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.events: List[Dict[str, Any]] = []
+        self.job_start: Optional[float] = None
+        self.design: Optional[int] = None
+        self.design_start = 0.0
+        self.last_mark = 0.0
+        self.step_seconds: List[float] = []
+
+    def start_job(self, started: Optional[float] = None) -> None:
+        self.job_start = time.time() if started is None else started
+        self.design = None
+
+    def log_line(self, line: str) -> None:
+        parsed = parse_log_line(line)
+        if parsed is not None:
+            self.record(parsed["time"], parsed["message"])
+
+    def record(self, timestamp: float, message: str) -> None:
+        making = MAKING_DESIGN.search(message)
+        if making is not None:
+            if self.job_start is not None:
+                self.emit("model_load", timestamp, seconds=timestamp - self.job_start)
+                self.job_start = None
+            self.design = int(making.group(1))
+            self.design_start = timestamp
+            self.last_mark = timestamp
+            self.step_seconds = []
+            return
+
+        if self.design is None:
+            return
+
+        step = TIMESTEP.match(message)
+        if step is not None:
+            seconds = timestamp - self.last_mark
+            self.step_seconds.append(seconds)
+            self.last_mark = timestamp
+            self.emit(
+                "timestep",
+                timestamp,
+                design=self.design,
+                t=int(step.group(1)),
+                seconds=seconds,
+            )
+        elif FINISHED_DESIGN.match(message):
+            self.emit(
+                "output_write",
+                timestamp,
+                design=self.design,
+                seconds=timestamp - self.last_mark,
+            )
+            self.emit(
+                "design",
+                timestamp,
+                design=self.design,
+                seconds=timestamp - self.design_start,
+                steps=len(self.step_seconds),
+                step_seconds=round(sum(self.step_seconds), 4),
+            )
+            self.design = None
+
+    def emit(self, event: str, timestamp: float, **fields: Any) -> None:
+        entry = {"event": event, "time": round(timestamp, 3), **fields}
+        if "seconds" in entry:
+            entry["seconds"] = round(entry["seconds"], 4)
+        self.events.append(entry)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def summary(self) -> str:
+        header = ["", "count", "total_s", "mean_s", "p50_s", "p95_s", "max_s"]
+        rows = [header]
+        for event, label in SUMMARY_EVENTS:
+            seconds = [e["seconds"] for e in self.events if e["event"] == event]
+            if len(seconds) == 0:
+                continue
+            rows.append(
+                [
+                    label,
+                    str(len(seconds)),
+                    f"{sum(seconds):.2f}",
+                    f"{sum(seconds) / len(seconds):.3f}",
+                    f"{percentile(seconds, 0.5):.3f}",
+                    f"{percentile(seconds, 0.95):.3f}",
+                    f"{max(seconds):.3f}",
+                ]
+            )
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        return "\n".join(
+            row[0].ljust(widths[0])
+            + "".join(f"  {cell.rjust(w)}" for cell, w in zip(row[1:], widths[1:]))
+            for row in rows
+        )
+
+    def print_summary(self) -> None:
+        print("-" * 60)
+        print(f"Timing summary ({self.path.name})")
+        if len(self.events) == 0:
+            print("No timing events found in the RFdiffusion log")
+            return
+        print(self.summary())
@@ -0,0 +1,237 @@
+import csv
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+SAMPLE_COLUMNS = [
+    "time",
+    "gpu_memory_mb",
+    "gpu_memory_total_mb",
+    "gpu_utilization",
+    "host_memory_mb",
+    "cpu_percent",
+    "disk_used_mb",
+]
+PEAK_COLUMNS = [
+    "design",
+    "start",
+    "seconds",
+    "samples",
+    "peak_gpu_memory_mb",
+    "peak_gpu_utilization",
+    "mean_gpu_utilization",
+    "idle_gpu_fraction",
+    "peak_host_memory_mb",
+    "peak_cpu_percent",
+    "disk_growth_mb",
+]
+# Samples below this GPU utilization count towards a design's idle fraction.
+IDLE_GPU_UTILIZATION = 5.0
+
+
+class GpuProbe:
+    """Memory and utilization summed over every GPU, from nvidia-smi."""
+
+    QUERY = [
+        "nvidia-smi",
+        "--query-gpu=memory.used,memory.total,utilization.gpu",
+        "--format=csv,noheader,nounits",
+    ]
+
+    @staticmethod
+    def available() -> bool:
+        if shutil.which("nvidia-smi") is None:
+            return False
+        try:
+            subprocess.run(GpuProbe.QUERY, capture_output=True, check=True, timeout=10)
+        except (subprocess.SubprocessError, OSError):
+            return False
+        return True
+
+    def sample(self) -> Dict[str, float]:
+        output = subprocess.run(
+            self.QUERY, capture_output=True, check=True, text=True, timeout=10
+        ).stdout
+        gpus = [
+            [float(value) for value in line.split(",")]
+            for line in output.strip().splitlines()
+        ]
+        return {
+            "gpu_memory_mb": sum(gpu[0] for gpu in gpus),
+            "gpu_memory_total_mb": sum(gpu[1] for gpu in gpus),
+            "gpu_utilization": max(gpu[2] for gpu in gpus),
+        }
+
+
+class HostProbe:
+    """Host memory and CPU from /proc, and disk usage of the output volume."""
+
+    def __init__(self, disk_path: Path):
+        self.disk_path = disk_path
+        self.last_cpu: Optional[List[int]] = None
+
+    def cpu_times(self) -> List[int]:
+        with open("/proc/stat") as f:
+            fields = f.readline().split()[1:]
+        return [int(value) for value in fields]
+
+    def sample(self) -> Dict[str, float]:
+        meminfo = {}
+        with open("/proc/meminfo") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                meminfo[key] = int(value.split()[0])
+
+        cpu = self.cpu_times()
+        cpu_percent = 0.0
+        if self.last_cpu is not None:
+            delta = [now - before for now, before in zip(cpu, self.last_cpu)]
+            # idle and iowait
+            idle = delta[3] + delta[4]
+            cpu_percent = 100.0 * (1 - idle / max(sum(delta), 1))
+        self.last_cpu = cpu
+
+        return {
+            "host_memory_mb": (meminfo["MemTotal"] - meminfo["MemAvailable"]) / 1024,
+            "cpu_percent": cpu_percent,
+            "disk_used_mb": shutil.disk_usage(self.disk_path).used / 1e6,
+        }
+
+
+def column(samples: List[Dict[str, float]], name: str) -> List[float]:
+    return [sample[name] for sample in samples if name in sample]
+
+
+def default_probes(disk_path: Path) -> List[Any]:
+    probes: List[Any] = [HostProbe(disk_path)]
+    if GpuProbe.available():
+        probes.insert(0, GpuProbe())
+    else:
+        print("No GPU found, sampling host resources only")
+    return probes
+
+
+class ResourceMonitor:
+    """Samples GPU and host resources on a background thread.
+
+    Samples are appended to a CSV as they are taken, so the series survives
+    a task that dies mid-run. Probes are objects with a `sample()` method
+    returning a dict of `SAMPLE_COLUMNS`; a failing probe leaves its
+    columns empty for that sample.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        probes: Optional[List[Any]] = None,
+        interval: float = 2.0,
+    ):
+        self.path = path
+        self.probes = default_probes(path.parent) if probes is None else probes
+        self.interval = interval
+        self.samples: List[Dict[str, float]] = []
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.watch, daemon=True)
+
+    def __enter__(self) -> "ResourceMonitor":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w", newline="") as f:
+            csv.DictWriter(f, SAMPLE_COLUMNS).writeheader()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stopping.set()
+        self.thread.join()
+
+    def take_sample(self) -> None:
+        sample: Dict[str, float] = {"time": time.time()}
+        for probe in self.probes:
+            try:
+                sample.update(probe.sample())
+            except Exception as e:
+                print(f"Resource probe {type(probe).__name__} failed: {e}")
+        self.samples.append(sample)
+        with open(self.path, "a", newline="") as f:
+            csv.DictWriter(f, SAMPLE_COLUMNS).writerow(
+                {
+                    k: f"{v:.3f}" if k == "time" else f"{v:.1f}"
+                    for k, v in sample.items()
+                }
+            )
+
+    def watch(self) -> None:
+        self.take_sample()
+        while not self.stopping.wait(self.interval):
+            self.take_sample()
+        self.take_sample()
+
+    def design_peaks(self, events: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Peak usage inside each design's window, from wf.metrics design events."""
+        rows = []
+        for event in events:
+            if event["event"] != "design":
+                continue
+            end = event["time"]
+            start = end - event["seconds"]
+            window = [s for s in self.samples if start <= s["time"] <= end]
+            if len(window) == 0:
+                # Designs shorter than the interval get the next sample.
+                window = [s for s in self.samples if s["time"] > end][:1]
+            gpu_utilization = column(window, "gpu_utilization")
+            disk = column(window, "disk_used_mb")
+            row = {
+                "design": event["design"],
+                "start": f"{start:.3f}",
+                "seconds": f"{event['seconds']:.1f}",
+                "samples": len(window),
+                "peak_gpu_memory_mb": max(
+                    column(window, "gpu_memory_mb"), default=None
+                ),
+                "peak_gpu_utilization": max(gpu_utilization, default=None),
+                "mean_gpu_utilization": (
+                    sum(gpu_utilization) / len(gpu_utilization)
+                    if len(gpu_utilization) > 0
+                    else None
+                ),
+                "idle_gpu_fraction": (
+                    sum(u < IDLE_GPU_UTILIZATION for u in gpu_utilization)
+                    / len(gpu_utilization)
+                    if len(gpu_utilization) > 0
+                    else None
+                ),
+                "peak_host_memory_mb": max(
+                    column(window, "host_memory_mb"), default=None
+                ),
+                "peak_cpu_percent": max(column(window, "cpu_percent"), default=None),
+                "disk_growth_mb": disk[-1] - disk[0] if len(disk) > 0 else None,
+            }
+            rows.append(
+                {
+                    k: f"{v:.2f}" if isinstance(v, float) else ("" if v is None else v)
+                    for k, v in row.items()
+                }
+            )
+        return rows
+
+    def write_peaks(self, events: List[Dict[str, Any]], path: Path) -> None:
+        rows = self.design_peaks(events)
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, PEAK_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+        print(
+            f"Wrote resource peaks for {len(rows)} designs to {path}"
+            f" from {len(self.samples)} samples"
+        )
+        for name, label in (
+            ("gpu_memory_mb", "GPU memory"),
+            ("host_memory_mb", "host memory"),
+        ):
+            values = column(self.samples, name)
+            if len(values) > 0:
+                print(f"Peak {label}: {max(values):.0f} MB")
@@ -0,0 +1,201 @@
+"""One RFdiffusion worker per GPU, fed from a shared queue of designs.
+
+Every visible device gets its own persistent worker (wf.worker), started
+with `CUDA_VISIBLE_DEVICES` set to that device alone, and a thread that
+pulls design indices from a shared queue until it is empty, so a device
+that finishes early simply takes more designs. Each index is queued once
+and keeps its own output prefix (`<run_name>_<index>`), so the workers
+write into the same directory without colliding.
+
+Devices come from `CUDA_VISIBLE_DEVICES` if it is set, else from
+nvidia-smi. The scheduling can be exercised on CPU with stub workers:
+
+    python -m wf.multi_gpu <output dir> --devices 0,1,2,3 --num-designs 32
+"""
+
+import argparse
+import functools
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from queue import Empty, Queue
+from typing import Callable, Dict, List, Tuple
+
+from wf.metrics import InferenceMetrics
+from wf.worker import RFdiffusionWorker
+
+DEVICES_QUERY = ["nvidia-smi", "--query-gpu=index", "--format=csv,noheader"]
+
+
+def visible_devices() -> List[str]:
+    visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+    if visible is not None:
+        return [device.strip() for device in visible.split(",") if device.strip()]
+    if shutil.which("nvidia-smi") is None:
+        return []
+    try:
+        output = subprocess.run(
+            DEVICES_QUERY, capture_output=True, check=True, text=True, timeout=10
+        ).stdout
+    except (subprocess.SubprocessError, OSError):
+        return []
+    return [line.strip() for line in output.splitlines() if line.strip()]
+
+
+def design_jobs(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """`(design_startnum, 1)` per design, so no device idles while others work."""
+    return [(i, 1) for start, count in ranges for i in range(start, start + count)]
+
+
+class DevicePool:
+    """Persistent workers pinned to one device each.
+
+    Use as a context manager: the workers load their models concurrently on
+    entry and are shut down on exit.
+    """
+
+    def __init__(
+        self,
+        devices: List[str],
+        metrics_dir: Path,
+        worker_factory: Callable[..., RFdiffusionWorker] = RFdiffusionWorker,
+    ):
+        self.devices = devices
+        self.workers = [
+            worker_factory(
+                socket_path=f"/tmp/rfdiffusion_worker_{device}.sock", device=device
+            )
+            for device in devices
+        ]
+        # Each device's log is timed on its own, as interleaved jobs would
+        # confuse the per-design state of a shared InferenceMetrics.
+        self.metrics = [
+            InferenceMetrics(metrics_dir / f"gpu_{device}.jsonl") for device in devices
+        ]
+        self.designs: Dict[str, int] = {device: 0 for device in devices}
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> "DevicePool":
+        try:
+            with ThreadPoolExecutor(len(self.workers)) as pool:
+                list(pool.map(lambda worker: worker.start(), self.workers))
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for worker in self.workers:
+            worker.close()
+
+    def revive(self) -> None:
+        for worker in self.workers:
+            worker.revive()
+
+    def run(
+        self,
+        jobs: List[Tuple[int, int]],
+        run_job: Callable[[RFdiffusionWorker, InferenceMetrics, int, int], bool],
+    ) -> bool:
+        """Call `run_job(worker, metrics, start, count)` for every job on some device."""
+        queue: Queue = Queue()
+        for job in jobs:
+            queue.put(job)
+        failed: List[Tuple[int, int]] = []
+
+        def drain(k: int) -> None:
+            device, worker = self.devices[k], self.workers[k]
+            while True:
+                try:
+                    start, count = queue.get_nowait()
+                except Empty:
+                    return
+                if run_job(worker, self.metrics[k], start, count):
+                    with self.lock:
+                        self.designs[device] += count
+                    continue
+                if not worker.alive:
+                    # A dead worker would fail everything left in the queue;
+                    # hand its job back to the other devices instead.
+                    print(f"Worker on GPU {device} exited, requeueing design {start}")
+                    queue.put((start, count))
+                    return
+                with self.lock:
+                    failed.append((start, count))
+
+        threads = [
+            threading.Thread(target=drain, args=(k,)) for k in range(len(self.devices))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if not queue.empty():
+            print(f"No workers left for {queue.qsize()} queued jobs")
+        if len(failed) > 0:
+            print(f"Failed jobs (design_startnum, count): {sorted(failed)}")
+        return queue.empty() and len(failed) == 0
+
+    @property
+    def events(self) -> List[Dict]:
+        events = [event for metrics in self.metrics for event in metrics.events]
+        return sorted(events, key=lambda event: event["time"])
+
+    def print_summary(self) -> None:
+        for metrics in self.metrics:
+            metrics.print_summary()
+        print("-" * 60)
+        print(
+            "Designs per GPU: "
+            + ", ".join(f"{device}: {n}" for device, n in self.designs.items())
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--devices", default="0,1")
+    parser.add_argument("--num-designs", type=int, default=16)
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--stub-step-seconds", type=float, default=0.05)
+    args = parser.parse_args()
+
+    worker_factory = functools.partial(
+        RFdiffusionWorker,
+        launcher=[sys.executable],
+        stub=True,
+        stub_step_seconds=args.stub_step_seconds,
+    )
+
+    def run_job(worker, metrics, start, count) -> bool:
+        metrics.start_job()
+        worker.run(
+            [
+                "contigmap.contigs=[50-50]",
+                f"inference.output_prefix={args.output_dir}/stub",
+                f"inference.num_designs={count}",
+                f"inference.design_startnum={start}",
+                f"diffuser.T={args.steps}",
+            ],
+            metrics.record,
+        )
+        return True
+
+    devices = args.devices.split(",")
+    started = time.time()
+    with DevicePool(devices, args.output_dir / "metrics", worker_factory) as pool:
+        pool.run(design_jobs([(0, args.num_designs)]), run_job)
+    print(
+        f"{args.num_designs} designs on {len(devices)} stub devices in"
+        f" {time.time() - started:.1f}s"
+    )
+    pool.print_summary()
@@ -0,0 +1,231 @@
+from dataclasses import dataclass
+from enum import Enum
+from typing import List, Optional
+
+from latch.types.directory import LatchDir
+from latch.types.file import LatchFile
+
+
+class SymmetryType(Enum):
+    CYCLIC_4 = "C4"
+    CYCLIC_6 = "C6"
+    DIHEDRAL_2 = "D2"
+    DIHEDRAL_4 = "D4"
+    TETRAHEDRAL = "tetrahedral"
+
+
+class PotentialDecayType(Enum):
+    CONSTANT = "constant"
+    LINEAR = "linear"
+    QUADRATIC = "quadratic"
+    CUBIC = "cubic"
+
+
+class TrajectoryMode(Enum):
+    FULL = "full"
+    FLOAT16 = "float16"
+    QUANTIZED = "quantized"
+    OFF = "off"
+
+
+@dataclass
+class RFdiffusionParams:
+    """Everything `run_inference.py` needs except the output prefix and design range."""
+
+    contig_string: str
+    contig_length: Optional[str] = None
+    contig_provide_seq: Optional[str] = None
+    input_pdb: Optional[LatchFile] = None
+    hotspot_residues_binder: Optional[str] = None
+    hotspot_residues_motif: Optional[str] = None
+    hotspot_residues_ppi: Optional[str] = None
+    scaffold_dir: Optional[LatchDir] = None
+    target_path: Optional[LatchFile] = None
+    target_ss: Optional[LatchFile] = None
+    target_adj: Optional[LatchFile] = None
+    symmetry_gen: Optional[SymmetryType] = None
+    symmetry_motif: Optional[SymmetryType] = None
+    partial_T: Optional[int] = None
+    final_step: int = 50
+    noise_scale_ca: float = 1.0
+    noise_scale_frame: float = 1.0
+    guiding_potentials: Optional[List[str]] = None
+    ckpt_override_path: Optional[LatchFile] = None
+    potentials_olig_intra_all: bool = False
+    potentials_olig_inter_all: bool = False
+    potentials_guide_scale: float = 1.0
+    potentials_substrate: Optional[str] = None
+    potentials_guide_decay: PotentialDecayType = PotentialDecayType.CONSTANT
+    contig_inpaint_str_strand: Optional[str] = None
+    contig_inpaint_str_helix: Optional[str] = None
+    contig_inpaint_str: Optional[str] = None
+    scaffoldguided: bool = False
+    scaffoldguided_mask_loops: bool = False
+    scaffoldguided_target_pdb: bool = False
+    trajectory_mode: TrajectoryMode = TrajectoryMode.FULL
+    trajectory_stride: int = 1
+    scaffold_library: Optional[LatchFile] = None
+
+
+@dataclass
+class RunOptions:
+    """How a design task runs, and which designs it keeps, beyond `RFdiffusionParams`."""
+
+    resume: bool = False
+    persistent_worker: bool = True
+    stream_uploads: bool = False
+    pack_designs: bool = False
+    yield_target: int = 0
+    filter_max_chain_breaks: int = 0
+    filter_max_clashes: int = 0
+    filter_max_rg_ratio: float = 1.5
+    filter_max_loop_fraction: float = 0.6
+    design_retries: int = 2
+    # Seed each design from its index (inference.deterministic).
+    deterministic: bool = False
+
+
+RUN_INFERENCE_SCRIPT = "/tmp/docker-build/work/RFdiffusion/scripts/run_inference.py"
+RUN_INFERENCE_COMMAND = [
+    "/root/miniconda/bin/conda",
+    "run",
+    "--name",
+    "SE3nv",
+    "python",
+    RUN_INFERENCE_SCRIPT,
+]
+
+
+def build_overrides(
+    params: RFdiffusionParams,
+    output_prefix: str,
+    num_designs: int,
+    design_startnum: Optional[int] = None,
+    deterministic: bool = False,
+) -> List[str]:
+    overrides = [
+        f"contigmap.contigs=[{params.contig_string}]",
+        f"inference.output_prefix={output_prefix}",
+        f"inference.num_designs={num_designs}",
+    ]
+
+    if design_startnum is not None:
+        overrides.append(f"inference.design_startnum={design_startnum}")
+
+    if deterministic:
+        overrides.append("inference.deterministic=True")
+
+    if params.input_pdb:
+        overrides.append(f"inference.input_pdb={params.input_pdb.local_path}")
+
+    if params.contig_length:
+        overrides.append(f"contigmap.length=[{params.contig_length}]")
+
+    if params.contig_provide_seq:
+        overrides.append(f"contigmap.provide_seq=[{params.contig_provide_seq}]")
+
+    if params.contig_inpaint_str:
+        overrides.append(f"contigmap.inpaint_str=[{params.contig_inpaint_str}]")
+
+    if params.contig_inpaint_str_helix:
+        overrides.append(
+            f"contigmap.inpaint_str_helix=[{params.contig_inpaint_str_helix}]"
+        )
+
+    if params.contig_length:
+        overrides.append(f"contigmap.length={params.contig_length}")
+
+    if params.hotspot_residues_binder:
+        overrides.append(f"ppi.hotspot_res=[{params.hotspot_residues_binder}]")
+
+    if params.hotspot_residues_motif:
+        overrides.append(f"ppi.hotspot_res=[{params.hotspot_residues_motif}]")
+
+    if params.hotspot_residues_ppi:
+        overrides.append(f"ppi.hotspot_res=[{params.hotspot_residues_ppi}]")
+
+    if params.scaffoldguided:
+        overrides.append("scaffoldguided.scaffoldguided=True")
+
+    if params.scaffoldguided_target_pdb:
+        overrides.append("scaffoldguided.target_pdb=True")
+
+    if params.scaffoldguided_mask_loops:
+        overrides.append("scaffoldguided.mask_loops=True")
+
+    if params.scaffold_dir:
+        overrides.append(
+            f"scaffoldguided.scaffold_dir={params.scaffold_dir.local_path}"
+        )
+        if not params.scaffoldguided:
+            overrides.append("scaffoldguided.scaffoldguided=True")
+
+    if params.target_path:
+        overrides.append(f"scaffoldguided.target_path={params.target_path.local_path}")
+        if not params.scaffoldguided_target_pdb:
+            overrides.append("scaffoldguided.target_pdb=True")
+
+    if params.target_ss:
+        overrides.append(f"scaffoldguided.target_ss={params.target_ss.local_path}")
+
+    if params.target_adj:
+        overrides.append(f"scaffoldguided.target_adj={params.target_adj.local_path}")
+
+    # Handle symmetry options
+    if params.symmetry_gen and params.symmetry_motif:
+        if params.symmetry_gen != params.symmetry_motif:
+            raise ValueError(
+                "symmetry_gen and symmetry_motif must be the same if both are provided"
+            )
+        overrides.append(f"inference.symmetry={params.symmetry_gen.value}")
+    elif params.symmetry_gen:
+        overrides.append(f"inference.symmetry={params.symmetry_gen.value}")
+    elif params.symmetry_motif:
+        overrides.append(f"inference.symmetry={params.symmetry_motif.value}")
+
+    if params.partial_T is not None:
+        overrides.append(f"diffuser.partial_T={params.partial_T}")
+
+    overrides.append(f"diffuser.T={params.final_step}")
+    overrides.append(f"denoiser.noise_scale_ca={params.noise_scale_ca}")
+    overrides.append(f"denoiser.noise_scale_frame={params.noise_scale_frame}")
+
+    # 'potentials.guiding_potentials=["type:olig_contacts,weight_intra:1,weight_inter:0.1"]' -> goal
+    # 'potentials.guiding_potentials=["type:olig_contacts","weight_intra:1","weight_inter:0.1"]' -> now
+    if params.guiding_potentials:
+        potentials_str = ",".join(params.guiding_potentials)
+        overrides.append(f'potentials.guiding_potentials=["{potentials_str}"]')
+
+    if params.potentials_olig_intra_all:
+        overrides.append("potentials.olig_intra_all=True")
+
+    if params.potentials_olig_inter_all:
+        overrides.append("potentials.olig_inter_all=True")
+
+    if params.potentials_substrate:
+        overrides.append(f"potentials.substrate={params.potentials_substrate}")
+
+    overrides.append(f"potentials.guide_scale={params.potentials_guide_scale}")
+    overrides.append(f"potentials.guide_decay={params.potentials_guide_decay.value}")
+
+    if params.trajectory_mode == TrajectoryMode.OFF:
+        overrides.append("inference.write_trajectory=False")
+
+    if params.ckpt_override_path:
+        overrides.append(
+            f"inference.ckpt_override_path={params.ckpt_override_path.local_path}"
+        )
+
+    return overrides
+
+
+def build_command(
+    params: RFdiffusionParams,
+    output_prefix: str,
+    num_designs: int,
+    design_startnum: Optional[int] = None,
+    deterministic: bool = False,
+) -> List[str]:
+    return RUN_INFERENCE_COMMAND + build_overrides(
+        params, output_prefix, num_designs, design_startnum, deterministic
+    )
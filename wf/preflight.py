@@ -0,0 +1,300 @@
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from latch.resources.tasks import small_task
+from latch.types.directory import LatchDir
+from latch.types.file import LatchFile
+
+from wf.params import RFdiffusionParams
+
+PdbIndex = Dict[str, List[int]]
+
+SEGMENT = re.compile(r"([A-Za-z]?)(\d+)(?:-(\d+))?")
+RESIDUE = re.compile(r"([A-Za-z])(\d+)")
+
+
+def index_pdb(path: Path) -> PdbIndex:
+    """Residue numbers per chain, from the CA atoms RFdiffusion parses."""
+    residues: Dict[str, set] = {}
+    with open(path) as f:
+        for line in f:
+            if line.startswith("ATOM") and line[12:16].strip() == "CA":
+                residues.setdefault(line[21], set()).add(int(line[22:26]))
+    return {chain: sorted(numbers) for chain, numbers in residues.items()}
+
+
+def format_ranges(numbers: List[int]) -> str:
+    ranges: List[List[int]] = []
+    for n in numbers:
+        if len(ranges) > 0 and ranges[-1][1] == n - 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def check_residues(
+    label: str, chain: str, start: int, end: int, pdb: Optional[PdbIndex]
+) -> List[str]:
+    if pdb is None:
+        return [f"{label}: references chain {chain} but no input structure was given"]
+    if chain not in pdb:
+        chains = ", ".join(sorted(pdb)) or "none"
+        return [
+            f"{label}: chain {chain} is not in the input structure (chains: {chains})"
+        ]
+
+    present = set(pdb[chain])
+    missing = [n for n in range(start, end + 1) if n not in present]
+    if len(missing) == 0:
+        return []
+    return [
+        f"{label}: {chain}{format_ranges(missing)} not found in the input"
+        f" structure (chain {chain} has residues {format_ranges(pdb[chain])})"
+    ]
+
+
+class ContigSpan(NamedTuple):
+    errors: List[str]
+    # Minimum and maximum total length, fixed receptor chains included.
+    low: int
+    high: int
+    # Residues in fixed receptor chains (e.g. `A1-150/0`), which
+    # contigmap.length does not count.
+    receptor: int
+
+
+def is_receptor_chain(chain_contig: str) -> bool:
+    """Chain ranges ending in `/0`, taken as-is from the input (see ContigMap)."""
+    segments = chain_contig.split("/")
+    return (
+        len(segments) > 1
+        and segments[-1] == "0"
+        and all(segment[:1].isalpha() for segment in segments[:-1])
+    )
+
+
+def parse_contig(
+    contig_string: str, pdb: Optional[PdbIndex], check_chains: bool = True
+) -> ContigSpan:
+    """Check every segment of a contig string, and measure its length."""
+    errors: List[str] = []
+    low, high, receptor = 0, 0, 0
+    for chain_contig in contig_string.split():
+        chain_low = 0
+        for segment in chain_contig.split("/"):
+            if segment == "0":
+                continue
+            match = SEGMENT.fullmatch(segment)
+            if match is None:
+                errors.append(f"contig segment '{segment}' is not N, N-M, or A12-34")
+                continue
+
+            chain, start = match.group(1), int(match.group(2))
+            end = int(match.group(3)) if match.group(3) is not None else start
+            if end < start:
+                errors.append(
+                    f"contig segment '{segment}': range ends before it starts"
+                )
+                continue
+
+            if chain:
+                if check_chains:
+                    errors += check_residues(
+                        f"contig segment '{segment}'", chain, start, end, pdb
+                    )
+                chain_low += end - start + 1
+                high += end - start + 1
+            else:
+                chain_low += start
+                high += end
+        low += chain_low
+        if is_receptor_chain(chain_contig):
+            receptor += chain_low
+    return ContigSpan(errors, low, high, receptor)
+
+
+def check_references(label: str, value: str, pdb: Optional[PdbIndex]) -> List[str]:
+    errors = []
+    for segment in re.split(r"[,/ ]+", value.strip()):
+        match = SEGMENT.fullmatch(segment)
+        if match is None or not match.group(1):
+            errors.append(
+                f"{label} entry '{segment}' is not a residue range like A12-34"
+            )
+            continue
+        start = int(match.group(2))
+        end = int(match.group(3)) if match.group(3) is not None else start
+        errors += check_residues(
+            f"{label} entry '{segment}'", match.group(1), start, end, pdb
+        )
+    return errors
+
+
+def check_hotspots(label: str, value: str, pdb: Optional[PdbIndex]) -> List[str]:
+    errors = []
+    for hotspot in value.replace(" ", "").split(","):
+        match = RESIDUE.fullmatch(hotspot)
+        if match is None:
+            errors.append(f"{label} entry '{hotspot}' is not a residue like A30")
+            continue
+        n = int(match.group(2))
+        errors += check_residues(
+            f"{label} entry '{hotspot}'", match.group(1), n, n, pdb
+        )
+    return errors
+
+
+def validate_params(
+    params: RFdiffusionParams,
+    input_pdb: Optional[PdbIndex],
+    target_pdb: Optional[PdbIndex] = None,
+) -> List[str]:
+    """Problems with `params` that would only surface once the model is loaded."""
+    scaffoldguided = (
+        params.scaffoldguided
+        or params.scaffold_dir is not None
+        or params.scaffold_library is not None
+    )
+
+    # In scaffold-guided runs the contigs come from the scaffolds and the
+    # hotspots refer to the target structure.
+    errors, low, high, receptor = parse_contig(
+        params.contig_string, input_pdb, check_chains=not scaffoldguided
+    )
+
+    if params.contig_length:
+        match = re.fullmatch(r"(\d+)(?:-(\d+))?", params.contig_length.strip())
+        if match is None:
+            errors.append(f"contig_length '{params.contig_length}' is not N or N-M")
+        else:
+            length_low = int(match.group(1))
+            length_high = int(match.group(2) or length_low)
+            # Like contigmap.length, this leaves out fixed receptor chains.
+            designed_low, designed_high = low - receptor, high - receptor
+            if not scaffoldguided and (
+                length_high < designed_low or length_low > designed_high
+            ):
+                errors.append(
+                    f"contig_length {params.contig_length} cannot be met by"
+                    f" '{params.contig_string}', which spans"
+                    f" {designed_low}-{designed_high} residues besides fixed"
+                    " receptor chains"
+                )
+
+    if params.contig_provide_seq:
+        for segment in params.contig_provide_seq.split(","):
+            match = re.fullmatch(r"(\d+)(?:-(\d+))?", segment.strip())
+            if match is None:
+                errors.append(
+                    f"contig_provide_seq entry '{segment}' is not an index or range"
+                )
+            elif not scaffoldguided and int(match.group(2) or match.group(1)) >= high:
+                errors.append(
+                    f"contig_provide_seq entry '{segment}' is past the end of a"
+                    f" design of at most {high} residues"
+                )
+
+    for label, value in (
+        ("contig_inpaint_str", params.contig_inpaint_str),
+        ("contig_inpaint_str_helix", params.contig_inpaint_str_helix),
+        ("contig_inpaint_str_strand", params.contig_inpaint_str_strand),
+    ):
+        if value:
+            errors += check_references(label, value, input_pdb)
+
+    hotspot_pdb = target_pdb if target_pdb is not None else input_pdb
+    for label, value in (
+        ("hotspot_residues_binder", params.hotspot_residues_binder),
+        ("hotspot_residues_motif", params.hotspot_residues_motif),
+        ("hotspot_residues_ppi", params.hotspot_residues_ppi),
+    ):
+        if value:
+            errors += check_hotspots(label, value, hotspot_pdb)
+
+    if params.partial_T is not None and input_pdb is not None:
+        length = sum(len(residues) for residues in input_pdb.values())
+        if not low <= length <= high:
+            errors.append(
+                f"partial diffusion needs the contig to cover all {length} residues"
+                f" of input_pdb, but '{params.contig_string}' spans {low}-{high}"
+            )
+        if params.partial_T > params.final_step:
+            errors.append(
+                f"partial_T ({params.partial_T}) is larger than the number of"
+                f" diffusion steps ({params.final_step})"
+            )
+
+    return errors
+
+
+def structure_indices(
+    params: RFdiffusionParams,
+) -> Tuple[Optional[PdbIndex], Optional[PdbIndex]]:
+    input_pdb = None
+    if params.input_pdb is not None:
+        input_pdb = index_pdb(Path(params.input_pdb.local_path))
+    target_pdb = None
+    if params.target_path is not None:
+        target_pdb = index_pdb(Path(params.target_path.local_path))
+    return input_pdb, target_pdb
+
+
+def raise_for_errors(errors: List[str], context: str = "") -> None:
+    if len(errors) == 0:
+        return
+    raise ValueError(
+        f"Pre-flight validation failed{context}:\n"
+        + "\n".join(f"  - {error}" for error in errors)
+    )
+
+
+class CheckedInputs(NamedTuple):
+    contig_string: str
+    # Whether there are scaffold PDBs for secstruc_task to prepare.
+    prepare_scaffolds: bool
+
+
+@small_task
+def preflight_task(
+    contig_string: str,
+    contig_length: Optional[str] = None,
+    contig_provide_seq: Optional[str] = None,
+    input_pdb: Optional[LatchFile] = None,
+    hotspot_residues_binder: Optional[str] = None,
+    hotspot_residues_motif: Optional[str] = None,
+    hotspot_residues_ppi: Optional[str] = None,
+    scaffold_dir: Optional[LatchDir] = None,
+    target_path: Optional[LatchFile] = None,
+    partial_T: Optional[int] = None,
+    final_step: int = 50,
+    contig_inpaint_str_strand: Optional[str] = None,
+    contig_inpaint_str_helix: Optional[str] = None,
+    contig_inpaint_str: Optional[str] = None,
+    scaffoldguided: bool = False,
+    scaffold_library: Optional[LatchFile] = None,
+    scaffold_pdbs: Optional[LatchDir] = None,
+) -> CheckedInputs:
+    # Scaffold PDBs become the scaffold directory, so the run is scaffold-guided.
+    params = RFdiffusionParams(
+        contig_string=contig_string,
+        contig_length=contig_length,
+        contig_provide_seq=contig_provide_seq,
+        input_pdb=input_pdb,
+        hotspot_residues_binder=hotspot_residues_binder,
+        hotspot_residues_motif=hotspot_residues_motif,
+        hotspot_residues_ppi=hotspot_residues_ppi,
+        scaffold_dir=scaffold_dir,
+        target_path=target_path,
+        partial_T=partial_T,
+        final_step=final_step,
+        contig_inpaint_str_strand=contig_inpaint_str_strand,
+        contig_inpaint_str_helix=contig_inpaint_str_helix,
+        contig_inpaint_str=contig_inpaint_str,
+        scaffoldguided=scaffoldguided or scaffold_pdbs is not None,
+        scaffold_library=scaffold_library,
+    )
+    raise_for_errors(validate_params(params, *structure_indices(params)))
+    print("Pre-flight validation passed")
+    return CheckedInputs(contig_string, scaffold_pdbs is not None)
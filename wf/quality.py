@@ -0,0 +1,379 @@
+"""Cheap geometric checks that reject obviously broken backbones.
+
+Every design is checked for
+
+- chain breaks: consecutive CAs of the designed chain further apart than
+  `max_ca_distance`
+- clashes: CA pairs closer than `clash_distance` that are not within two
+  residues of each other in the same chain, found with a neighbor grid
+- compactness: radius of gyration of the designed chain over the
+  2.2 N^0.38 Å expected of a globular protein of its length
+- secondary structure: fraction of the designed chain in neither helix nor
+  strand (P-SEA CA geometry, as in the manifest)
+
+Designs without a readable CA fail as "unreadable" or "no_backbone" instead
+of being measured. `length` is the length of the designed chain.
+
+The designed chain is the first chain of a design, where RFdiffusion writes
+the diffused residues. Designs are read and checked in chunks of padded
+arrays, one chunk per process.
+
+    python -m wf.quality <design dir> <run name> <quality.csv>
+"""
+
+import argparse
+import csv
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from itertools import product
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from latch.ldata.path import LPath
+from latch.resources.tasks import custom_task
+from latch.resources.workflow import workflow
+from latch.types.directory import LatchOutputDir
+
+from wf.design_store import design_pairs, read_backbone
+from wf.manifest import HELIX_DISTANCES, STRAND_DISTANCES, matches, pad
+from wf.resume import list_design_files, remote_run_dir
+
+QUALITY_COLUMNS = [
+    "design",
+    "passed",
+    "failures",
+    "length",
+    "chain_breaks",
+    "clashes",
+    "radius_of_gyration",
+    "rg_ratio",
+    "helix_fraction",
+    "strand_fraction",
+    "loop_fraction",
+]
+# Per-run aggregates, used to compare spec sheet rows and sweep configurations.
+OUTCOME_COLUMNS = [
+    "finished",
+    "passed",
+    "pass_rate",
+    "mean_rg_ratio",
+    "mean_helix_fraction",
+    "mean_strand_fraction",
+    "mean_loop_fraction",
+]
+CHUNK_SIZE = 256
+
+
+@dataclass
+class QualityThresholds:
+    max_ca_distance: float = 4.2
+    max_chain_breaks: int = 0
+    clash_distance: float = 3.0
+    max_clashes: int = 0
+    max_rg_ratio: float = 1.5
+    max_loop_fraction: float = 0.6
+
+
+def close_pairs(
+    coords: np.ndarray, groups: np.ndarray, radius: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """`(i, j)`, `i < j`, of points in the same group closer than `radius`.
+
+    Points are binned into cells `radius` wide, keyed by group and cell, so
+    each point is only measured against the 27 cells around its own.
+    """
+    cells = np.floor(coords / radius).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    dims = cells.max(axis=0) + 2
+    keys = (
+        (groups.astype(np.int64) * dims[0] + cells[:, 0]) * dims[1] + cells[:, 1]
+    ) * dims[2] + cells[:, 2]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    first, second = [], []
+    for dx, dy, dz in product((-1, 0, 1), repeat=3):
+        neighbor = keys + (dx * dims[1] + dy) * dims[2] + dz
+        start = np.searchsorted(sorted_keys, neighbor, side="left")
+        counts = np.searchsorted(sorted_keys, neighbor, side="right") - start
+        i = np.repeat(np.arange(len(coords)), counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(start, counts) + within]
+        keep = i < j
+        first.append(i[keep])
+        second.append(j[keep])
+
+    i, j = np.concatenate(first), np.concatenate(second)
+    close = np.linalg.norm(coords[i] - coords[j], axis=-1) < radius
+    return i[close], j[close]
+
+
+def read_design_ca(path: Path) -> Tuple[np.ndarray, np.ndarray]:
+    backbone = read_backbone(path)
+    ca = backbone["coords"][:, 1]
+    keep = ~np.isnan(ca).any(axis=-1)
+    return ca[keep], backbone["chain"][keep]
+
+
+def unchecked_row(path: Path, failure: str) -> Dict[str, Any]:
+    """A failed row for a design with no backbone to measure."""
+    row: Dict[str, Any] = {column: "" for column in QUALITY_COLUMNS}
+    row.update(design=path.stem, passed=False, failures=failure, length=0)
+    return row
+
+
+def check_chunk(
+    paths: List[Path], thresholds: QualityThresholds
+) -> List[Dict[str, Any]]:
+    """Quality rows of `paths`, in order.
+
+    A design that cannot be read fails "unreadable" and one without a single
+    CA fails "no_backbone"; neither stops the rest of the chunk.
+    """
+    rows: Dict[int, Dict[str, Any]] = {}
+    designs, checked = [], []
+    for k, path in enumerate(paths):
+        try:
+            ca, chain = read_design_ca(path)
+        except (OSError, ValueError) as e:
+            print(f"Could not read {path}: {e}")
+            rows[k] = unchecked_row(path, "unreadable")
+            continue
+        if len(ca) == 0:
+            rows[k] = unchecked_row(path, "no_backbone")
+            continue
+        designs.append((ca, chain))
+        checked.append(k)
+
+    if len(designs) > 0:
+        checked_rows = check_backbones([paths[k] for k in checked], designs, thresholds)
+        rows.update(zip(checked, checked_rows))
+    return [rows[k] for k in range(len(paths))]
+
+
+def check_backbones(
+    paths: List[Path],
+    designs: List[Tuple[np.ndarray, np.ndarray]],
+    thresholds: QualityThresholds,
+) -> List[Dict[str, Any]]:
+    lengths = np.array([len(ca) for ca, _ in designs])
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    coords = np.concatenate([ca for ca, _ in designs]).astype(np.float64)
+    chain = np.concatenate([chain for _, chain in designs])
+    design = np.repeat(np.arange(len(designs)), lengths)
+    position = np.arange(len(coords)) - offsets[design]
+    designed = chain == chain[offsets[:-1]][design]
+
+    # Breaks between consecutive residues of each designed chain.
+    step = np.linalg.norm(coords[1:] - coords[:-1], axis=-1)
+    consecutive = (design[1:] == design[:-1]) & designed[1:] & designed[:-1]
+    breaks = np.bincount(
+        design[1:][consecutive & (step > thresholds.max_ca_distance)],
+        minlength=len(designs),
+    )
+
+    i, j = close_pairs(coords, design, thresholds.clash_distance)
+    bonded = (chain[i] == chain[j]) & (np.abs(position[i] - position[j]) <= 2)
+    clashes = np.bincount(design[i][~bonded], minlength=len(designs))
+
+    backbones, mask = pad([ca[c == c[0]] for ca, c in designs])
+    designed_lengths = mask.sum(axis=1)
+    counts = np.maximum(designed_lengths, 1)
+    centroid = backbones.sum(axis=1) / counts[:, None]
+    squared = ((backbones - centroid[:, None]) ** 2).sum(axis=-1) * mask
+    rg = np.sqrt(squared.sum(axis=1) / counts)
+    rg_ratio = rg / (2.2 * counts**0.38)
+    helix = matches(backbones, mask, HELIX_DISTANCES)
+    strand = matches(backbones, mask, STRAND_DISTANCES) & ~helix
+    helix_fraction = helix.sum(axis=1) / counts
+    strand_fraction = strand.sum(axis=1) / counts
+    loop_fraction = 1 - helix_fraction - strand_fraction
+
+    rows = []
+    for k, path in enumerate(paths):
+        failures = [
+            name
+            for name, failed in (
+                ("chain_breaks", breaks[k] > thresholds.max_chain_breaks),
+                ("clashes", clashes[k] > thresholds.max_clashes),
+                ("radius_of_gyration", rg_ratio[k] > thresholds.max_rg_ratio),
+                ("loop_fraction", loop_fraction[k] > thresholds.max_loop_fraction),
+            )
+            if failed
+        ]
+        rows.append(
+            {
+                "design": path.stem,
+                "passed": len(failures) == 0,
+                "failures": ",".join(failures),
+                "length": int(designed_lengths[k]),
+                "chain_breaks": int(breaks[k]),
+                "clashes": int(clashes[k]),
+                "radius_of_gyration": f"{rg[k]:.2f}",
+                "rg_ratio": f"{rg_ratio[k]:.3f}",
+                "helix_fraction": f"{helix_fraction[k]:.3f}",
+                "strand_fraction": f"{strand_fraction[k]:.3f}",
+                "loop_fraction": f"{loop_fraction[k]:.3f}",
+            }
+        )
+    return rows
+
+
+def check_designs(
+    paths: List[Path], thresholds: QualityThresholds, processes: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    chunks = [paths[i : i + CHUNK_SIZE] for i in range(0, len(paths), CHUNK_SIZE)]
+    if len(chunks) <= 1:
+        return check_chunk(paths, thresholds) if len(paths) > 0 else []
+    with ProcessPoolExecutor(processes) as pool:
+        results = pool.map(check_chunk, chunks, [thresholds] * len(chunks))
+        return [row for rows in results for row in rows]
+
+
+def write_quality(rows: List[Dict[str, Any]], path: Path) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, QUALITY_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    passed = sum(row["passed"] for row in rows)
+    print(f"{passed}/{len(rows)} designs passed the quality filter, see {path}")
+    for column in (
+        "chain_breaks",
+        "clashes",
+        "radius_of_gyration",
+        "loop_fraction",
+        "no_backbone",
+        "unreadable",
+    ):
+        failed = sum(column in row["failures"].split(",") for row in rows)
+        if failed > 0:
+            print(f"  {failed} failed {column}")
+
+
+def outcome_summary(rows: List[Dict[str, Any]]) -> Dict[str, str]:
+    summary = {"finished": str(len(rows)), "passed": "0"}
+    if len(rows) == 0:
+        return summary
+    passed = sum(row["passed"] for row in rows)
+    summary["passed"] = str(passed)
+    summary["pass_rate"] = f"{passed / len(rows):.3f}"
+    measured = [row for row in rows if row["rg_ratio"] != ""]
+    if len(measured) == 0:
+        return summary
+    for column in ("rg_ratio", "helix_fraction", "strand_fraction", "loop_fraction"):
+        mean = sum(float(row[column]) for row in measured) / len(measured)
+        summary[f"mean_{column}"] = f"{mean:.3f}"
+    return summary
+
+
+def remote_designs(remote_dir: str, run_name: str) -> List[Tuple[str, LPath]]:
+    """`(run name, .pdb)` of every finished design of a run or its spec sheet rows."""
+    runs = [(remote_dir, run_name)]
+    runs += [
+        (f"{remote_dir}/{child.name()}", child.name())
+        for child in LPath(remote_dir).iterdir()
+        if child.is_dir()
+    ]
+    designs = []
+    for directory, name in runs:
+        files = list_design_files(directory, name)
+        designs += [
+            (name, pdb)
+            for i, pdb in sorted(files[".pdb"].items())
+            if i in files[".trb"]
+        ]
+    return designs
+
+
+def download_designs(found: List[Tuple[str, LPath]], directory: Path) -> List[Path]:
+    with ThreadPoolExecutor(16) as pool:
+        return list(
+            pool.map(
+                lambda design: design[1].download(
+                    directory / design[0] / design[1].name()
+                ),
+                found,
+            )
+        )
+
+
+@workflow
+def unfiltered_designs(designs: LatchOutputDir) -> LatchOutputDir:
+    """Unfiltered Designs
+
+    Passes the designs through when Quality Filter is off, without starting
+    a task.
+    """
+    return designs
+
+
+def filter_cpus(quality_filter: bool) -> int:
+    return 30 if quality_filter else 2
+
+
+def filter_memory(quality_filter: bool) -> int:
+    return 60 if quality_filter else 4
+
+
+@custom_task(cpu=filter_cpus, memory=filter_memory)
+def quality_filter_task(
+    designs: LatchOutputDir,
+    run_name: str,
+    quality_filter: bool = False,
+    filter_max_chain_breaks: int = 0,
+    filter_max_clashes: int = 0,
+    filter_max_rg_ratio: float = 1.5,
+    filter_max_loop_fraction: float = 0.6,
+) -> LatchOutputDir:
+    if not quality_filter:
+        return designs
+
+    thresholds = QualityThresholds(
+        max_chain_breaks=filter_max_chain_breaks,
+        max_clashes=filter_max_clashes,
+        max_rg_ratio=filter_max_rg_ratio,
+        max_loop_fraction=filter_max_loop_fraction,
+    )
+    print(f"Quality thresholds: {asdict(thresholds)}")
+    remote_dir = remote_run_dir(designs.remote_path, run_name)
+    found = remote_designs(remote_dir, run_name)
+    print(f"Checking {len(found)} designs on {os.cpu_count()} cores")
+
+    local_dir = Path(f"/root/outputs/{run_name}_quality")
+    with tempfile.TemporaryDirectory() as scratch:
+        paths = download_designs(found, Path(scratch))
+        rows = check_designs(paths, thresholds)
+
+    local_dir.mkdir(parents=True, exist_ok=True)
+    quality = local_dir / f"{run_name}_quality.csv"
+    write_quality(rows, quality)
+    LPath(f"{remote_dir}/{quality.name}").upload_from(quality)
+    return designs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("design_dir", type=Path)
+    parser.add_argument("run_name")
+    parser.add_argument("output", type=Path)
+    parser.add_argument("--processes", type=int, default=None)
+    for field, default in asdict(QualityThresholds()).items():
+        parser.add_argument(
+            f"--{field.replace('_', '-')}", type=type(default), default=default
+        )
+    args = parser.parse_args()
+
+    thresholds = QualityThresholds(
+        **{field: getattr(args, field) for field in asdict(QualityThresholds())}
+    )
+    pairs = design_pairs(args.design_dir, args.run_name)
+    rows = check_designs(
+        [args.design_dir / f"{name}.pdb" for _, name in pairs],
+        thresholds,
+        args.processes,
+    )
+    write_quality(rows, args.output)
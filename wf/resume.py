@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from latch.ldata.path import LPath
+from latch.ldata.type import LatchPathError
+
+
+def remote_run_dir(remote_path: str, run_name: str) -> str:
+    return f"{remote_path.rstrip('/')}/{run_name}"
+
+
+def fetch_previous(remote_path: str, local_path: Path) -> Optional[Path]:
+    """Download a file written by an earlier attempt at a run, if there is one."""
+    remote = LPath(remote_path)
+    try:
+        remote.size()
+    except LatchPathError:
+        return None
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    return remote.download(local_path)
+
+
+def design_index(name: str, run_name: str, suffix: str) -> int:
+    prefix = f"{run_name}_"
+    if not name.startswith(prefix) or not name.endswith(suffix):
+        return -1
+    index = name[len(prefix) : -len(suffix)]
+    return int(index) if index.isdigit() else -1
+
+
+def list_design_files(remote_dir: str, run_name: str) -> Dict[str, Dict[int, LPath]]:
+    files: Dict[str, Dict[int, LPath]] = {".pdb": {}, ".trb": {}}
+    try:
+        children = list(LPath(remote_dir).iterdir())
+    except LatchPathError:
+        return files
+
+    for child in children:
+        name = child.name()
+        if name is None:
+            continue
+        for suffix, found in files.items():
+            i = design_index(name, run_name, suffix)
+            if i >= 0:
+                found[i] = child
+    return files
+
+
+def completed_designs(remote_dir: str, run_name: str) -> Set[int]:
+    """Indices with a non-empty .pdb and .trb under `remote_dir`.
+
+    run_inference.py writes the .trb after the .pdb has been closed, and a
+    Latch Data upload only appears at its path once the whole file is in, so
+    a non-empty .trb means the design finished. Only sizes are looked up;
+    nothing is downloaded.
+    """
+    files = list_design_files(remote_dir, run_name)
+    candidates = [i for i in files[".pdb"] if i in files[".trb"]]
+
+    def finished(i: int) -> bool:
+        return all((files[suffix][i].size() or 0) > 0 for suffix in (".pdb", ".trb"))
+
+    with ThreadPoolExecutor(8) as pool:
+        return {i for i, ok in zip(candidates, pool.map(finished, candidates)) if ok}
+
+
+def pending_ranges(
+    completed: Set[int], design_startnum: int, num_designs: int
+) -> List[Tuple[int, int]]:
+    """Contiguous `(design_startnum, count)` runs of indices not yet completed."""
+    ranges: List[Tuple[int, int]] = []
+    for i in range(design_startnum, design_startnum + num_designs):
+        if i in completed:
+            continue
+        if len(ranges) > 0 and sum(ranges[-1]) == i:
+            ranges[-1] = (ranges[-1][0], ranges[-1][1] + 1)
+        else:
+            ranges.append((i, 1))
+    return ranges
@@ -0,0 +1,234 @@
+"""Packed scaffold libraries for scaffold-guided design.
+
+A library holds the `<name>_ss.pt`/`<name>_adj.pt` pairs of a scaffold
+directory in a single file, with an index of byte ranges up front:
+
+    8 bytes   magic, b"RFDSCAF1"
+    8 bytes   index length, little-endian
+    N bytes   JSON index {"scaffolds": {name: [offset, ss_length, adj_length]}}
+    ...       the `.pt` files back to back, byte for byte
+
+so any scaffold can be read without touching the rest, locally or with
+ranged reads of the remote file. Build one from an existing directory with
+
+    python -m wf.scaffolds build path/to/scaffolds scaffolds.scaflib
+"""
+
+import argparse
+import dataclasses
+import hashlib
+import json
+import random
+import struct
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from latch.types.directory import LatchDir
+from latch.types.file import LatchFile
+
+from wf.params import RFdiffusionParams
+
+MAGIC = b"RFDSCAF1"
+HEADER = struct.Struct("<8sQ")
+# Ranges closer than this are fetched in one request.
+MERGE_GAP = 1 << 16
+
+
+class LocalSource:
+    def __init__(self, path: Path):
+        self.path = path
+
+    def read(self, offset: int, length: int) -> bytes:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+
+class RemoteSource:
+    """Ranged HTTP reads of a Latch Data file through a presigned URL."""
+
+    def __init__(self, remote_path: str):
+        # Only needed (and only importable) inside a Latch task.
+        from latch_cli import tinyrequests
+        from latch_cli.utils import get_auth_header
+        from latch_cli.utils.path import normalize_path
+        from latch_sdk_config.latch import config
+
+        response = tinyrequests.post(
+            config.api.data.get_signed_url,
+            headers={"Authorization": get_auth_header()},
+            json={"path": normalize_path(remote_path)},
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Could not get a signed URL for {remote_path}")
+        self.url = response.json()["data"]["url"]
+
+    def read(self, offset: int, length: int) -> bytes:
+        request = urllib.request.Request(
+            self.url, headers={"Range": f"bytes={offset}-{offset + length - 1}"}
+        )
+        with urllib.request.urlopen(request) as response:
+            data = response.read()
+        if len(data) != length:
+            raise RuntimeError(f"Short read at {offset}: {len(data)} of {length} bytes")
+        return data
+
+
+class ScaffoldLibrary:
+    def __init__(self, source):
+        self.source = source
+        magic, index_length = HEADER.unpack(source.read(0, HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("Not a packed scaffold library")
+        index = json.loads(source.read(HEADER.size, index_length))
+        self.data_start = HEADER.size + index_length
+        self.scaffolds: Dict[str, List[int]] = index["scaffolds"]
+
+    @property
+    def names(self) -> List[str]:
+        return sorted(self.scaffolds)
+
+    def read_scaffold(self, name: str) -> Tuple[bytes, bytes]:
+        offset, ss_length, adj_length = self.scaffolds[name]
+        data = self.source.read(self.data_start + offset, ss_length + adj_length)
+        return data[:ss_length], data[ss_length:]
+
+    def read_many(self, names: List[str]) -> Dict[str, Tuple[bytes, bytes]]:
+        """Several scaffolds, with nearby byte ranges fetched together."""
+        spans = sorted(
+            (self.scaffolds[name][0], sum(self.scaffolds[name][1:]), name)
+            for name in set(names)
+        )
+        groups: List[List[Tuple[int, int, str]]] = []
+        for span in spans:
+            if len(groups) > 0:
+                last = groups[-1][-1]
+                if span[0] - (last[0] + last[1]) <= MERGE_GAP:
+                    groups[-1].append(span)
+                    continue
+            groups.append([span])
+
+        def fetch(group: List[Tuple[int, int, str]]) -> Dict[str, Tuple[bytes, bytes]]:
+            start = group[0][0]
+            end = group[-1][0] + group[-1][1]
+            data = self.source.read(self.data_start + start, end - start)
+            out = {}
+            for offset, _, name in group:
+                ss_length, adj_length = self.scaffolds[name][1:]
+                begin = offset - start
+                out[name] = (
+                    data[begin : begin + ss_length],
+                    data[begin + ss_length : begin + ss_length + adj_length],
+                )
+            return out
+
+        scaffolds: Dict[str, Tuple[bytes, bytes]] = {}
+        with ThreadPoolExecutor(8) as pool:
+            for fetched in pool.map(fetch, groups):
+                scaffolds.update(fetched)
+        return scaffolds
+
+    def extract(self, names: List[str], directory: Path) -> int:
+        """Write `names` as a scaffold directory RFdiffusion reads. Returns bytes."""
+        directory.mkdir(parents=True, exist_ok=True)
+        written = 0
+        for name, (ss, adj) in self.read_many(names).items():
+            (directory / f"{name}_ss.pt").write_bytes(ss)
+            (directory / f"{name}_adj.pt").write_bytes(adj)
+            written += len(ss) + len(adj)
+        return written
+
+
+def build_library(scaffold_dir: Path, path: Path) -> int:
+    """Pack every `<name>_ss.pt` with a matching `<name>_adj.pt`. Returns the count."""
+    names = sorted(
+        ss.name[: -len("_ss.pt")]
+        for ss in scaffold_dir.glob("*_ss.pt")
+        if (scaffold_dir / f"{ss.name[: -len('_ss.pt')]}_adj.pt").exists()
+    )
+    scaffolds = {}
+    offset = 0
+    for name in names:
+        ss_length = (scaffold_dir / f"{name}_ss.pt").stat().st_size
+        adj_length = (scaffold_dir / f"{name}_adj.pt").stat().st_size
+        scaffolds[name] = [offset, ss_length, adj_length]
+        offset += ss_length + adj_length
+
+    index = json.dumps({"version": 1, "scaffolds": scaffolds}).encode()
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(index)))
+        f.write(index)
+        for name in names:
+            for suffix in ("_ss.pt", "_adj.pt"):
+                f.write((scaffold_dir / f"{name}{suffix}").read_bytes())
+    return len(names)
+
+
+def open_library(library: LatchFile) -> ScaffoldLibrary:
+    if library.remote_path is not None and library.remote_path.startswith("latch://"):
+        try:
+            return ScaffoldLibrary(RemoteSource(library.remote_path))
+        except Exception as e:
+            print(f"Ranged reads unavailable ({e}), downloading the whole library")
+    return ScaffoldLibrary(LocalSource(Path(library.local_path)))
+
+
+def sample_scaffolds(names: List[str], num_designs: int, seed: str) -> List[str]:
+    """One uniformly drawn scaffold per design, without the duplicates.
+
+    RFdiffusion then draws uniformly from this subset for each design, so
+    every design's scaffold is still uniform over the whole library.
+    """
+    rng = random.Random(hashlib.sha256(seed.encode()).hexdigest())
+    return sorted(set(rng.choices(names, k=num_designs)))
+
+
+def stage_scaffold_library(
+    params: RFdiffusionParams, num_designs: int, directory: Path, seed: str
+) -> RFdiffusionParams:
+    """Replace `scaffold_library` with a scaffold directory of sampled scaffolds."""
+    if params.scaffold_library is None:
+        return params
+
+    library = open_library(params.scaffold_library)
+    names = sample_scaffolds(library.names, num_designs, seed)
+    written = library.extract(names, directory)
+    total = sum(sum(entry[1:]) for entry in library.scaffolds.values())
+    print(
+        f"Fetched {len(names)} of {len(library.names)} scaffolds"
+        f" ({written / 1e6:.1f} of {total / 1e6:.1f} MB)"
+    )
+    return dataclasses.replace(
+        params, scaffold_dir=LatchDir(str(directory)), scaffold_library=None
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Pack a scaffold directory")
+    build.add_argument("scaffold_dir", type=Path)
+    build.add_argument("library", type=Path)
+
+    extract = subparsers.add_parser("extract", help="Unpack scaffolds")
+    extract.add_argument("library", type=Path)
+    extract.add_argument("directory", type=Path)
+    extract.add_argument("names", nargs="*", help="Defaults to every scaffold")
+
+    listing = subparsers.add_parser("list", help="List the scaffolds in a library")
+    listing.add_argument("library", type=Path)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        count = build_library(args.scaffold_dir, args.library)
+        print(f"Packed {count} scaffolds into {args.library}")
+    else:
+        library = ScaffoldLibrary(LocalSource(args.library))
+        if args.command == "list":
+            print("\n".join(library.names))
+        else:
+            written = library.extract(args.names or library.names, args.directory)
+            print(f"Extracted {written / 1e6:.1f} MB into {args.directory}")
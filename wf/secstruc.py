@@ -0,0 +1,366 @@
+"""Secondary structure and block adjacency for fold conditioning.
+
+Scaffold-guided RFdiffusion reads two tensors per fold: `<name>_ss.pt`
+(per residue 0 helix, 1 strand, 2 loop) and `<name>_adj.pt` (1 where the
+helices/strands holding two residues are in contact). They are computed here
+from backbone PDBs with NumPy, one process per core:
+
+- secondary structure from DSSP's backbone hydrogen-bond energy. Two
+  consecutive i→i+4 H-bonds make a helix; a residue in a parallel or
+  antiparallel bridge next to another bridged residue is strand.
+- adjacency between every pair of helix/strand segments with a virtual Cβ
+  pair closer than ADJACENCY_CUTOFF Å
+
+Results are cached by PDB content, so re-running over a grown scaffold set
+only computes the new folds.
+
+    python -m wf.secstruc <pdb dir> <scaffold dir>
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from latch.ldata.path import LPath
+from latch.ldata.type import LatchPathError
+from latch.resources.tasks import custom_task
+from latch.resources.workflow import workflow
+from latch.types.directory import LatchDir, LatchOutputDir
+from latch.types.file import LatchFile
+
+from wf.cache import CACHE_DIR
+from wf.design_store import read_backbone
+from wf.params import RUN_INFERENCE_COMMAND
+from wf.uploader import file_digest
+
+HELIX, STRAND, LOOP = 0, 1, 2
+# Kabsch & Sander: q1 q2 f with partial charges 0.42e/0.20e, in kcal/mol.
+HBOND_FACTOR = 0.084 * 332
+HBOND_CUTOFF = -0.5
+ADJACENCY_CUTOFF = 6.0
+# Bump when the assignment changes, so cached results are recomputed.
+SECSTRUC_VERSION = 1
+
+SECSTRUC_CACHE_DIR = CACHE_DIR / "secstruc"
+# Host Python has no torch, so the tensors are saved by RFdiffusion's.
+SE3NV_PYTHON = RUN_INFERENCE_COMMAND[:-1]
+SAVE_TENSORS = """
+import json, os, sys
+import numpy as np, torch
+for arrays, prefix in json.load(open(sys.argv[1])):
+    arrays = np.load(arrays)
+    for name, dtype in (("ss", torch.long), ("adj", torch.float32)):
+        tensor = torch.from_numpy(arrays[name]).to(dtype)
+        torch.save(tensor, f"{prefix}_{name}.pt.tmp")
+        os.replace(f"{prefix}_{name}.pt.tmp", f"{prefix}_{name}.pt")
+"""
+
+
+def unit(v: np.ndarray) -> np.ndarray:
+    return v / np.linalg.norm(v, axis=-1, keepdims=True)
+
+
+def pairwise(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.linalg.norm(a[:, None] - b[None], axis=-1)
+
+
+def shifted(m: np.ndarray, di: int, dj: int) -> np.ndarray:
+    """`out[i, j] = m[i + di, j + dj]`, False outside `m`."""
+    padded = np.pad(m, 1)
+    n, k = m.shape
+    return padded[1 + di : 1 + di + n, 1 + dj : 1 + dj + k]
+
+
+def hbonds(coords: np.ndarray, chain: np.ndarray) -> np.ndarray:
+    """`hb[i, j]`: the C=O of residue i accepts an H-bond from the N-H of j."""
+    n, c, o = coords[:, 0], coords[:, 2], coords[:, 3]
+    # Amide H on the C(i-1)=O(i-1) bisector, 1 Å from N; none after a break.
+    h = np.full_like(n, np.nan)
+    h[1:] = n[1:] + unit(c[:-1] - o[:-1])
+    h[1:][chain[1:] != chain[:-1]] = np.nan
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        energy = HBOND_FACTOR * (
+            1 / pairwise(o, n)
+            + 1 / pairwise(c, h)
+            - 1 / pairwise(o, h)
+            - 1 / pairwise(c, n)
+        )
+    hb = energy < HBOND_CUTOFF
+    index = np.arange(len(coords))
+    hb &= np.abs(index[:, None] - index[None]) > 2
+    return hb
+
+
+def secondary_structure(coords: np.ndarray, chain: np.ndarray) -> np.ndarray:
+    hb = hbonds(coords, chain)
+    length = len(coords)
+    ss = np.full(length, LOOP, dtype=np.int64)
+
+    # Turns at i and i + 1 make i + 1 .. i + 4 helical.
+    turn = np.zeros(length, dtype=bool)
+    index = np.arange(length - 4)
+    turn[index] = hb[index, index + 4]
+    start = turn & np.roll(turn, -1)
+    start[-1] = False
+    for offset in range(1, 5):
+        ss[offset:][start[: length - offset]] = HELIX
+
+    t = hb.T
+    parallel = (shifted(hb, -1, 0) & shifted(t, 1, 0)) | (
+        shifted(t, 0, -1) & shifted(hb, 0, 1)
+    )
+    antiparallel = (hb & t) | (shifted(hb, -1, 1) & shifted(t, 1, -1))
+    index = np.arange(length)
+    bridged = (
+        (parallel | antiparallel) & (np.abs(index[:, None] - index[None]) > 2)
+    ).any(axis=1)
+    # An isolated bridge is not a strand.
+    neighbour = np.zeros(length, dtype=bool)
+    neighbour[1:] |= bridged[:-1]
+    neighbour[:-1] |= bridged[1:]
+    ladder = bridged & neighbour
+    ss[ladder & (ss != HELIX)] = STRAND
+    return ss
+
+
+def virtual_cb(coords: np.ndarray) -> np.ndarray:
+    n, ca, c = coords[:, 0], coords[:, 1], coords[:, 2]
+    b = ca - n
+    c = c - ca
+    a = np.cross(b, c)
+    return -0.58273431 * a + 0.56802827 * b - 0.54067466 * c + ca
+
+
+def block_adjacency(
+    coords: np.ndarray, chain: np.ndarray, ss: np.ndarray
+) -> np.ndarray:
+    # Segments are runs of one secondary structure within one chain.
+    boundary = np.ones(len(ss), dtype=bool)
+    boundary[1:] = (ss[1:] != ss[:-1]) | (chain[1:] != chain[:-1])
+    segment = np.cumsum(boundary) - 1
+    members = np.zeros((segment[-1] + 1, len(ss)), dtype=np.float32)
+    members[segment, np.arange(len(ss))] = 1
+
+    cb = virtual_cb(coords)
+    with np.errstate(invalid="ignore"):
+        contact = (pairwise(cb, cb) < ADJACENCY_CUTOFF).astype(np.float32)
+    blocks = members @ contact @ members.T > 0
+    np.fill_diagonal(blocks, False)
+
+    structured = ss != LOOP
+    adjacency = blocks[segment[:, None], segment[None]]
+    adjacency &= structured[:, None] & structured[None]
+    return adjacency.astype(np.float32)
+
+
+def compute_ss_adj(path: Path) -> Tuple[np.ndarray, np.ndarray]:
+    backbone = read_backbone(path)
+    # RFdiffusion numbers residues by their CA atoms.
+    keep = ~np.isnan(backbone["coords"][:, 1]).any(axis=-1)
+    coords = backbone["coords"][keep].astype(np.float64)
+    chain = backbone["chain"][keep]
+    if len(coords) == 0:
+        raise ValueError(f"{path.name} has no CA atoms")
+    ss = secondary_structure(coords, chain)
+    return ss, block_adjacency(coords, chain, ss)
+
+
+def pdb_key(path: Path) -> str:
+    digest = hashlib.sha256(file_digest(path).encode())
+    digest.update(json.dumps([SECSTRUC_VERSION, ADJACENCY_CUTOFF]).encode())
+    return digest.hexdigest()
+
+
+def cached(cache_dir: Path, key: str) -> bool:
+    return all((cache_dir / f"{key}_{name}.pt").exists() for name in ("ss", "adj"))
+
+
+def precompute(
+    pdbs: List[Path],
+    output_dir: Path,
+    cache_dir: Path = SECSTRUC_CACHE_DIR,
+    processes: Optional[int] = None,
+    python: List[str] = SE3NV_PYTHON,
+) -> List[str]:
+    """Write `<stem>_ss.pt`/`<stem>_adj.pt` for every PDB. Returns the new keys."""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(8) as pool:
+        keys = list(pool.map(pdb_key, pdbs))
+
+    missing: Dict[str, Path] = {}
+    for key, pdb in zip(keys, pdbs):
+        if not cached(cache_dir, key):
+            missing.setdefault(key, pdb)
+    print(
+        f"{len(pdbs)} PDBs: {len(pdbs) - len(missing)} cached,"
+        f" {len(missing)} to compute on {processes or os.cpu_count()} processes"
+    )
+
+    if len(missing) > 0:
+        with tempfile.TemporaryDirectory() as scratch, ProcessPoolExecutor(
+            processes
+        ) as pool:
+            jobs = []
+            results = pool.map(
+                compute_ss_adj, missing.values(), chunksize=max(1, len(missing) // 256)
+            )
+            for key, (ss, adj) in zip(missing, results):
+                arrays = Path(scratch) / f"{key}.npz"
+                np.savez(arrays, ss=ss, adj=adj)
+                jobs.append([str(arrays), str(cache_dir / key)])
+            job_file = Path(scratch) / "jobs.json"
+            job_file.write_text(json.dumps(jobs))
+            subprocess.run([*python, "-c", SAVE_TENSORS, str(job_file)], check=True)
+
+    for key, pdb in zip(keys, pdbs):
+        for name in ("ss", "adj"):
+            shutil.copyfile(
+                cache_dir / f"{key}_{name}.pt", output_dir / f"{pdb.stem}_{name}.pt"
+            )
+    return list(missing)
+
+
+def fetch_remote_cache(remote_dir: str, keys: List[str], cache_dir: Path) -> int:
+    """Download whichever of `keys` an earlier run cached in `remote_dir`."""
+    try:
+        present = {path.name() for path in LPath(remote_dir).iterdir()}
+    except LatchPathError:
+        return 0
+    files = [
+        f"{key}_{name}.pt"
+        for key in keys
+        if not cached(cache_dir, key)
+        and all(f"{key}_{name}.pt" in present for name in ("ss", "adj"))
+        for name in ("ss", "adj")
+    ]
+    with ThreadPoolExecutor(16) as pool:
+        list(
+            pool.map(
+                lambda f: LPath(f"{remote_dir}/{f}").download(cache_dir / f), files
+            )
+        )
+    return len(files) // 2
+
+
+def upload_remote_cache(remote_dir: str, keys: List[str], cache_dir: Path) -> None:
+    files = [f"{key}_{name}.pt" for key in keys for name in ("ss", "adj")]
+    with ThreadPoolExecutor(16) as pool:
+        list(
+            pool.map(
+                lambda f: LPath(f"{remote_dir}/{f}").upload_from(cache_dir / f), files
+            )
+        )
+
+
+class PreparedInputs(NamedTuple):
+    scaffold_dir: Optional[LatchDir]
+    target_ss: Optional[LatchFile]
+    target_adj: Optional[LatchFile]
+
+
+@workflow
+def given_inputs(
+    scaffold_dir: Optional[LatchDir],
+    target_ss: Optional[LatchFile],
+    target_adj: Optional[LatchFile],
+) -> PreparedInputs:
+    """Given Scaffold Inputs
+
+    Passes the scaffold directory and target tensors through when there are
+    no scaffold PDBs to prepare, without starting a task.
+    """
+    return PreparedInputs(
+        scaffold_dir=scaffold_dir, target_ss=target_ss, target_adj=target_adj
+    )
+
+
+def secstruc_cpus(scaffold_pdbs: Optional[LatchDir]) -> int:
+    return 2 if scaffold_pdbs is None else 30
+
+
+def secstruc_memory(scaffold_pdbs: Optional[LatchDir]) -> int:
+    return 4 if scaffold_pdbs is None else 60
+
+
+@custom_task(cpu=secstruc_cpus, memory=secstruc_memory)
+def secstruc_task(
+    run_name: str,
+    output_directory: LatchOutputDir,
+    scaffold_pdbs: Optional[LatchDir] = None,
+    scaffold_dir: Optional[LatchDir] = None,
+    target_path: Optional[LatchFile] = None,
+    target_ss: Optional[LatchFile] = None,
+    target_adj: Optional[LatchFile] = None,
+) -> PreparedInputs:
+    """Scaffold ss/adj tensors computed from `scaffold_pdbs`.
+
+    The target's are computed alongside them, where not given; without
+    `scaffold_pdbs` every input is passed through untouched.
+    """
+    if scaffold_pdbs is None:
+        return PreparedInputs(scaffold_dir, target_ss, target_adj)
+    compute_target = (
+        target_path is not None and target_ss is None and target_adj is None
+    )
+
+    pdbs = sorted(Path(scaffold_pdbs.local_path).glob("*.pdb"))
+    if len(pdbs) == 0:
+        raise ValueError("Scaffold PDB directory has no .pdb files")
+    target_pdbs = [Path(target_path.local_path)] if compute_target else []
+
+    remote_root = output_directory.remote_path.rstrip("/")
+    remote_cache = f"{remote_root}/.secstruc_cache"
+    keys = [pdb_key(pdb) for pdb in pdbs + target_pdbs]
+    fetched = fetch_remote_cache(remote_cache, keys, SECSTRUC_CACHE_DIR)
+    print(f"Fetched {fetched} cached results from {remote_cache}")
+
+    local_dir = Path(f"/root/outputs/{run_name}_secstruc")
+    new_keys = precompute(pdbs, local_dir / "scaffolds")
+    if compute_target:
+        new_keys += precompute(target_pdbs, local_dir / "target")
+    upload_remote_cache(remote_cache, new_keys, SECSTRUC_CACHE_DIR)
+
+    remote_dir = f"{remote_root}/{run_name}/secstruc"
+    scaffold_dir = LatchDir(str(local_dir / "scaffolds"), f"{remote_dir}/scaffolds")
+    if compute_target:
+        stem = target_pdbs[0].stem
+        target_ss, target_adj = (
+            LatchFile(
+                str(local_dir / "target" / f"{stem}_{name}.pt"),
+                f"{remote_dir}/target/{stem}_{name}.pt",
+            )
+            for name in ("ss", "adj")
+        )
+    return PreparedInputs(scaffold_dir, target_ss, target_adj)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("pdb_dir", type=Path)
+    parser.add_argument("scaffold_dir", type=Path)
+    parser.add_argument("--cache-dir", type=Path, default=SECSTRUC_CACHE_DIR)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument(
+        "--python",
+        default=" ".join(SE3NV_PYTHON),
+        help="Command for a Python with torch, used to save the tensors",
+    )
+    args = parser.parse_args()
+
+    precompute(
+        sorted(args.pdb_dir.glob("*.pdb")),
+        args.scaffold_dir,
+        args.cache_dir,
+        args.processes,
+        args.python.split(),
+    )
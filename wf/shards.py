@@ -0,0 +1,227 @@
+from contextlib import nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Tuple
+
+from latch.ldata.path import LPath
+from latch.ldata.type import LatchPathError
+from latch.resources.map_tasks import map_task
+from latch.resources.tasks import small_task, v100_x1_task
+from latch.resources.workflow import workflow
+from latch.types.directory import LatchOutputDir
+
+from wf.cache import stage_inputs
+from wf.checkpoints import ensure_checkpoint
+from wf.design_store import pack_design_store
+from wf.manifest import merge_manifests, write_manifest
+from wf.metrics import InferenceMetrics
+from wf.monitor import ResourceMonitor
+from wf.params import RFdiffusionParams, RunOptions
+from wf.resume import completed_designs, fetch_previous, remote_run_dir
+from wf.scaffolds import stage_scaffold_library
+from wf.status import DesignStatus, merge_status, print_report
+from wf.task import generate_designs
+from wf.trajectory import post_processes
+from wf.uploader import streaming_uploads, task_output
+from wf.worker import RFdiffusionWorker
+
+
+@dataclass
+class RFdiffusionShard:
+    run_name: str
+    output_directory: LatchOutputDir
+    shard_index: int
+    design_startnum: int
+    num_designs: int
+    params: RFdiffusionParams
+    options: RunOptions
+
+
+def split_designs(num_designs: int, num_shards: int) -> List[Tuple[int, int]]:
+    """Split `range(num_designs)` into contiguous `(design_startnum, count)` ranges."""
+    num_shards = max(1, min(num_shards, num_designs))
+    base, extra = divmod(num_designs, num_shards)
+
+    ranges = []
+    start = 0
+    for i in range(num_shards):
+        count = base + (1 if i < extra else 0)
+        ranges.append((start, count))
+        start += count
+    return ranges
+
+
+@small_task
+def plan_shards_task(
+    num_shards: int,
+    run_name: str,
+    output_directory: LatchOutputDir,
+    num_designs: int,
+    params: RFdiffusionParams,
+    options: RunOptions,
+) -> List[RFdiffusionShard]:
+    shards = []
+    for i, (design_startnum, count) in enumerate(
+        split_designs(num_designs, num_shards)
+    ):
+        print(f"Shard {i}: designs {design_startnum}-{design_startnum + count - 1}")
+        shards.append(
+            RFdiffusionShard(
+                run_name=run_name,
+                output_directory=output_directory,
+                shard_index=i,
+                design_startnum=design_startnum,
+                num_designs=count,
+                params=params,
+                options=options,
+            )
+        )
+    return shards
+
+
+@v100_x1_task
+def rfdif_shard_task(shard: RFdiffusionShard) -> LatchOutputDir:
+    local_output_dir = Path(f"/root/outputs/{shard.run_name}")
+    local_output_dir.mkdir(parents=True, exist_ok=True)
+
+    remote_root = shard.output_directory.remote_path
+    params = stage_inputs(shard.params)
+    ensure_checkpoint(params)
+    params = stage_scaffold_library(
+        params,
+        shard.num_designs,
+        Path(f"/root/scaffolds/{shard.run_name}/shard_{shard.shard_index}"),
+        seed=f"{shard.run_name}_{shard.design_startnum}",
+    )
+    metrics = InferenceMetrics(
+        local_output_dir / "metrics" / f"shard_{shard.shard_index}.jsonl"
+    )
+    with streaming_uploads(
+        shard.options.stream_uploads,
+        remote_root,
+        hold_trajectories=post_processes(params),
+    ) as uploader:
+        resource_dir = local_output_dir / "resources"
+        with ResourceMonitor(
+            resource_dir / f"shard_{shard.shard_index}.csv"
+        ) as monitor, (
+            RFdiffusionWorker() if shard.options.persistent_worker else nullcontext()
+        ) as worker:
+            # Seeding from the design index (inference.deterministic) gives
+            # every shard its own seed range alongside its own output names.
+            generate_designs(
+                params,
+                shard.run_name,
+                local_output_dir,
+                remote_run_dir(remote_root, shard.run_name),
+                shard.design_startnum,
+                shard.num_designs,
+                resume=shard.options.resume,
+                deterministic=True,
+                worker=worker,
+                metrics=metrics,
+                design_retries=shard.options.design_retries,
+                status=DesignStatus(
+                    local_output_dir / "status" / f"shard_{shard.shard_index}.json",
+                    local_output_dir,
+                    shard.run_name,
+                ),
+            )
+        metrics.print_summary()
+        monitor.write_peaks(
+            metrics.events, resource_dir / f"shard_{shard.shard_index}_peaks.csv"
+        )
+        if shard.options.pack_designs:
+            pack_design_store(
+                local_output_dir,
+                shard.run_name,
+                f"{shard.run_name}_designs_{shard.shard_index}",
+            )
+        manifest_dir = local_output_dir / "manifests"
+        manifest_dir.mkdir(parents=True, exist_ok=True)
+        manifest = f"shard_{shard.shard_index}.csv"
+        previous = None
+        if shard.options.resume:
+            previous = fetch_previous(
+                f"{remote_run_dir(remote_root, shard.run_name)}/manifests/{manifest}",
+                Path(f"/root/previous/{shard.run_name}") / manifest,
+            )
+        write_manifest(
+            local_output_dir, shard.run_name, manifest_dir / manifest, previous
+        )
+
+    print(f"Returning results for shard {shard.shard_index}")
+    return task_output(remote_root, uploader)
+
+
+@small_task
+def merge_shards_task(
+    run_name: str,
+    output_directory: LatchOutputDir,
+    num_designs: int,
+    shard_outputs: List[LatchOutputDir],
+) -> LatchOutputDir:
+    # Shards upload into the same remote run directory under disjoint design
+    # indices, so merging only has to confirm that every index made it.
+    remote_dir = remote_run_dir(output_directory.remote_path, run_name)
+    completed = completed_designs(remote_dir, run_name)
+    missing = [i for i in range(num_designs) if i not in completed]
+
+    print(f"Merged {len(shard_outputs)} shards into {remote_dir}")
+    print(f"{num_designs - len(missing)}/{num_designs} designs present")
+    if len(missing) > 0:
+        print(f"Missing designs: {missing}")
+
+    local_run_dir = Path(f"/root/outputs/{run_name}")
+    local_run_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        manifest_files = list(LPath(f"{remote_dir}/manifests").iterdir())
+    except LatchPathError:
+        manifest_files = []
+    manifests = [
+        manifest.download(local_run_dir / "manifests" / manifest.name())
+        for manifest in manifest_files
+    ]
+    merge_manifests(manifests, local_run_dir / f"{run_name}_manifest.csv")
+
+    try:
+        status_files = list(LPath(f"{remote_dir}/status").iterdir())
+    except LatchPathError:
+        status_files = []
+    reports = [
+        status.download(local_run_dir / "status" / status.name())
+        for status in status_files
+    ]
+    print_report(merge_status(reports, local_run_dir / f"{run_name}_status.json"))
+
+    return LatchOutputDir("/root/outputs", output_directory.remote_path)
+
+
+@workflow
+def rfdif_sharded_workflow(
+    num_shards: int,
+    run_name: str,
+    output_directory: LatchOutputDir,
+    num_designs: int,
+    params: RFdiffusionParams,
+    options: RunOptions,
+) -> LatchOutputDir:
+    """Sharded RFdiffusion
+
+    Splits `num_designs` across parallel GPU tasks and merges their outputs.
+    """
+    shards = plan_shards_task(
+        num_shards=num_shards,
+        run_name=run_name,
+        output_directory=output_directory,
+        num_designs=num_designs,
+        params=params,
+        options=options,
+    )
+    shard_outputs = map_task(rfdif_shard_task)(shard=shards)
+    return merge_shards_task(
+        run_name=run_name,
+        output_directory=output_directory,
+        num_designs=num_designs,
+        shard_outputs=shard_outputs,
+    )
@@ -0,0 +1,131 @@
+"""Which designs of a run completed, and why the others did not.
+
+A design that fails (e.g. CUDA out of memory on a long sampled length)
+stops the RFdiffusion job it is part of, but not the run: generation goes
+on from the next index, and every failed index is then retried on its own
+(see wf.task.generate_designs). `<run_name>_status.json` lists every
+requested index as completed or failed, with the attempts and last error of
+each failure, and the attempts of designs that only completed on a retry:
+
+    {
+        "requested": 1000,
+        "completed": [0, 1, 2, ...],
+        "failed": {"17": {"attempts": 3, "error": "CUDA out of memory ..."}},
+        "recovered": {"503": 2}
+    }
+
+Sharded runs write `status/shard_<i>.json`, which are merged into the run's
+status file.
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class DesignStatus:
+    def __init__(self, path: Path, design_dir: Path, run_name: str):
+        self.path = path
+        self.design_dir = design_dir
+        self.run_name = run_name
+        self.requested: Set[int] = set()
+        self.completed: Set[int] = set()
+        self.attempts: Dict[int, int] = {}
+        self.errors: Dict[int, str] = {}
+        self.lock = threading.Lock()
+
+    def finished(self, i: int) -> bool:
+        # run_inference.py writes the .trb after the .pdb.
+        prefix = self.design_dir / f"{self.run_name}_{i}"
+        return (
+            prefix.with_suffix(".pdb").exists() and prefix.with_suffix(".trb").exists()
+        )
+
+    def request(self, indices: Iterable[int], completed: Iterable[int] = ()) -> None:
+        with self.lock:
+            self.requested.update(indices)
+            self.completed.update(completed)
+
+    def withdraw(self, indices: Iterable[int]) -> None:
+        """Drop designs that were requested but never attempted."""
+        with self.lock:
+            self.requested.difference_update(
+                i for i in indices if self.attempts.get(i, 0) == 0
+            )
+
+    def record(self, start: int, end: int, error: Optional[str]) -> Optional[int]:
+        """Record a job over `range(start, end)`; the index it stopped at, if any.
+
+        Designs run in order, so the first unfinished index is the one that
+        failed, and the indices after it were never attempted.
+        """
+        with self.lock:
+            for i in range(start, end):
+                self.attempts[i] = self.attempts.get(i, 0) + 1
+                if self.finished(i):
+                    self.completed.add(i)
+                    self.errors.pop(i, None)
+                    continue
+                self.errors[i] = error or "finished without writing its .pdb/.trb"
+                return i
+        return None
+
+    @property
+    def failed(self) -> List[int]:
+        with self.lock:
+            return sorted(self.requested - self.completed)
+
+    def report(self) -> Dict:
+        failed = self.failed
+        return {
+            "requested": len(self.requested),
+            "completed": sorted(self.completed & self.requested),
+            "failed": {
+                str(i): {
+                    "attempts": self.attempts.get(i, 0),
+                    "error": self.errors.get(i, "not attempted"),
+                }
+                for i in failed
+            },
+            "recovered": {
+                str(i): n
+                for i, n in sorted(self.attempts.items())
+                if n > 1 and i in self.completed
+            },
+        }
+
+    def write(self) -> None:
+        report = self.report()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(report, f, indent=2)
+        print_report(report)
+
+
+def print_report(report: Dict) -> None:
+    print("-" * 60)
+    print(f"{len(report['completed'])}/{report['requested']} designs completed")
+    if len(report["recovered"]) > 0:
+        print(f"Completed on a retry: {sorted(map(int, report['recovered']))}")
+    for i, failure in report["failed"].items():
+        print(
+            f"Design {i} failed after {failure['attempts']} attempts:"
+            f" {failure['error']}"
+        )
+
+
+def merge_status(reports: List[Path], path: Path) -> Dict:
+    """Combine the status files of disjoint design ranges (e.g. shards)."""
+    merged: Dict = {"requested": 0, "completed": [], "failed": {}, "recovered": {}}
+    for report_path in reports:
+        with open(report_path) as f:
+            report = json.load(f)
+        merged["requested"] += report["requested"]
+        merged["completed"] += report["completed"]
+        merged["failed"].update(report["failed"])
+        merged["recovered"].update(report["recovered"])
+    merged["completed"].sort()
+    with open(path, "w") as f:
+        json.dump(merged, f, indent=2)
+    return merged
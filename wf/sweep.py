@@ -0,0 +1,146 @@
+"""Parameter sweeps over hotspots, partial_T, noise scales and guide scale.
+
+A sweep file is JSON with a `grid` of values per parameter, every
+combination of which is run, and/or a list of parameter `sets`. When both
+are given, each set is crossed with the grid:
+
+    {
+        "grid": {"noise_scale": [0.5, 1.0], "potentials_guide_scale": [1, 5]},
+        "sets": [
+            {"hotspot_residues_binder": "A59,A83,A91", "partial_T": 20},
+            {"hotspot_residues_binder": "A30,A33,A34", "partial_T": null}
+        ],
+        "num_designs": 10
+    }
+
+`noise_scale` sets `noise_scale_ca` and `noise_scale_frame` together, and
+`null` turns an optional parameter off. Every configuration becomes one
+spec sheet row named `config_<i>` (see wf.batch), so configurations that
+share a checkpoint run back to back in one GPU task, and the run's
+`batch_summary.tsv` compares them side by side.
+
+    python -m wf.sweep <sweep.json>
+"""
+
+import argparse
+import json
+from itertools import product
+from pathlib import Path
+from typing import Any, Dict, List
+
+SWEEP_PARAMETERS = {
+    "hotspot_residues_binder": str,
+    "partial_T": int,
+    "noise_scale_ca": float,
+    "noise_scale_frame": float,
+    "potentials_guide_scale": float,
+}
+# Shorthands that set several parameters to the same value.
+SWEEP_ALIASES = {"noise_scale": ["noise_scale_ca", "noise_scale_frame"]}
+OPTIONAL_PARAMETERS = {"hotspot_residues_binder", "partial_T"}
+MAX_CONFIGURATIONS = 1000
+
+
+def sweep_value(name: str, value: Any) -> Any:
+    kind = SWEEP_PARAMETERS[name]
+    if value is None:
+        if name not in OPTIONAL_PARAMETERS:
+            raise ValueError(f"Sweep parameter '{name}' cannot be null")
+        return None
+    if kind is str:
+        if isinstance(value, list):
+            return ",".join(str(item) for item in value)
+        return str(value)
+    # JSON booleans are ints in Python; neither is a sensible scale or step.
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"Sweep parameter '{name}': expected a number, got {value!r}")
+    if kind is int and value != int(value):
+        raise ValueError(f"Sweep parameter '{name}': expected an integer, got {value}")
+    return kind(value)
+
+
+def resolve(configuration: Dict[str, Any]) -> Dict[str, Any]:
+    resolved = {}
+    for name, value in configuration.items():
+        for target in SWEEP_ALIASES.get(name, [name]):
+            if target not in SWEEP_PARAMETERS:
+                choices = ", ".join([*SWEEP_PARAMETERS, *SWEEP_ALIASES])
+                raise ValueError(
+                    f"Unknown sweep parameter '{name}', expected one of {choices}"
+                )
+            resolved[target] = sweep_value(target, value)
+    return resolved
+
+
+def expand_sweep(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Parameter overrides of every configuration, sets crossed with the grid."""
+    unknown = set(spec) - {"grid", "sets", "num_designs"}
+    if len(unknown) > 0:
+        raise ValueError(f"Unknown sweep file keys: {sorted(unknown)}")
+
+    grid = spec.get("grid", {})
+    sets = spec.get("sets", [{}])
+    if not isinstance(grid, dict) or not isinstance(sets, list):
+        raise ValueError("A sweep's grid must be an object and its sets a list")
+    if len(grid) == 0 and sets == [{}]:
+        raise ValueError("A sweep needs a grid, sets, or both")
+    for name, values in grid.items():
+        if not isinstance(values, list) or len(values) == 0:
+            raise ValueError(f"Grid parameter '{name}' needs a non-empty list")
+
+    configurations = []
+    for base in sets:
+        for values in product(*grid.values()):
+            configuration = resolve({**base, **dict(zip(grid, values))})
+            if configuration not in configurations:
+                configurations.append(configuration)
+    if len(configurations) > MAX_CONFIGURATIONS:
+        raise ValueError(
+            f"The sweep expands to {len(configurations)} configurations,"
+            f" more than the limit of {MAX_CONFIGURATIONS}"
+        )
+    return configurations
+
+
+def load_sweep(path: Path) -> Dict[str, Any]:
+    with open(path) as f:
+        spec = json.load(f)
+    if isinstance(spec, list):
+        spec = {"sets": spec}
+    return spec
+
+
+def sweep_num_designs(spec: Dict[str, Any], default: int) -> int:
+    return int(spec.get("num_designs", default))
+
+
+def config_name(i: int) -> str:
+    return f"config_{i:03d}"
+
+
+def settings(configuration: Dict[str, Any]) -> Dict[str, str]:
+    """A configuration's values as comparison table cells."""
+    return {
+        name: "" if value is None else str(value)
+        for name, value in configuration.items()
+    }
+
+
+def print_configurations(configurations: List[Dict[str, Any]]) -> None:
+    columns: List[str] = []
+    for configuration in configurations:
+        columns += [name for name in configuration if name not in columns]
+    print("\t".join(["config", *columns]))
+    for i, configuration in enumerate(configurations):
+        cells = settings(configuration)
+        print("\t".join([config_name(i), *(cells.get(c, "") for c in columns)]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("sweep", type=Path)
+    args = parser.parse_args()
+
+    configurations = expand_sweep(load_sweep(args.sweep))
+    print(f"{len(configurations)} configurations")
+    print_configurations(configurations)
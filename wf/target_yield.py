@@ -0,0 +1,152 @@
+"""Generate until a target number of designs pass the quality checks.
+
+Designs are generated in rounds. While RFdiffusion works on a round, a
+background thread scores each design as soon as its .trb is written, using
+the wf.quality checks. Each new round is sized from the pass rate observed
+so far to just reach the target, and no round goes past the cap.
+
+Each round also gets a stop predicate that scores whatever has finished and
+is true once the target is met, which the GPU task checks between the small
+jobs it splits a round into. Generation stops within a few designs of the
+target being met, not at the end of the round.
+"""
+
+import json
+import math
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from wf.design_store import design_pairs
+from wf.quality import QualityThresholds, check_chunk, write_quality
+
+# Rounds are sized as if at least this fraction of designs will pass, so a
+# round with no passing designs does not jump straight to the cap.
+MIN_PASS_RATE = 0.1
+
+
+def next_round(target: int, passed: int, attempted: int, cap: int) -> int:
+    if passed >= target or attempted >= cap:
+        return 0
+    rate = passed / attempted if attempted > 0 else 1.0
+    size = math.ceil((target - passed) / max(rate, MIN_PASS_RATE))
+    return min(size, cap - attempted)
+
+
+class YieldScorer:
+    """Scores finished designs in `design_dir` on a background thread."""
+
+    def __init__(
+        self,
+        design_dir: Path,
+        run_name: str,
+        thresholds: QualityThresholds,
+        interval: float = 2.0,
+    ):
+        self.design_dir = design_dir
+        self.run_name = run_name
+        self.thresholds = thresholds
+        self.interval = interval
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.watch, daemon=True)
+
+    def __enter__(self) -> "YieldScorer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stopping.set()
+        self.thread.join()
+
+    def score_new(self) -> None:
+        with self.lock:
+            new = [
+                self.design_dir / f"{name}.pdb"
+                for _, name in design_pairs(self.design_dir, self.run_name)
+                if name not in self.rows
+            ]
+            if len(new) > 0:
+                for row in check_chunk(new, self.thresholds):
+                    self.rows[row["design"]] = row
+
+    def watch(self) -> None:
+        while not self.stopping.wait(self.interval):
+            try:
+                self.score_new()
+            except Exception as e:
+                # A listing that races a new design is retried on the next pass.
+                print(f"Scoring failed, retrying: {e}")
+
+    @property
+    def passed(self) -> int:
+        with self.lock:
+            return sum(row["passed"] for row in self.rows.values())
+
+    def sorted_rows(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return sorted(
+                self.rows.values(),
+                key=lambda row: int(row["design"][len(self.run_name) + 1 :]),
+            )
+
+
+def generate_until_target(
+    run_name: str,
+    design_dir: Path,
+    target: int,
+    cap: int,
+    thresholds: QualityThresholds,
+    generate: Callable[[int, int, Callable[[], bool]], Any],
+) -> Dict[str, Any]:
+    """Call `generate(design_startnum, num_designs, stop)` in rounds until `target` pass.
+
+    `generate` should end its round early once `stop()` is true.
+    """
+    attempted = 0
+    rounds = 0
+    with YieldScorer(design_dir, run_name, thresholds) as scorer:
+
+        def stop() -> bool:
+            scorer.score_new()
+            return scorer.passed >= target
+
+        while True:
+            size = next_round(target, scorer.passed, attempted, cap)
+            if size == 0:
+                break
+            rounds += 1
+            print("-" * 60)
+            print(
+                f"Round {rounds}: designs {attempted}-{attempted + size - 1}"
+                f" ({scorer.passed}/{target} passing so far)"
+            )
+            generate(attempted, size, stop)
+            attempted += size
+            scorer.score_new()
+        rows = scorer.sorted_rows()
+
+    passed = sum(row["passed"] for row in rows)
+    report = {
+        "target": target,
+        "cap": cap,
+        "attempted": attempted,
+        "finished": len(rows),
+        "passed": passed,
+        "pass_rate": round(passed / len(rows), 4) if len(rows) > 0 else None,
+        "rounds": rounds,
+        "target_met": passed >= target,
+    }
+    print("-" * 60)
+    write_quality(rows, design_dir / f"{run_name}_quality.csv")
+    print(
+        f"Target yield: {passed}/{target} passing designs from {len(rows)} finished"
+        f" ({attempted} attempted, cap {cap}) in {rounds} rounds,"
+        f" pass rate {passed / max(len(rows), 1):.1%}"
+    )
+    if passed < target:
+        print("Stopped at the cap before reaching the target")
+    with open(design_dir / f"{run_name}_yield.json", "w") as f:
+        json.dump(report, f, indent=2)
+    return report
@@ -1,69 +1,205 @@
 import subprocess
 import sys
 import time
-from enum import Enum
+from contextlib import nullcontext
+from functools import partial
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Callable, List, Optional, Set, Tuple
 
 from latch.executions import rename_current_execution
-from latch.resources.tasks import small_gpu_task, v100_x1_task
-from latch.types.directory import LatchDir, LatchOutputDir
-from latch.types.file import LatchFile
+from latch.resources.tasks import (
+    large_gpu_task,
+    small_gpu_task,
+    v100_x1_task,
+    v100_x4_task,
+)
+from latch.types.directory import LatchOutputDir
+
+from wf.cache import stage_inputs
+from wf.checkpoints import ensure_checkpoint
+from wf.design_store import pack_design_store
+from wf.manifest import write_manifest
+from wf.metrics import InferenceMetrics
+from wf.monitor import ResourceMonitor
+from wf.multi_gpu import DevicePool, design_jobs, visible_devices
+from wf.params import (
+    RUN_INFERENCE_COMMAND,
+    RFdiffusionParams,
+    RunOptions,
+    build_overrides,
+)
+from wf.quality import QualityThresholds
+from wf.resume import (
+    completed_designs,
+    fetch_previous,
+    pending_ranges,
+    remote_run_dir,
+)
+from wf.scaffolds import stage_scaffold_library
+from wf.status import DesignStatus
+from wf.target_yield import generate_until_target
+from wf.trajectory import post_processes, store_trajectories
+from wf.uploader import streaming_uploads, task_output
+from wf.worker import RFdiffusionWorker
 
 sys.stdout.reconfigure(line_buffering=True)
 
+# Designs per RFdiffusion job when generation can stop early; the persistent
+# worker keeps its model loaded between jobs, so short jobs cost little.
+STOP_CHECK_DESIGNS = 4
 
-class SymmetryType(Enum):
-    CYCLIC_4 = "C4"
-    CYCLIC_6 = "C6"
-    DIHEDRAL_2 = "D2"
-    DIHEDRAL_4 = "D4"
-    TETRAHEDRAL = "tetrahedral"
 
-
-class PotentialDecayType(Enum):
-    CONSTANT = "constant"
-    LINEAR = "linear"
-    QUADRATIC = "quadratic"
-    CUBIC = "cubic"
+def run_rfdiffusion(
+    overrides: List[str],
+    worker: Optional[RFdiffusionWorker] = None,
+    inference_command: List[str] = RUN_INFERENCE_COMMAND,
+    metrics: Optional[InferenceMetrics] = None,
+) -> Optional[str]:
+    """Run one RFdiffusion job; the error it failed with, if any."""
+    try:
+        if metrics is not None:
+            metrics.start_job()
+        if worker is not None:
+            print("RUNNING JOB: ")
+            print(" ".join(overrides))
+            worker.run(overrides, metrics.record if metrics is not None else None)
+        else:
+            command = inference_command + overrides
+            print("RUNNING COMMAND: ")
+            print(" ".join(command))
+            # Echo the output as it arrives while timing it from the log lines.
+            with subprocess.Popen(
+                command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+            ) as process:
+                for line in process.stdout:
+                    print(line, end="")
+                    if metrics is not None:
+                        metrics.log_line(line)
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, command)
+    except Exception as e:
+        print("FAILED")
+        print(e)
+        return str(e)
+    return None
 
 
-@v100_x1_task
-def rfdif_task(
+def generate_designs(
+    params: RFdiffusionParams,
+    run_name: str,
+    local_output_dir: Path,
+    remote_dir: str,
+    design_startnum: int,
+    num_designs: int,
+    resume: bool = False,
+    deterministic: bool = False,
+    worker: Optional[RFdiffusionWorker] = None,
+    inference_command: List[str] = RUN_INFERENCE_COMMAND,
+    metrics: Optional[InferenceMetrics] = None,
+    pool: Optional[DevicePool] = None,
+    design_retries: int = 2,
+    status: Optional[DesignStatus] = None,
+    stop: Optional[Callable[[], bool]] = None,
+) -> bool:
+    """Generate a range of designs; whether every one of them completed.
+
+    A failed design does not take the rest of its range with it: generation
+    resumes from the next index, and each failed index is retried on its own
+    up to `design_retries` times. Outcomes go to `status`, by default
+    `<run_name>_status.json`.
+
+    With `stop`, the range is sent to RFdiffusion `STOP_CHECK_DESIGNS` designs
+    at a time, and generation ends as soon as `stop()` is true between jobs.
+    Designs never started are dropped from the request.
+    """
+    if status is None:
+        status = DesignStatus(
+            local_output_dir / f"{run_name}_status.json", local_output_dir, run_name
+        )
+    ranges = [(design_startnum, num_designs)]
+    completed: Set[int] = set()
+    if resume:
+        completed = completed_designs(remote_dir, run_name)
+        ranges = pending_ranges(completed, design_startnum, num_designs)
+        remaining = sum(count for _, count in ranges)
+        print(
+            f"Resuming: {num_designs - remaining}/{num_designs} designs already"
+            f" complete in {remote_dir}"
+        )
+    requested = range(design_startnum, design_startnum + num_designs)
+    status.request(requested, completed & set(requested))
+
+    def run_range(
+        worker: Optional[RFdiffusionWorker],
+        metrics: Optional[InferenceMetrics],
+        start: int,
+        count: int,
+        deterministic: bool = deterministic,
+    ) -> bool:
+        end = start + count
+        completed = True
+        while start < end:
+            if stop is not None and stop():
+                status.withdraw(range(start, end))
+                break
+            job_end = end if stop is None else min(end, start + STOP_CHECK_DESIGNS)
+            overrides = build_overrides(
+                params,
+                f"{local_output_dir}/{run_name}",
+                job_end - start,
+                design_startnum=start,
+                deterministic=deterministic,
+            )
+            error = run_rfdiffusion(overrides, worker, inference_command, metrics)
+            store_trajectories(
+                params, local_output_dir / "traj", run_name, start, job_end - start
+            )
+            failed = status.record(start, job_end, error)
+            if failed is None:
+                start = job_end
+                continue
+            completed = False
+            if failed + 1 < end:
+                print(f"Design {failed} failed, continuing from design {failed + 1}")
+            if worker is not None:
+                worker.revive()
+            start = failed + 1
+        return completed
+
+    def run_jobs(jobs: List[Tuple[int, int]], deterministic: bool) -> None:
+        if pool is not None:
+            pool.run(design_jobs(jobs), partial(run_range, deterministic=deterministic))
+            return
+        for start, count in jobs:
+            run_range(worker, metrics, start, count, deterministic)
+
+    run_jobs(ranges, deterministic)
+    for retry in range(1, design_retries + 1):
+        failed = [i for i in status.failed if i in requested]
+        if len(failed) == 0 or (stop is not None and stop()):
+            break
+        print("-" * 60)
+        print(f"Retry {retry}/{design_retries} of designs {failed}")
+        if pool is not None:
+            pool.revive()
+        # A design seeded from its index would fail the same way again.
+        run_jobs([(i, 1) for i in failed], deterministic=False)
+
+    status.write()
+    return all(i in status.completed for i in requested)
+
+
+def run_designs(
     run_name: str,
     output_directory: LatchOutputDir,
     num_designs: int,
-    contig_string: str,
-    contig_length: Optional[str] = None,
-    contig_provide_seq: Optional[str] = None,
-    input_pdb: Optional[LatchFile] = None,
-    hotspot_residues_binder: Optional[str] = None,
-    hotspot_residues_motif: Optional[str] = None,
-    hotspot_residues_ppi: Optional[str] = None,
-    scaffold_dir: Optional[LatchDir] = None,
-    target_path: Optional[LatchFile] = None,
-    target_ss: Optional[LatchFile] = None,
-    target_adj: Optional[LatchFile] = None,
-    symmetry_gen: Optional[SymmetryType] = None,
-    symmetry_motif: Optional[SymmetryType] = None,
-    partial_T: Optional[int] = None,
-    final_step: int = 50,
-    noise_scale_ca: float = 1.0,
-    noise_scale_frame: float = 1.0,
-    guiding_potentials: Optional[List[str]] = None,
-    ckpt_override_path: Optional[LatchFile] = None,
-    potentials_olig_intra_all: bool = False,
-    potentials_olig_inter_all: bool = False,
-    potentials_guide_scale: float = 1.0,
-    potentials_substrate: Optional[str] = None,
-    potentials_guide_decay: PotentialDecayType = PotentialDecayType.CONSTANT,
-    contig_inpaint_str_strand: Optional[str] = None,
-    contig_inpaint_str_helix: Optional[str] = None,
-    contig_inpaint_str: Optional[str] = None,
-    scaffoldguided: bool = False,
-    scaffoldguided_mask_loops: bool = False,
-    scaffoldguided_target_pdb: bool = False,
+    params: RFdiffusionParams,
+    options: RunOptions,
 ) -> LatchOutputDir:
+    """Generate a run's designs on the GPU task it is called from.
+
+    Every GPU tier's task is this function under that tier's resources.
+    """
     rename_current_execution(str(run_name))
 
     print("-" * 60)
@@ -71,121 +207,142 @@ def rfdif_task(
     local_output_dir = Path(f"/root/outputs/{run_name}")
     local_output_dir.mkdir(parents=True, exist_ok=True)
 
+    print("-" * 60)
+    print("Staging inputs")
+    params = stage_inputs(params)
+    ensure_checkpoint(params)
+    params = stage_scaffold_library(
+        params, num_designs, Path(f"/root/scaffolds/{run_name}"), seed=run_name
+    )
+
     print("-" * 60)
     subprocess.run(["nvidia-smi"], check=True)
     subprocess.run(["nvcc", "--version"], check=True)
 
-    print("Running RFdiffusion")
-    command = [
-        "/root/miniconda/bin/conda",
-        "run",
-        "--name",
-        "SE3nv",
-        "python",
-        "/tmp/docker-build/work/RFdiffusion/scripts/run_inference.py",
-        f"contigmap.contigs=[{contig_string}]",
-        f"inference.output_prefix={local_output_dir}/{run_name}",
-        f"inference.num_designs={num_designs}",
-    ]
-
-    if input_pdb:
-        command.append(f"inference.input_pdb={input_pdb.local_path}")
-
-    if contig_length:
-        command.append(f"contigmap.length=[{contig_length}]")
-
-    if contig_provide_seq:
-        command.append(f"contigmap.provide_seq=[{contig_provide_seq}]")
-
-    if contig_inpaint_str:
-        command.append(f"contigmap.inpaint_str=[{contig_inpaint_str}]")
-
-    if contig_inpaint_str_helix:
-        command.append(f"contigmap.inpaint_str_helix=[{contig_inpaint_str_helix}]")
-
-    if contig_length:
-        command.append(f"contigmap.length={contig_length}")
-
-    if hotspot_residues_binder:
-        command.append(f"ppi.hotspot_res=[{hotspot_residues_binder}]")
-
-    if hotspot_residues_motif:
-        command.append(f"ppi.hotspot_res=[{hotspot_residues_motif}]")
-
-    if hotspot_residues_ppi:
-        command.append(f"ppi.hotspot_res=[{hotspot_residues_ppi}]")
-
-    if scaffoldguided:
-        command.append("scaffoldguided.scaffoldguided=True")
-
-    if scaffoldguided_target_pdb:
-        command.append("scaffoldguided.target_pdb=True")
-
-    if scaffoldguided_mask_loops:
-        command.append("scaffoldguided.mask_loops=True")
-
-    if scaffold_dir:
-        command.append(f"scaffoldguided.scaffold_dir={scaffold_dir.local_path}")
-        if not scaffoldguided:
-            command.append("scaffoldguided.scaffoldguided=True")
+    devices = visible_devices()
+    pool = None
+    if len(devices) > 1:
+        print(f"Running one RFdiffusion worker on each of {len(devices)} GPUs")
+        pool = DevicePool(devices, local_output_dir / "metrics")
 
-    if target_path:
-        command.append(f"scaffoldguided.target_path={target_path.local_path}")
-        if not scaffoldguided_target_pdb:
-            command.append("scaffoldguided.target_pdb=True")
-
-    if target_ss:
-        command.append(f"scaffoldguided.target_ss={target_ss.local_path}")
-
-    if target_adj:
-        command.append(f"scaffoldguided.target_adj={target_adj.local_path}")
-
-    # Handle symmetry options
-    if symmetry_gen and symmetry_motif:
-        if symmetry_gen != symmetry_motif:
-            raise ValueError(
-                "symmetry_gen and symmetry_motif must be the same if both are provided"
+    print("Running RFdiffusion")
+    metrics = InferenceMetrics(local_output_dir / f"{run_name}_metrics.jsonl")
+    # Shared by every round of a target yield run.
+    status = DesignStatus(
+        local_output_dir / f"{run_name}_status.json", local_output_dir, run_name
+    )
+    with streaming_uploads(
+        options.stream_uploads,
+        output_directory.remote_path,
+        hold_trajectories=post_processes(params),
+    ) as uploader:
+        with ResourceMonitor(local_output_dir / f"{run_name}_resources.csv") as monitor:
+            with pool if pool is not None else nullcontext(), (
+                RFdiffusionWorker()
+                if options.persistent_worker and pool is None
+                else nullcontext()
+            ) as worker:
+
+                def generate(
+                    start: int, count: int, stop: Optional[Callable[[], bool]] = None
+                ) -> bool:
+                    return generate_designs(
+                        params,
+                        run_name,
+                        local_output_dir,
+                        remote_run_dir(output_directory.remote_path, run_name),
+                        start,
+                        count,
+                        resume=options.resume,
+                        deterministic=options.deterministic,
+                        worker=worker,
+                        metrics=metrics,
+                        pool=pool,
+                        design_retries=options.design_retries,
+                        status=status,
+                        stop=stop,
+                    )
+
+                if options.yield_target > 0:
+                    # num_designs caps how many designs are attempted.
+                    thresholds = QualityThresholds(
+                        max_chain_breaks=options.filter_max_chain_breaks,
+                        max_clashes=options.filter_max_clashes,
+                        max_rg_ratio=options.filter_max_rg_ratio,
+                        max_loop_fraction=options.filter_max_loop_fraction,
+                    )
+                    generate_until_target(
+                        run_name,
+                        local_output_dir,
+                        options.yield_target,
+                        num_designs,
+                        thresholds,
+                        generate,
+                    )
+                else:
+                    generate(0, num_designs)
+        (metrics if pool is None else pool).print_summary()
+        monitor.write_peaks(
+            metrics.events if pool is None else pool.events,
+            local_output_dir / f"{run_name}_resource_peaks.csv",
+        )
+        if options.pack_designs:
+            pack_design_store(local_output_dir, run_name, f"{run_name}_designs")
+        manifest = f"{run_name}_manifest.csv"
+        previous = None
+        if options.resume:
+            # Designs from before the resume are only in the remote manifest.
+            previous = fetch_previous(
+                f"{remote_run_dir(output_directory.remote_path, run_name)}/{manifest}",
+                Path(f"/root/previous/{run_name}") / manifest,
             )
-        command.append(f"inference.symmetry={symmetry_gen.value}")
-    elif symmetry_gen:
-        command.append(f"inference.symmetry={symmetry_gen.value}")
-    elif symmetry_motif:
-        command.append(f"inference.symmetry={symmetry_motif.value}")
+        write_manifest(
+            local_output_dir, run_name, local_output_dir / manifest, previous
+        )
 
-    if partial_T is not None:
-        command.append(f"diffuser.partial_T={partial_T}")
+    print("Returning results")
+    return task_output(output_directory.remote_path, uploader)
 
-    command.append(f"diffuser.T={final_step}")
-    command.append(f"denoiser.noise_scale_ca={noise_scale_ca}")
-    command.append(f"denoiser.noise_scale_frame={noise_scale_frame}")
 
-    # 'potentials.guiding_potentials=["type:olig_contacts,weight_intra:1,weight_inter:0.1"]' -> goal
-    # 'potentials.guiding_potentials=["type:olig_contacts","weight_intra:1","weight_inter:0.1"]' -> now
-    if guiding_potentials:
-        potentials_str = ",".join(guiding_potentials)
-        command.append(f'potentials.guiding_potentials=["{potentials_str}"]')
+@small_gpu_task
+def rfdif_small_gpu_task(
+    run_name: str,
+    output_directory: LatchOutputDir,
+    num_designs: int,
+    params: RFdiffusionParams,
+    options: RunOptions,
+) -> LatchOutputDir:
+    return run_designs(run_name, output_directory, num_designs, params, options)
 
-    if potentials_olig_intra_all:
-        command.append("potentials.olig_intra_all=True")
 
-    if potentials_olig_inter_all:
-        command.append("potentials.olig_inter_all=True")
+@v100_x1_task
+def rfdif_task(
+    run_name: str,
+    output_directory: LatchOutputDir,
+    num_designs: int,
+    params: RFdiffusionParams,
+    options: RunOptions,
+) -> LatchOutputDir:
+    return run_designs(run_name, output_directory, num_designs, params, options)
 
-    if potentials_substrate:
-        command.append(f"potentials.substrate={potentials_substrate}")
 
-    command.append(f"potentials.guide_scale={potentials_guide_scale}")
-    command.append(f"potentials.guide_decay={potentials_guide_decay.value}")
+@large_gpu_task
+def rfdif_large_gpu_task(
+    run_name: str,
+    output_directory: LatchOutputDir,
+    num_designs: int,
+    params: RFdiffusionParams,
+    options: RunOptions,
+) -> LatchOutputDir:
+    return run_designs(run_name, output_directory, num_designs, params, options)
 
-    if ckpt_override_path:
-        command.append(f"inference.ckpt_override_path={ckpt_override_path.local_path}")
 
-    try:
-        print("RUNNING COMMAND: ")
-        print(" ".join(command))
-        subprocess.run(command, check=True)
-    except Exception as e:
-        print("FAILED")
-        print(e)
-    print("Returning results")
-    return LatchOutputDir(str("/root/outputs"), output_directory.remote_path)
+@v100_x4_task
+def rfdif_multi_gpu_task(
+    run_name: str,
+    output_directory: LatchOutputDir,
+    num_designs: int,
+    params: RFdiffusionParams,
+    options: RunOptions,
+) -> LatchOutputDir:
+    return run_designs(run_name, output_directory, num_designs, params, options)
@@ -0,0 +1,200 @@
+import argparse
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from wf.params import RFdiffusionParams, TrajectoryMode
+
+TRAJECTORY_KINDS = ("Xt-1", "pX0")
+# Coordinates in a PDB are written to 1/1000 Å. Each axis is quantized in
+# steps of that size from its minimum, itself a written coordinate, so up to
+# a span of 65.535 Å (65535 uint16 steps) coordinates come back within
+# float32 rounding (about 1e-5 Å), which writing them to 3 decimals removes.
+# Wider trajectories use a step of span / 65535, so a coordinate can be off
+# by half a step: up to span / 131070 Å, e.g. 0.0015 Å for a 200 Å span.
+QUANTIZATION_STEP = 0.001
+
+
+def post_processes(params: RFdiffusionParams) -> bool:
+    """Whether the trajectories RFdiffusion writes are rewritten after the run."""
+    if params.trajectory_mode == TrajectoryMode.FULL:
+        return params.trajectory_stride > 1
+    return params.trajectory_mode != TrajectoryMode.OFF
+
+
+def kept_steps(num_models: int, stride: int) -> List[int]:
+    steps = list(range(0, num_models, max(stride, 1)))
+    if steps[-1] != num_models - 1:
+        steps.append(num_models - 1)
+    return steps
+
+
+def read_trajectory(path: Path) -> Tuple[List[str], List[str], np.ndarray]:
+    """Split a multi-model PDB into per-atom record text and a coordinate array.
+
+    Returns the columns before (`prefixes`) and after (`suffixes`) the
+    coordinates of each atom record, and a `(models, atoms, 3)` array. The
+    record text is taken from the first model; RFdiffusion writes the same
+    atoms with the same B-factors in every model.
+    """
+    models: List[List[str]] = []
+    atoms: List[str] = []
+    with open(path) as f:
+        for line in f:
+            if line.startswith(("ATOM", "HETATM")):
+                atoms.append(line.rstrip("\n"))
+            elif line.startswith("ENDMDL"):
+                models.append(atoms)
+                atoms = []
+    if len(atoms) > 0:
+        models.append(atoms)
+    if len(models) == 0:
+        raise ValueError(f"No atom records in {path}")
+
+    prefixes = [line[:30] for line in models[0]]
+    suffixes = [line[54:] for line in models[0]]
+    for i, model in enumerate(models[1:], start=2):
+        if [line[:30] for line in model] != prefixes:
+            raise ValueError(f"Model {i} of {path} has different atoms than model 1")
+
+    coords = np.array(
+        [
+            [(float(l[30:38]), float(l[38:46]), float(l[46:54])) for l in model]
+            for model in models
+        ],
+        dtype=np.float32,
+    )
+    return prefixes, suffixes, coords
+
+
+def write_trajectory_pdb(
+    path: Path, prefixes: List[str], suffixes: List[str], coords: np.ndarray
+) -> None:
+    with open(path, "w") as f:
+        for model, xyz in enumerate(coords, start=1):
+            f.write(f"MODEL     {model:4d}\n")
+            for prefix, (x, y, z), suffix in zip(prefixes, xyz, suffixes):
+                f.write(f"{prefix}{x:8.3f}{y:8.3f}{z:8.3f}{suffix}\n")
+            f.write("ENDMDL\n")
+        f.write("END\n")
+
+
+def compact_path(path: Path) -> Path:
+    return path.with_suffix(".npz")
+
+
+def write_compact(
+    path: Path,
+    prefixes: List[str],
+    suffixes: List[str],
+    coords: np.ndarray,
+    steps: List[int],
+    mode: TrajectoryMode,
+) -> None:
+    origin = coords.reshape(-1, 3).mean(axis=0)
+    centered = coords - origin
+    arrays = {
+        "prefixes": np.array(prefixes),
+        "suffixes": np.array(suffixes),
+        "steps": np.array(steps, dtype=np.int32),
+        "origin": origin.astype(np.float32),
+    }
+    if mode == TrajectoryMode.FLOAT16:
+        arrays["coords"] = centered.astype(np.float16)
+    else:
+        low = centered.min(axis=(0, 1))
+        span = float((centered.max(axis=(0, 1)) - low).max())
+        scale = max(span / np.iinfo(np.uint16).max, QUANTIZATION_STEP)
+        arrays["coords"] = np.round((centered - low) / scale).astype(np.uint16)
+        arrays["low"] = low.astype(np.float32)
+        arrays["scale"] = np.float32(scale)
+    np.savez_compressed(path, **arrays)
+
+
+def load_compact(path: Path) -> Tuple[List[str], List[str], np.ndarray]:
+    with np.load(path, allow_pickle=False) as data:
+        coords = data["coords"].astype(np.float32)
+        if "scale" in data:
+            coords = coords * data["scale"] + data["low"]
+        return (
+            data["prefixes"].tolist(),
+            data["suffixes"].tolist(),
+            coords + data["origin"],
+        )
+
+
+def store_trajectory(
+    traj_dir: Path, design_name: str, mode: TrajectoryMode, stride: int
+) -> Tuple[int, int]:
+    """Rewrite one design's trajectories per `mode`/`stride`.
+
+    Returns the bytes before and after.
+    """
+    before, after = 0, 0
+    for kind in TRAJECTORY_KINDS:
+        path = traj_dir / f"{design_name}_{kind}_traj.pdb"
+        if not path.exists():
+            continue
+        before += path.stat().st_size
+
+        prefixes, suffixes, coords = read_trajectory(path)
+        steps = kept_steps(len(coords), stride)
+        if mode == TrajectoryMode.FULL:
+            write_trajectory_pdb(path, prefixes, suffixes, coords[steps])
+            after += path.stat().st_size
+            continue
+
+        output = compact_path(path)
+        write_compact(output, prefixes, suffixes, coords[steps], steps, mode)
+        path.unlink()
+        after += output.stat().st_size
+    return before, after
+
+
+def store_trajectories(
+    params: RFdiffusionParams,
+    traj_dir: Path,
+    run_name: str,
+    design_startnum: int,
+    num_designs: int,
+) -> None:
+    if not post_processes(params) or not traj_dir.exists():
+        return
+
+    before, after = 0, 0
+    for i in range(design_startnum, design_startnum + num_designs):
+        try:
+            sizes = store_trajectory(
+                traj_dir,
+                f"{run_name}_{i}",
+                params.trajectory_mode,
+                params.trajectory_stride,
+            )
+        except ValueError as e:
+            print(f"Keeping trajectories of {run_name}_{i} as written: {e}")
+            continue
+        before += sizes[0]
+        after += sizes[1]
+
+    if before > 0:
+        print(
+            f"Stored trajectories as {params.trajectory_mode.value},"
+            f" stride {params.trajectory_stride}:"
+            f" {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert a compact trajectory (.npz) back to a multi-model PDB"
+    )
+    parser.add_argument("trajectory", type=Path)
+    parser.add_argument("output", type=Path, nargs="?")
+    args = parser.parse_args()
+
+    output: Optional[Path] = args.output
+    if output is None:
+        output = args.trajectory.with_suffix(".pdb")
+    write_trajectory_pdb(output, *load_compact(args.trajectory))
+    print(f"Wrote {output}")
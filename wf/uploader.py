@@ -0,0 +1,226 @@
+import hashlib
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Callable, Dict, Optional, Set, Tuple, Union
+
+from latch.ldata.path import LPath
+from latch.types.directory import LatchOutputDir
+
+
+class LatchStore:
+    def upload(self, local: Path, remote: str) -> None:
+        LPath(remote).upload_from(local)
+
+
+class LocalStore:
+    """Stand-in object store that copies into a local directory.
+
+    Remote paths are mapped below `root` with their scheme stripped, so
+    `latch:///runs/x.pdb` lands at `<root>/runs/x.pdb`.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def upload(self, local: Path, remote: str) -> None:
+        destination = self.root / remote.split("://", 1)[-1].lstrip("/")
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(local, destination)
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DesignUploader:
+    """Uploads finished designs from `local_root` while generation continues.
+
+    A file is picked up once its design's `.trb` exists (run_inference.py
+    writes it after the `.pdb`, before the trajectories) and its size and
+    mtime have not changed between two scans. Uploads go through a bounded
+    thread pool with retries; files whose content hash matches what was
+    already uploaded to the same remote path are skipped. Files matching
+    `hold` are left for the end. `stop` uploads whatever is left, regardless
+    of these rules, and waits.
+    """
+
+    def __init__(
+        self,
+        local_root: Path,
+        remote_root: str,
+        store=None,
+        max_workers: int = 4,
+        retries: int = 3,
+        poll_interval: float = 5.0,
+        delete_uploaded: Callable[[Path], bool] = lambda path: False,
+        hold: Callable[[Path], bool] = lambda path: False,
+    ):
+        self.local_root = local_root
+        self.remote_root = remote_root.rstrip("/")
+        self.store = LatchStore() if store is None else store
+        self.retries = retries
+        self.poll_interval = poll_interval
+        self.delete_uploaded = delete_uploaded
+        self.hold = hold
+
+        self.pool = ThreadPoolExecutor(max_workers)
+        self.pending: Dict[Path, Future] = {}
+        self.uploaded: Dict[str, str] = {}
+        self.failed: Set[Path] = set()
+        self.last_seen: Dict[Path, Tuple[int, float]] = {}
+        self.done: Dict[Path, Tuple[int, float]] = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.watch, daemon=True)
+
+        self.bytes_uploaded = 0
+        self.skipped = 0
+
+    def __enter__(self) -> "DesignUploader":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    @property
+    def complete(self) -> bool:
+        return len(self.failed) == 0
+
+    def remote_path(self, path: Path) -> str:
+        return f"{self.remote_root}/{path.relative_to(self.local_root).as_posix()}"
+
+    def design_finished(self, path: Path) -> bool:
+        if path.suffix == ".trb":
+            return True
+        stem = path.stem
+        if path.parent.name == "traj":
+            stem = stem.rsplit("_", 2)[0]
+            return (path.parent.parent / f"{stem}.trb").exists()
+        return (path.parent / f"{stem}.trb").exists()
+
+    def scan(self, final: bool = False) -> None:
+        if not self.local_root.exists():
+            return
+
+        for path in sorted(self.local_root.rglob("*")):
+            if not path.is_file() or path in self.pending or path in self.failed:
+                continue
+
+            stat = path.stat()
+            signature = (stat.st_size, stat.st_mtime)
+            if self.done.get(path) == signature:
+                continue
+            stable = self.last_seen.get(path) == signature
+            self.last_seen[path] = signature
+            if not final and (
+                not stable or not self.design_finished(path) or self.hold(path)
+            ):
+                continue
+
+            self.pending[path] = self.pool.submit(self.upload, path, signature)
+
+    def upload(self, path: Path, signature: Tuple[int, float]) -> None:
+        remote = self.remote_path(path)
+        digest = file_digest(path)
+
+        with self.lock:
+            duplicate = self.uploaded.get(remote) == digest
+            if duplicate:
+                self.skipped += 1
+        if not duplicate:
+            for attempt in range(self.retries):
+                try:
+                    self.store.upload(path, remote)
+                    break
+                except Exception as e:
+                    print(f"Upload of {path} failed (attempt {attempt + 1}): {e}")
+                    if attempt == self.retries - 1:
+                        with self.lock:
+                            self.failed.add(path)
+                        return
+                    time.sleep(2**attempt)
+
+            with self.lock:
+                self.uploaded[remote] = digest
+                self.bytes_uploaded += signature[0]
+
+        # A file rewritten after upload (e.g. a retried design) gets a new
+        # signature and is uploaded again unless its content is unchanged.
+        self.done[path] = signature
+        if self.delete_uploaded(path):
+            path.unlink()
+
+    def reap(self) -> None:
+        for path, future in list(self.pending.items()):
+            if future.done():
+                future.result()
+                del self.pending[path]
+
+    def watch(self) -> None:
+        while not self.stopping.wait(self.poll_interval):
+            self.reap()
+            self.scan()
+
+    def stop(self) -> None:
+        self.stopping.set()
+        self.thread.join()
+        self.reap()
+        self.scan(final=True)
+        for future in self.pending.values():
+            future.result()
+        self.pending.clear()
+        self.pool.shutdown()
+
+        print(
+            f"Streamed {len(self.uploaded)} files"
+            f" ({self.bytes_uploaded / 1e6:.1f} MB) to {self.remote_root},"
+            f" {self.skipped} unchanged files skipped, {len(self.failed)} failed"
+        )
+
+
+def is_trajectory(path: Path) -> bool:
+    return path.parent.name == "traj"
+
+
+def streaming_uploads(
+    enabled: bool,
+    remote_root: str,
+    local_root: str = "/root/outputs",
+    hold_trajectories: bool = False,
+) -> Union[DesignUploader, nullcontext]:
+    """Context that yields a running `DesignUploader`, or `None` when disabled.
+
+    Trajectories are deleted locally once uploaded; `.pdb`/`.trb` files stay
+    for post-processing at the end of the task. `hold_trajectories` keeps
+    trajectories back until the end, for runs that rewrite them once
+    generation is done.
+    """
+    if not enabled:
+        return nullcontext()
+    return DesignUploader(
+        Path(local_root),
+        remote_root,
+        delete_uploaded=is_trajectory,
+        hold=is_trajectory if hold_trajectories else lambda path: False,
+    )
+
+
+def task_output(
+    remote_root: str,
+    uploader: Optional[DesignUploader],
+    local_root: str = "/root/outputs",
+) -> LatchOutputDir:
+    # Once everything has been streamed, return the remote directory as-is
+    # instead of syncing the local outputs a second time.
+    if uploader is not None and uploader.complete:
+        return LatchOutputDir(remote_root)
+    return LatchOutputDir(local_root, remote_root)
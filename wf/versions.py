@@ -0,0 +1,101 @@
+"""Content versions of Latch Data paths, read without downloading them.
+
+A file's version is its node, modification time and size, so a file that
+is replaced or rewritten at the same path gets a new version even if its
+size is unchanged. A directory's version is a digest of the relative path
+and version of every file under it, listed with one request per directory.
+"""
+
+import hashlib
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import gql
+from latch_sdk_gql.execute import execute
+
+VERSION_QUERY = gql.gql("""
+    query RemoteVersion($argPath: String!) {
+        ldataResolvePathData(argPath: $argPath) {
+            finalLinkTarget {
+                id
+                type
+                ldataObjectMeta {
+                    modifyTime
+                    contentSize
+                }
+                childLdataTreeEdges(filter: {
+                    child: {
+                        removed: { equalTo: false },
+                        pending: { equalTo: false }
+                    }
+                }) {
+                    nodes {
+                        child {
+                            id
+                            name
+                            type
+                            ldataObjectMeta {
+                                modifyTime
+                                contentSize
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    }
+""")
+
+
+class RemoteVersion(NamedTuple):
+    version: str
+    size: int
+
+
+def resolve(remote_path: str) -> Optional[Dict[str, Any]]:
+    data = execute(VERSION_QUERY, {"argPath": remote_path})["ldataResolvePathData"]
+    return None if data is None else data["finalLinkTarget"]
+
+
+def node_version(node: Dict[str, Any]) -> Tuple[str, int]:
+    meta = node["ldataObjectMeta"] or {}
+    size = int(meta.get("contentSize") or 0)
+    return f"{node['id']}:{meta.get('modifyTime')}:{size}", size
+
+
+def file_versions(remote_path: str, node: Dict[str, Any]) -> List[Tuple[str, str, int]]:
+    """`(relative path, version, size)` of every file under a directory node."""
+    files = []
+    for edge in node["childLdataTreeEdges"]["nodes"]:
+        child = edge["child"]
+        path = f"{remote_path.rstrip('/')}/{child['name']}"
+        if child["type"].lower() == "obj":
+            files.append((child["name"], *node_version(child)))
+            continue
+        # Links and nested directories are resolved through their own path.
+        target = resolve(path)
+        if target is None:
+            continue
+        if target["type"].lower() == "obj":
+            files.append((child["name"], *node_version(target)))
+            continue
+        files += [
+            (f"{child['name']}/{name}", version, size)
+            for name, version, size in file_versions(path, target)
+        ]
+    return files
+
+
+def remote_version(remote_path: str) -> Optional[RemoteVersion]:
+    """Version and total size of a file or directory, or None if it is missing."""
+    node = resolve(remote_path)
+    if node is None:
+        return None
+    if node["type"].lower() == "obj":
+        return RemoteVersion(*node_version(node))
+
+    digest = hashlib.sha256()
+    total = 0
+    for name, version, size in sorted(file_versions(remote_path, node)):
+        digest.update(f"{name}\0{version}\0".encode())
+        total += size
+    return RemoteVersion(f"{node['id']}:{digest.hexdigest()}", total)
@@ -0,0 +1,487 @@
+"""Long-lived RFdiffusion worker.
+
+Run inside the SE3nv environment, the worker composes the Hydra config and
+loads the checkpoint once, then serves design jobs over a Unix socket. Each
+job is the list of Hydra overrides `run_inference.py` would have received on
+its command line; everything after config composition is upstream's own
+`main`, so outputs are identical to a `conda run` invocation.
+
+Protocol: one JSON object per line in each direction. Run responses carry
+the job's log records (creation time and message) for wf.metrics.
+
+    -> {"op": "run", "overrides": ["contigmap.contigs=[100-100]", ...]}
+    <- {"ok": true, "elapsed": 12.3, "log": [[1712345678.9, "Making design ..."], ...]}
+    -> {"op": "shutdown"}
+    <- {"ok": true}
+
+`--stub` swaps the model for a CPU stand-in that writes placeholder
+`.pdb`/`.trb`/trajectory files, so the protocol and lifecycle can be
+exercised without a GPU or the SE3nv environment. With `--stub-max-length`,
+longer designs fail the way they would running out of GPU memory, and
+`--stub-fail INDEX[:ATTEMPTS]` fails one design index for its first
+ATTEMPTS tries (every try without ATTEMPTS).
+
+This file is executed directly by the SE3nv interpreter, so it must only
+import the standard library at module level.
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import math
+import os
+import pickle
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+RFDIFFUSION_DIR = Path("/tmp/docker-build/work/RFdiffusion")
+CONDA_LAUNCHER = [
+    "/root/miniconda/bin/conda",
+    "run",
+    "--no-capture-output",
+    "--name",
+    "SE3nv",
+    "python",
+]
+DEFAULT_SOCKET = "/tmp/rfdiffusion_worker.sock"
+# Hydra's default job logging format, which wf.metrics parses.
+LOG_FORMAT = "[%(asctime)s][%(name)s][%(levelname)s] - %(message)s"
+
+log = logging.getLogger("rfdiffusion_worker")
+
+
+def configure_logging() -> None:
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, stream=sys.stdout)
+    sys.stdout.reconfigure(line_buffering=True)
+
+
+def parse_overrides(overrides: List[str]) -> Dict[str, str]:
+    parsed = {}
+    for override in overrides:
+        key, _, value = override.partition("=")
+        parsed[key] = value
+    return parsed
+
+
+class InferenceBackend:
+    """Runs `run_inference.main` against a sampler that survives between jobs."""
+
+    def __init__(self, rfdiffusion_dir: Path = RFDIFFUSION_DIR):
+        from hydra import compose, initialize_config_dir
+
+        self.compose = compose
+        initialize_config_dir(
+            config_dir=str(rfdiffusion_dir / "config" / "inference"),
+            version_base=None,
+            job_name="rfdiffusion_worker",
+        )
+
+        spec = importlib.util.spec_from_file_location(
+            "run_inference", rfdiffusion_dir / "scripts" / "run_inference.py"
+        )
+        self.run_inference = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.run_inference)
+
+        # run_inference.main builds its sampler through iu.sampler_selector;
+        # routing that through the cache is what keeps the model resident.
+        self.sampler = None
+        self.sampler_key = None
+        self.select_sampler = self.run_inference.iu.sampler_selector
+        self.run_inference.iu.sampler_selector = self.cached_sampler
+
+    def cached_sampler(self, conf):
+        key = (conf.scaffoldguided.scaffoldguided, conf.inference.model_runner)
+        if self.sampler is not None and key == self.sampler_key:
+            loaded_ckpt = self.sampler.ckpt_path
+            self.sampler.initialize(conf)
+            # Sampler.initialize only reloads weights when ckpt_override_path
+            # changes, not when the automatically selected checkpoint does.
+            if self.sampler.ckpt_path == loaded_ckpt:
+                return self.sampler
+
+        print("Loading RFdiffusion model")
+        self.sampler = self.select_sampler(conf)
+        self.sampler_key = key
+        return self.sampler
+
+    def run(self, overrides: List[str]) -> None:
+        conf = self.compose(config_name="base", overrides=overrides)
+        self.run_inference.main(conf)
+
+
+class StubBackend:
+    """CPU stand-in that writes placeholder designs in RFdiffusion's layout."""
+
+    def __init__(
+        self,
+        load_seconds: float = 0.0,
+        step_seconds: float = 0.0,
+        max_length: Optional[int] = None,
+        fail_designs: Optional[Dict[int, Optional[int]]] = None,
+    ):
+        time.sleep(load_seconds)
+        self.step_seconds = step_seconds
+        # Longer designs fail, as they would running out of GPU memory.
+        self.max_length = max_length
+        # Design index -> attempts that fail (None: all of them).
+        self.fail_designs = dict(fail_designs or {})
+        self.attempts: Dict[int, int] = {}
+
+    def run(self, overrides: List[str]) -> None:
+        conf = parse_overrides(overrides)
+        output_prefix = conf.get("inference.output_prefix", "samples/design")
+        num_designs = int(conf.get("inference.num_designs", 10))
+        design_startnum = int(conf.get("inference.design_startnum", 0))
+        # Partial diffusion only runs the last partial_T steps.
+        num_steps = int(conf.get("diffuser.partial_T", conf.get("diffuser.T", 50)))
+        contigs = conf.get("contigmap.contigs", "[100-100]").strip("[]")
+
+        for i in range(design_startnum, design_startnum + num_designs):
+            # Logged like run_inference.py so wf.metrics can time the stub.
+            log.info(f"Making design {output_prefix}_{i}")
+            start = time.time()
+            for t in range(num_steps, 0, -1):
+                time.sleep(self.step_seconds)
+                log.info(f"Timestep {t}, input to next step: stub")
+
+            self.attempts[i] = self.attempts.get(i, 0) + 1
+            if i in self.fail_designs:
+                failing = self.fail_designs[i]
+                if failing is None or self.attempts[i] <= failing:
+                    raise RuntimeError(f"Design {i} failed (stub)")
+
+            rng = random.Random(i)
+            length = sample_contig_length(contigs, rng)
+            if self.max_length is not None and length > self.max_length:
+                raise RuntimeError(
+                    f"CUDA out of memory (stub): {length} residues is more than"
+                    f" {self.max_length}"
+                )
+            write_stub_design(
+                f"{output_prefix}_{i}",
+                length,
+                num_steps,
+                rng,
+                config=conf,
+                write_trajectory=conf.get("inference.write_trajectory", "True")
+                != "False",
+            )
+            log.info(f"Finished design in {(time.time() - start) / 60:.2f} minutes")
+
+
+def sample_contig_length(contigs: str, rng: random.Random) -> int:
+    length = 0
+    for segment in re.split(r"[/ ,]", contigs):
+        match = re.fullmatch(r"([A-Za-z]?)(\d+)-(\d+)", segment)
+        if match is None:
+            continue
+        chain, start, end = match.group(1), int(match.group(2)), int(match.group(3))
+        length += end - start + 1 if chain else rng.randint(start, end)
+    return max(length, 1)
+
+
+def stub_backbone(length: int, rng: random.Random) -> List[List[List[float]]]:
+    residues = []
+    for i in range(length):
+        theta = i * 100.0 * math.pi / 180.0
+        x, y, z = 2.3 * math.cos(theta), 2.3 * math.sin(theta), 1.5 * i
+        jitter = rng.uniform(-0.1, 0.1)
+        residues.append(
+            [
+                [x - 1.2, y + jitter, z - 0.5],
+                [x, y, z],
+                [x + 1.2, y - jitter, z + 0.5],
+                [x + 1.5, y - jitter, z + 1.7],
+            ]
+        )
+    return residues
+
+
+def stub_pdb_lines(residues: List[List[List[float]]]) -> List[str]:
+    lines = []
+    serial = 1
+    for i, atoms in enumerate(residues):
+        for name, (x, y, z) in zip(("N", "CA", "C", "O"), atoms):
+            lines.append(
+                f"ATOM  {serial:5d}  {name:<3s} GLY A{i + 1:4d}    "
+                f"{x:8.3f}{y:8.3f}{z:8.3f}  1.00  0.00"
+            )
+            serial += 1
+    return lines
+
+
+def write_stub_design(
+    out_prefix: str,
+    length: int,
+    num_steps: int,
+    rng: random.Random,
+    config: Optional[Dict[str, Any]] = None,
+    write_trajectory: bool = True,
+) -> None:
+    start = time.time()
+    os.makedirs(os.path.dirname(out_prefix) or ".", exist_ok=True)
+    backbone = stub_backbone(length, rng)
+
+    with open(f"{out_prefix}.pdb", "w") as f:
+        f.write("\n".join(stub_pdb_lines(backbone)) + "\n")
+
+    trb = {
+        "config": config or {},
+        "plddt": [[0.9] * length for _ in range(num_steps)],
+        # Records which device a pinned stub worker was given.
+        "device": os.environ.get("CUDA_VISIBLE_DEVICES", "CPU"),
+        "time": time.time() - start,
+        "sampled_mask": [f"{length}-{length}"],
+        "con_ref_pdb_idx": [],
+        "con_hal_pdb_idx": [],
+        "complex_con_ref_pdb_idx": [],
+        "complex_con_hal_pdb_idx": [],
+        "inpaint_seq": [True] * length,
+        "inpaint_str": [True] * length,
+    }
+    with open(f"{out_prefix}.trb", "wb") as f:
+        pickle.dump(trb, f)
+
+    if not write_trajectory:
+        return
+
+    traj_dir = Path(out_prefix).parent / "traj"
+    traj_dir.mkdir(parents=True, exist_ok=True)
+    for kind in ("Xt-1", "pX0"):
+        with open(traj_dir / f"{Path(out_prefix).name}_{kind}_traj.pdb", "w") as f:
+            for model in range(1, num_steps + 1):
+                f.write(f"MODEL     {model:4d}\n")
+                f.write("\n".join(stub_pdb_lines(backbone)) + "\n")
+                f.write("ENDMDL\n")
+
+
+class LogCapture(logging.Handler):
+    """Collects each job's log records so the client can time the job."""
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.records: List[List[Any]] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append([record.created, record.getMessage()])
+
+
+def serve(socket_path: str, backend) -> None:
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(1)
+    print(f"RFdiffusion worker listening on {socket_path}")
+    capture = LogCapture()
+    logging.getLogger().addHandler(capture)
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn, conn.makefile("rw") as stream:
+                for line in stream:
+                    request = json.loads(line)
+                    if request.get("op") == "shutdown":
+                        stream.write(json.dumps({"ok": True}) + "\n")
+                        stream.flush()
+                        return
+
+                    start = time.time()
+                    capture.records = []
+                    try:
+                        backend.run(request["overrides"])
+                        response = {"ok": True, "elapsed": time.time() - start}
+                    except Exception as e:
+                        logging.exception("Job failed")
+                        response = {"ok": False, "error": repr(e)}
+                    response["log"] = capture.records
+                    stream.write(json.dumps(response) + "\n")
+                    stream.flush()
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+class RFdiffusionWorker:
+    """Client that starts a worker process and submits jobs to it.
+
+    Use as a context manager so the worker is shut down (and killed if it
+    does not exit) however the task finishes.
+    """
+
+    def __init__(
+        self,
+        socket_path: str = DEFAULT_SOCKET,
+        launcher: Optional[List[str]] = None,
+        stub: bool = False,
+        startup_timeout: float = 600.0,
+        stub_load_seconds: float = 0.0,
+        stub_step_seconds: float = 0.0,
+        stub_max_length: Optional[int] = None,
+        stub_fail_designs: Optional[Dict[int, Optional[int]]] = None,
+        device: Optional[str] = None,
+    ):
+        self.socket_path = socket_path
+        self.launcher = CONDA_LAUNCHER if launcher is None else launcher
+        self.stub = stub
+        self.startup_timeout = startup_timeout
+        self.stub_load_seconds = stub_load_seconds
+        self.stub_step_seconds = stub_step_seconds
+        self.stub_max_length = stub_max_length
+        self.stub_fail_designs = stub_fail_designs or {}
+        self.device = device
+        self.process: Optional[subprocess.Popen] = None
+        self.conn: Optional[socket.socket] = None
+        self.stream = None
+
+    def __enter__(self) -> "RFdiffusionWorker":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def start(self) -> None:
+        command = [*self.launcher, str(Path(__file__).resolve())]
+        command += ["--socket", self.socket_path]
+        if self.stub:
+            command.append("--stub")
+            command += ["--stub-load-seconds", str(self.stub_load_seconds)]
+            command += ["--stub-step-seconds", str(self.stub_step_seconds)]
+            if self.stub_max_length is not None:
+                command += ["--stub-max-length", str(self.stub_max_length)]
+            for i, attempts in self.stub_fail_designs.items():
+                fail = str(i) if attempts is None else f"{i}:{attempts}"
+                command += ["--stub-fail", fail]
+
+        env = None
+        if self.device is not None:
+            env = {**os.environ, "CUDA_VISIBLE_DEVICES": self.device}
+            print(f"Starting RFdiffusion worker on GPU {self.device}: ")
+        else:
+            print("Starting RFdiffusion worker: ")
+        print(" ".join(command))
+        self.process = subprocess.Popen(command, env=env)
+
+        deadline = time.time() + self.startup_timeout
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError(
+                    f"RFdiffusion worker exited with code {self.process.returncode}"
+                    " during startup"
+                )
+            try:
+                self.conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.conn.connect(self.socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                self.conn.close()
+                if time.time() > deadline:
+                    self.close()
+                    raise RuntimeError("Timed out waiting for RFdiffusion worker")
+                time.sleep(0.5)
+
+        self.stream = self.conn.makefile("rw")
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def revive(self) -> bool:
+        """Restart the worker if it died, e.g. on a CUDA error; whether it runs."""
+        if self.alive:
+            return True
+        print("RFdiffusion worker exited, restarting it")
+        self.close()
+        try:
+            self.start()
+        except RuntimeError as e:
+            print(f"Could not restart the RFdiffusion worker: {e}")
+            return False
+        return True
+
+    def request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self.stream is None:
+            raise RuntimeError("RFdiffusion worker is not running")
+
+        self.stream.write(json.dumps(payload) + "\n")
+        self.stream.flush()
+        line = self.stream.readline()
+        if line == "":
+            raise RuntimeError("RFdiffusion worker closed the connection")
+        return json.loads(line)
+
+    def run(
+        self,
+        overrides: List[str],
+        on_log: Optional[Callable[[float, str], None]] = None,
+    ) -> float:
+        response = self.request({"op": "run", "overrides": overrides})
+        if on_log is not None:
+            for created, message in response.get("log", []):
+                on_log(created, message)
+        if not response["ok"]:
+            raise RuntimeError(f"RFdiffusion job failed: {response['error']}")
+        return response["elapsed"]
+
+    def close(self, timeout: float = 30.0) -> None:
+        if self.stream is not None:
+            try:
+                self.request({"op": "shutdown"})
+            except (OSError, RuntimeError):
+                pass
+            try:
+                self.stream.close()
+            except OSError:
+                # Flushing to a worker that already died.
+                pass
+            self.conn.close()
+            self.stream = None
+            self.conn = None
+
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--stub", action="store_true")
+    parser.add_argument("--stub-load-seconds", type=float, default=0.0)
+    parser.add_argument("--stub-step-seconds", type=float, default=0.0)
+    parser.add_argument("--stub-max-length", type=int, default=None)
+    parser.add_argument(
+        "--stub-fail", action="append", default=[], metavar="INDEX[:ATTEMPTS]"
+    )
+    args = parser.parse_args()
+
+    configure_logging()
+    if args.stub:
+        fail_designs: Dict[int, Optional[int]] = {}
+        for fail in args.stub_fail:
+            index, _, attempts = fail.partition(":")
+            fail_designs[int(index)] = int(attempts) if attempts else None
+        backend = StubBackend(
+            args.stub_load_seconds,
+            args.stub_step_seconds,
+            args.stub_max_length,
+            fail_designs,
+        )
+    else:
+        backend = InferenceBackend()
+    serve(args.socket, backend)